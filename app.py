@@ -1,51 +1,70 @@
-from flask import Flask, request, abort, jsonify
+from flask import Flask, request, abort, jsonify, Response
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import MessageEvent, TextMessage, AudioMessage, ImageMessage, TextSendMessage
+from linebot.http_client import RequestsHttpClient, RequestsHttpResponse
 import os
 import logging
 from dotenv import load_dotenv
 
-# 設定日誌記錄
+# 載入環境變數（需在 import tracing 之前，才讀得到 TRACING_* 設定）
+load_dotenv()
+
+from tracing import tracer, TraceIdLogFilter
+
+# 設定日誌記錄，每行帶上目前處理中事件的 trace id（沒有時為 -）
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
 )
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(TraceIdLogFilter())
 logger = logging.getLogger(__name__)
 
-# 載入環境變數
-load_dotenv()
-
-import gspread
-from google.auth.credentials import Credentials
-from google.oauth2.service_account import Credentials as ServiceAccountCredentials
+# openai、groq、gspread、googleapiclient、google_auth_oauthlib、pydub、whisper 等重量級套件
+# 都在使用時才 import（見 lazy.py），讓冷啟動只載入處理 webhook 必要的模組
 from datetime import datetime
 import json
 import tempfile
-from openai import OpenAI
-from groq import Groq
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
 import base64
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials as UserCredentials
+import importlib.util
 
-try:
-    import whisper
-    import torch
-    HAS_LOCAL_WHISPER = True
-except ImportError:
-    HAS_LOCAL_WHISPER = False
-    # 這裡現在可以使用 logger 了
+# 只檢查是否安裝，不在啟動時載入 whisper / torch
+HAS_LOCAL_WHISPER = importlib.util.find_spec('whisper') is not None and importlib.util.find_spec('torch') is not None
+if not HAS_LOCAL_WHISPER:
     logger.warning("未偵測到本地 Whisper 或 Torch，將僅使用 OpenAI/Groq API 進行轉錄")
 
-from pydub import AudioSegment
 import io
 import re
+import time
+import hashlib
+import hmac
+import threading
 import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import namedtuple
 from urllib.parse import urlparse
+from model_router import route_summary_model, TIER_SKIP, TASK_NOTE, TASK_WEBPAGE, TASK_MEETING, \
+    SUMMARY_SMALL_MODEL, SUMMARY_LARGE_MODEL
+from rate_limiter import call_with_rate_limit, estimate_tokens, limiter_registry, IMAGE_TOKEN_ESTIMATE, \
+    RATE_LIMIT_MAX_WAIT
+from summarizer import map_reduce_summarize, SUMMARY_CHUNK_CHARS
+from http_client import http
+from page_cache import page_cache, canonicalize_url
+from single_flight import SingleFlight
+from html_extract import extract_from_response, parse_jina_text, NonHtmlContentError
+from notion_writer import notion_writer, is_notion_configured, NOTION_APPEND_BATCH_SIZE
+from note_index import note_index
+from note_search import note_search
+from near_dup import near_dup_index
+from transcript import format_tail, format_counters
+from meeting_log import meeting_logs, iter_chunks
+from session_store import session_store
+from profile_cache import profile_cache
+from lazy import LazyValue, warmup, STARTUP_WARMUP
+from metrics import metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE, stage_timer, timed_stage, observe_stage, \
+    record_fallback, track_handler
+from profiling import profiler
 
 # 修正 google-api-python-client 在 Python 3.9 下的相容性問題
 try:
@@ -59,36 +78,82 @@ if not hasattr(metadata, 'packages_distributions'):
 
 app = Flask(__name__)
 
+class PooledLineHttpClient(RequestsHttpClient):
+    """讓 LINE Messaging API 呼叫共用 keep-alive 連線池"""
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        with stage_timer('line_api', 'line'):
+            response = http.get(url, headers=headers, params=params, stream=stream, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        with stage_timer('line_api', 'line'):
+            response = http.post(url, headers=headers, data=data, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        with stage_timer('line_api', 'line'):
+            response = http.request('DELETE', url, headers=headers, data=data, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+    def put(self, url, headers=None, data=None, timeout=None):
+        with stage_timer('line_api', 'line'):
+            response = http.request('PUT', url, headers=headers, data=data, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+
 # Line Bot 設定
 line_bot_api = None
 handler = None
 
 try:
-    line_bot_api = LineBotApi(os.getenv('CHANNEL_ACCESS_TOKEN'))
+    line_bot_api = LineBotApi(
+        os.getenv('CHANNEL_ACCESS_TOKEN'),
+        endpoint=os.getenv('LINE_API_ENDPOINT', 'https://api.line.me'),
+        data_endpoint=os.getenv('LINE_API_DATA_ENDPOINT', 'https://api-data.line.me'),
+        http_client=PooledLineHttpClient,
+    )
     handler = WebhookHandler(os.getenv('CHANNEL_SECRET'))
     logger.info("Line Bot API 初始化成功")
 except Exception as e:
     logger.error(f"Line Bot API 初始化失敗: {e}")
     logger.warning("應用程式將在沒有 LINE Bot 功能的情況下啟動")
 
-# OpenAI 客戶端初始化
-openai_client = None
-if os.getenv('OPENAI_API_KEY'):
-    try:
-        openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        logger.info("OpenAI 客戶端初始化成功")
-    except Exception as e:
-        logger.error(f"OpenAI 客戶端初始化失敗: {e}")
+# 管理端點（/admin/...）的驗證 token，未設定時停用所有管理端點
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
 
-# Groq 客戶端初始化
-groq_client = None
-if os.getenv('GROQ_API_KEY'):
-    try:
-        groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        logger.info("Groq 客戶端初始化成功")
-    except Exception as e:
-        logger.error(f"Groq 客戶端初始化失敗: {e}")
-else:
+def _create_openai_client():
+    if not os.getenv('OPENAI_API_KEY'):
+        return None
+    from openai import OpenAI
+    client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    logger.info("OpenAI 客戶端初始化成功")
+    return client
+
+
+def _create_groq_client():
+    if not os.getenv('GROQ_API_KEY'):
+        return None
+    from groq import Groq
+    client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+    logger.info("Groq 客戶端初始化成功")
+    return client
+
+
+# OpenAI / Groq 客戶端在第一次使用時才建立
+_openai_client = LazyValue("openai", _create_openai_client)
+_groq_client = LazyValue("groq", _create_groq_client)
+
+
+def get_openai_client():
+    return _openai_client.get()
+
+
+def get_groq_client():
+    return _groq_client.get()
+
+
+if not os.getenv('GROQ_API_KEY'):
     logger.warning("未偵測到 GROQ_API_KEY，將無法使用 Groq Whisper API")
 
 # 本地 Whisper 模型設定 (自動選擇適合的模型大小)
@@ -108,6 +173,7 @@ def load_whisper_model():
         return whisper_model
     
     try:
+        import whisper
         logger.info(f"正在加載 Whisper {WHISPER_MODEL_SIZE} 模型...")
         whisper_model = whisper.load_model(WHISPER_MODEL_SIZE)
         logger.info(f"Whisper {WHISPER_MODEL_SIZE} 模型加載成功")
@@ -116,6 +182,7 @@ def load_whisper_model():
         logger.error(f"Whisper 模型加載失敗: {e}")
         try:
             logger.info("嘗試加載 tiny 模型作為備用...")
+            import whisper
             whisper_model = whisper.load_model("tiny")
             logger.info("Whisper tiny 模型加載成功")
             return whisper_model
@@ -127,40 +194,35 @@ def load_whisper_model():
 # 在應用啟動時不立即加載模型，等到需要時再加載
 logger.info("應用啟動成功，將在首次語音轉錄時加載 Whisper 模型")
 
-# 用戶狀態管理
-user_sessions = {}
-user_conversations = {}
-
-class UserSession:
-    def __init__(self, user_id):
-        self.user_id = user_id
-        self.is_recording = False  # 是否正在錄音模式
-        self.conversation_buffer = []  # 對話緩衝區
-        self.created_at = datetime.now()
-    
-    def start_recording(self):
-        self.is_recording = True
-        self.conversation_buffer = []
-        logger.info(f"用戶 {self.user_id} 開始錄音模式")
-    
-    def stop_recording(self):
-        self.is_recording = False
-        logger.info(f"用戶 {self.user_id} 停止錄音模式")
-    
-    def add_message(self, message):
-        self.conversation_buffer.append({
-            'timestamp': datetime.now(),
-            'content': message
-        })
-    
-    def get_conversation_text(self):
-        return '\n'.join([msg['content'] for msg in self.conversation_buffer])
+# 相同網址 / 檔案的並行工作合併執行
+note_flight = SingleFlight("notes")
 
 # Google Sheets 設定
 GOOGLE_SHEETS_ID = os.getenv('GOOGLE_SHEETS_ID')
 GOOGLE_CREDENTIALS_BASE64 = os.getenv('GOOGLE_CREDENTIALS_BASE64')
 GOOGLE_SERVICE_ACCOUNT_EMAIL = os.getenv('GOOGLE_SERVICE_ACCOUNT_EMAIL')
 GOOGLE_PRIVATE_KEY = os.getenv('GOOGLE_PRIVATE_KEY', '').replace('\\n', '\n')
+# 將 Google API 請求導向其他位址（例如 fakes/ 本機假服務），未設定時使用正式端點
+GOOGLE_API_BASE = os.getenv('GOOGLE_API_BASE', '').rstrip('/')
+GOOGLE_API_HOSTS = ('https://sheets.googleapis.com', 'https://www.googleapis.com', 'https://oauth2.googleapis.com')
+# 會議記錄寫入 Sheets 時每格的字數上限（Sheets 單格上限 50000 字）與每次 append_rows 的列數
+MEETING_SHEETS_CELL_CHARS = int(os.getenv('MEETING_SHEETS_CELL_CHARS', '40000'))
+MEETING_SHEETS_BATCH_ROWS = int(os.getenv('MEETING_SHEETS_BATCH_ROWS', '50'))
+
+def google_api_session(credentials):
+    """已授權的 session，請求網址中的 Google API 網域會改為 GOOGLE_API_BASE"""
+    from google.auth.transport.requests import AuthorizedSession
+
+    class RedirectedSession(AuthorizedSession):
+        def request(self, method, url, *args, **kwargs):
+            for host in GOOGLE_API_HOSTS:
+                if url.startswith(host):
+                    url = GOOGLE_API_BASE + url[len(host):]
+                    break
+            return super().request(method, url, *args, **kwargs)
+
+    return RedirectedSession(credentials)
+
 
 def initialize_google_sheets():
     """初始化 Google Sheets 連接 - 支援多種憑證設定方式"""
@@ -169,12 +231,12 @@ def initialize_google_sheets():
             logger.error("缺少 GOOGLE_SHEETS_ID 環境變數")
             return None
         
+        from google.oauth2.service_account import Credentials as ServiceAccountCredentials
         credentials = None
         
         # 方法1: 使用 Base64 編碼的完整憑證檔案（推薦）
         if GOOGLE_CREDENTIALS_BASE64:
             try:
-                import base64
                 # 修正 Base64 padding 問題
                 base64_data = GOOGLE_CREDENTIALS_BASE64
                 # 確保 Base64 字串有正確的 padding
@@ -262,7 +324,11 @@ def initialize_google_sheets():
             logger.error("無法建立 Google Sheets 憑證 - 請檢查環境變數設定")
             return None
         
-        client = gspread.authorize(credentials)
+        import gspread
+        if GOOGLE_API_BASE:
+            client = gspread.Client(credentials, session=google_api_session(credentials))
+        else:
+            client = gspread.authorize(credentials)
         logger.info("Google Sheets 連接初始化成功")
         return client
         
@@ -276,6 +342,7 @@ def save_token_to_sheets(token_json):
         client = initialize_google_sheets()
         if not client: return
         
+        import gspread
         spreadsheet = client.open_by_key(os.getenv('GOOGLE_SHEETS_ID'))
         try:
             worksheet = spreadsheet.worksheet("OAuthToken")
@@ -309,6 +376,9 @@ def load_token_from_sheets():
 
 def get_google_drive_service():
     """獲取 Google Drive 服務 (使用 OAuth 2.0)"""
+    from google.oauth2.credentials import Credentials as UserCredentials
+    from google.auth.transport.requests import Request
+    from googleapiclient.discovery import build
     scopes = ["https://www.googleapis.com/auth/drive"]
     creds = None
     
@@ -331,7 +401,7 @@ def get_google_drive_service():
                 creds = UserCredentials(
                     token=None,
                     refresh_token=refresh_token,
-                    token_uri="https://oauth2.googleapis.com/token",
+                    token_uri=f"{GOOGLE_API_BASE or 'https://oauth2.googleapis.com'}/token",
                     client_id=client_id,
                     client_secret=client_secret,
                     scopes=scopes
@@ -348,7 +418,8 @@ def get_google_drive_service():
             logger.info("已從 Google Sheets 載入憑證")
         
     if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
+        # 只有 refresh token（尚未取得 access token）時也要刷新
+        if creds and creds.refresh_token and (creds.expired or not creds.token):
             try:
                 creds.refresh(Request())
                 save_token_to_sheets(json.loads(creds.to_json()))
@@ -363,25 +434,44 @@ def get_google_drive_service():
             return "NEEDS_AUTH"
             
     if creds:
+        if GOOGLE_API_BASE:
+            return build('drive', 'v3', credentials=creds, static_discovery=False,
+                         discoveryServiceUrl=f"{GOOGLE_API_BASE}/discovery/v1/apis/{{api}}/{{apiVersion}}/rest")
         return build('drive', 'v3', credentials=creds, static_discovery=False)
     return None
 
 
 def get_user_session(user_id):
     """取得或建立用戶會話"""
-    if user_id not in user_sessions:
-        user_sessions[user_id] = UserSession(user_id)
-    return user_sessions[user_id]
+    return session_store.get(user_id)
+
+
+def recover_meeting_sessions():
+    """從會議記錄檔恢復重啟前進行中的會議，並在背景預先載入這些用戶的顯示名稱（/end 時需要）"""
+    recovered = meeting_logs.recover()
+    for user_id, entries in recovered.items():
+        session = get_user_session(user_id)
+        session.is_recording = True
+        for timestamp, content in entries:
+            session.transcript.append(content, timestamp)
+    if recovered and line_bot_api:
+        threading.Thread(target=profile_cache.prewarm, args=(list(recovered),),
+                         name="profile-prewarm", daemon=True).start()
+
+
+def fetch_user_display_name(user_id):
+    return line_bot_api.get_profile(user_id).display_name
+
+
+profile_cache.set_fetcher(fetch_user_display_name)
 
 
 def get_user_display_name(user_id):
-    """取得用戶顯示名稱"""
-    try:
-        profile = line_bot_api.get_profile(user_id)
-        return profile.display_name
-    except Exception as e:
-        logger.warning(f"無法取得用戶 {user_id} 的顯示名稱: {e}")
-        return "未知用戶"
+    """取得用戶顯示名稱（經由快取，只在實際需要名稱時呼叫）"""
+    return profile_cache.get(user_id) or "未知用戶"
+
+
+recover_meeting_sessions()
 
 
 def split_audio_for_whisper(audio_data, chunk_size_mb=50):
@@ -391,6 +481,7 @@ def split_audio_for_whisper(audio_data, chunk_size_mb=50):
     """
     try:
         # 將音檔載入 AudioSegment
+        from pydub import AudioSegment
         audio = AudioSegment.from_file(io.BytesIO(audio_data))
         
         # 估算每個 chunk 的長度（毫秒）
@@ -422,12 +513,13 @@ def split_audio_for_whisper(audio_data, chunk_size_mb=50):
         return [audio_data]  # 分割失敗，返回原檔案
 
 
+@timed_stage('transcribe', 'groq')
 def transcribe_audio_with_groq(audio_data):
     """
     使用 Groq Whisper API 轉錄音檔
     速度極快，目前提供免費額度
     """
-    if not groq_client:
+    if not get_groq_client():
         logger.error("Groq 客戶端未初始化，無法使用 Groq 轉錄")
         return None
 
@@ -439,11 +531,14 @@ def transcribe_audio_with_groq(audio_data):
         try:
             with open(temp_file_path, "rb") as audio_file:
                 # 使用 whisper-large-v3 模型
-                transcription = groq_client.audio.transcriptions.create(
-                    model="whisper-large-v3", 
-                    file=audio_file,
-                    language="zh",  # 指定中文
-                    response_format="text"
+                transcription = call_with_rate_limit(
+                    "groq", "whisper-large-v3",
+                    lambda: get_groq_client().audio.transcriptions.with_raw_response.create(
+                        model="whisper-large-v3",
+                        file=audio_file,
+                        language="zh",  # 指定中文
+                        response_format="text"
+                    )
                 )
             
             result_text = transcription.strip()
@@ -464,12 +559,13 @@ def transcribe_audio_with_groq(audio_data):
         return None
 
 
+@timed_stage('transcribe', 'openai')
 def transcribe_audio_with_openai(audio_data):
     """
     使用 OpenAI Whisper API 轉錄音檔
     準確度極高，支援多種語言
     """
-    if not openai_client:
+    if not get_openai_client():
         logger.error("OpenAI 客戶端未初始化，無法使用線上轉錄")
         return None
 
@@ -483,11 +579,14 @@ def transcribe_audio_with_openai(audio_data):
         
         try:
             with open(temp_file_path, "rb") as audio_file:
-                transcription = openai_client.audio.transcriptions.create(
-                    model="whisper-1", 
-                    file=audio_file,
-                    language="zh",  # 指定中文
-                    response_format="text"
+                transcription = call_with_rate_limit(
+                    "openai", "whisper-1",
+                    lambda: get_openai_client().audio.transcriptions.with_raw_response.create(
+                        model="whisper-1",
+                        file=audio_file,
+                        language="zh",  # 指定中文
+                        response_format="text"
+                    )
                 )
             
             result_text = transcription.strip()
@@ -508,45 +607,96 @@ def transcribe_audio_with_openai(audio_data):
         return None
 
 
-def generate_ai_summary(text):
+@timed_stage('summary', 'groq')
+def generate_ai_summary(text, task=TASK_NOTE):
     """
     使用 Groq Llama-3 模型生成一段簡短的摘要 (約 50 字以內)
+    依內容長度路由模型：極短內容不呼叫 LLM，筆記使用小模型；
+    超過一個區塊的長筆記（例如長語音逐字稿）先分段摘錄重點再歸納
     """
-    if not groq_client:
+    route = route_summary_model(text, task)
+    if route.tier == TIER_SKIP:
+        logger.info(f"內容過短 ({len(text)} 字)，略過 AI 摘要")
+        return text
+
+    if not get_groq_client():
         logger.warning("未偵測到 Groq 客戶端，跳過摘要生成")
         return text[:50] + "..." if len(text) > 50 else text
 
-    try:
-        prompt = f"請將以下這段筆記內容歸納成一段精簡的摘要（大約 30-50 字），並以第一人稱或重點條列方式呈現。只需回覆摘要文字，不要有額外的問候語：\n\n內容：{text}"
-        
-        completion = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "你是一個專業的筆記秘書，擅長精簡歸納重點。"},
-                {"role": "user", "content": prompt}
-            ],
+    def _reduce(content):
+        prompt = f"請將以下這段筆記內容歸納成一段精簡的摘要（大約 30-50 字），並以第一人稱或重點條列方式呈現。只需回覆摘要文字，不要有額外的問候語：\n\n內容：{content}"
+        model_route = route_summary_model(content, task)
+        summary = groq_chat_completion(
+            model_route.model or route.model,
+            "你是一個專業的筆記秘書，擅長精簡歸納重點。",
+            prompt,
             temperature=0.7,
             max_tokens=200
         )
-        
-        summary = completion.choices[0].message.content.strip()
-        logger.info(f"AI 摘要生成成功: {summary[:50]}...")
+        logger.info(f"AI 摘要生成成功 ({model_route.tier}/{model_route.model}): {summary[:50]}...")
         return summary
+
+    try:
+        return summarize_long_text(text, _reduce)
     except Exception as e:
         logger.error(f"AI 摘要生成失敗: {e}")
         return text[:50] + "..." if len(text) > 50 else text
 
 
+# 網頁內容保留上限（字元），長文會以 map-reduce 摘要
+WEBPAGE_MAX_CHARS = int(os.getenv('WEBPAGE_MAX_CHARS', '60000'))
+# 競速爬取：單一來源逾時秒數與內容品質門檻
+WEBPAGE_RACE_TIMEOUT = int(os.getenv('WEBPAGE_RACE_TIMEOUT', '20'))
+WEBPAGE_MIN_CHARS = int(os.getenv('WEBPAGE_MIN_CHARS', '200'))
+# Jina AI Reader 位址（可改指向 fakes/ 本機假服務）
+JINA_READER_BASE = os.getenv('JINA_READER_BASE', 'https://r.jina.ai').rstrip('/')
+BLOCKED_PAGE_MARKERS = (
+    'access denied', 'enable javascript', 'captcha', 'are you a robot',
+    'just a moment', '請啟用 javascript', 'attention required',
+)
+
+
+URL_PATTERN = re.compile(
+    r'^https?://'  # http:// or https://
+    r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain
+    r'localhost|'  # localhost
+    r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # or ip
+    r'(?::\d+)?'  # optional port
+    r'(?:/?|[/?]\S+)$', re.IGNORECASE)
+# 從訊息中找出網址（之後再以 URL_PATTERN 驗證）
+URL_FIND_PATTERN = re.compile(r'https?://[^\s<>"\']+', re.IGNORECASE)
+# 網址結尾常黏著的標點符號
+URL_TRAILING_PUNCTUATION = '.,;:!?)]}>）】」』。，、；：！？'
+
+# 一則訊息含多個網址時：最多處理幾個、同時處理幾個
+URL_BATCH_MAX_URLS = int(os.getenv('URL_BATCH_MAX_URLS', '10'))
+URL_BATCH_MAX_WORKERS = int(os.getenv('URL_BATCH_MAX_WORKERS', '3'))
+# LINE 單則文字訊息長度上限與單次推送訊息數上限
+LINE_TEXT_MAX_CHARS = 5000
+LINE_PUSH_MAX_MESSAGES = 5
+# /search 回傳的筆數
+SEARCH_RESULT_LIMIT = int(os.getenv('SEARCH_RESULT_LIMIT', '5'))
+
+
 def is_url(text):
     """檢查文字是否為網址"""
-    url_pattern = re.compile(
-        r'^https?://'  # http:// or https://
-        r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain
-        r'localhost|'  # localhost
-        r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'  # or ip
-        r'(?::\d+)?'  # optional port
-        r'(?:/?|[/?]\S+)$', re.IGNORECASE)
-    return url_pattern.match(text) is not None
+    return URL_PATTERN.match(text) is not None
+
+
+def extract_urls(text):
+    """從訊息中找出所有網址（依出現順序，移除重複與結尾標點）"""
+    urls = []
+    seen = set()
+    for match in URL_FIND_PATTERN.finditer(text):
+        url = match.group(0).rstrip(URL_TRAILING_PUNCTUATION)
+        if not is_url(url):
+            continue
+        key = canonicalize_url(url, resolve_short=False)
+        if key in seen:
+            continue
+        seen.add(key)
+        urls.append(url)
+    return urls
 
 
 def is_threads_url(url):
@@ -560,46 +710,39 @@ def is_facebook_url(url):
     return 'facebook.com' in url_lower or 'fb.com' in url_lower or 'fb.watch' in url_lower
 
 
-def fetch_with_jina_reader(url, timeout=60):
+def fetch_with_jina_reader(url, timeout=60, cancel_event=None):
     """
     使用 Jina AI Reader 爬取網頁內容（免費、穩定）
     支援 Threads、Facebook 等難爬的網站
+    cancel_event 被設定時（例如競速中另一方已成功）不再重試，已送出的請求回來後也直接捨棄結果
     """
-    jina_url = f"https://r.jina.ai/{url}"
+    jina_url = f"{JINA_READER_BASE}/{url}"
     headers = {
         'Accept': 'text/plain',
         'User-Agent': 'Mozilla/5.0 (compatible; LineBot/1.0)',
         'X-Return-Format': 'text',
     }
     
-    # 重試機制
+    # 重試機制：由這裡的迴圈負責，共用連線池不再自動重試（否則逾時會被重送 HTTP_MAX_RETRIES 次）
     for attempt in range(2):
+        if cancel_event is not None and cancel_event.is_set():
+            logger.info(f"Jina Reader 已取消: {url[:50]}...")
+            return None, None, url
         try:
             logger.info(f"Jina Reader 嘗試第 {attempt + 1} 次: {url[:50]}...")
-            response = requests.get(jina_url, headers=headers, timeout=timeout)
+            response = http.get(jina_url, headers=headers, timeout=timeout, retry=False)
+            if cancel_event is not None and cancel_event.is_set():
+                response.close()
+                logger.info(f"Jina Reader 已取消，捨棄回應: {url[:50]}...")
+                return None, None, url
             response.raise_for_status()
             response.encoding = 'utf-8'
             
-            content = response.text.strip()
-            
-            if not content or len(content) < 30:
-                logger.warning(f"Jina Reader 回傳內容過短: {len(content)} 字")
+            title, content = parse_jina_text(response.text, WEBPAGE_MAX_CHARS)
+            if not content:
+                logger.warning(f"Jina Reader 回傳內容過短: {len(response.text.strip())} 字")
                 continue
             
-            # 從內容中提取標題（Jina 格式通常第一行是標題）
-            lines = content.split('\n')
-            title = lines[0].strip() if lines else "網頁內容"
-            
-            # 移除標題行，保留正文
-            if title.startswith('# '):
-                title = title[2:]
-            if title.startswith('Title: '):
-                title = title[7:]
-            
-            # 清理內容
-            content = '\n'.join(lines[1:]).strip() if len(lines) > 1 else content
-            content = content[:8000]  # 限制長度
-            
             logger.info(f"Jina Reader 爬取成功: {title[:50]}... ({len(content)} 字)")
             return title, content, url
             
@@ -640,60 +783,49 @@ def fetch_facebook_content(url):
     return None, None, url
 
 
-def fetch_webpage_content(url):
+def fetch_direct_content(url, cancel_event=None, meta=None):
     """
-    爬取網頁內容，優先使用 Jina AI Reader，失敗則用傳統方式
+    傳統爬蟲方式：串流下載網頁並以 lxml 單次掃描擷取標題與內文
+    cancel_event 被設定時中止下載；meta 會寫入 ETag / Last-Modified 供快取重新驗證，
+    meta 帶有 if_none_match / if_modified_since 時送出條件式請求，304 時設定 meta['not_modified']
     """
-    # 先嘗試 Jina AI Reader
-    title, content, url = fetch_with_jina_reader(url)
-    if title and content:
-        return title, content, url
-    
-    # 備援：傳統爬蟲方式
-    logger.info("Jina Reader 失敗，嘗試傳統爬蟲方式...")
     try:
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7',
         }
+        if meta and meta.get('if_none_match'):
+            headers['If-None-Match'] = meta['if_none_match']
+        if meta and meta.get('if_modified_since'):
+            headers['If-Modified-Since'] = meta['if_modified_since']
         
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-        response.encoding = response.apparent_encoding or 'utf-8'
-        
-        soup = BeautifulSoup(response.text, 'lxml')
+        response = http.get(url, headers=headers, timeout=15, stream=True)
+        try:
+            if response.status_code == 304 and meta is not None:
+                meta['not_modified'] = True
+                return None, None, url
+            response.raise_for_status()
+            if meta is not None:
+                meta['etag'] = response.headers.get('ETag')
+                meta['last_modified'] = response.headers.get('Last-Modified')
+            title, text = extract_from_response(response, max_chars=WEBPAGE_MAX_CHARS, cancel_event=cancel_event)
+        finally:
+            response.close()
         
-        # 移除不需要的元素
-        for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe', 'noscript']):
-            element.decompose()
+        if title is None:
+            logger.info(f"傳統爬蟲已取消: {url[:50]}...")
+            return None, None, url
         
-        # 取得標題
-        title = ""
-        if soup.title:
-            title = soup.title.string.strip() if soup.title.string else ""
         if not title:
-            h1 = soup.find('h1')
-            title = h1.get_text(strip=True) if h1 else urlparse(url).netloc
-        
-        # 取得主要內容
-        # 優先找 article 或 main 標籤
-        main_content = soup.find('article') or soup.find('main') or soup.find('div', class_=re.compile(r'content|article|post|entry'))
-        
-        if main_content:
-            text = main_content.get_text(separator='\n', strip=True)
-        else:
-            # 取得所有段落文字
-            paragraphs = soup.find_all(['p', 'h1', 'h2', 'h3', 'li'])
-            text = '\n'.join([p.get_text(strip=True) for p in paragraphs if len(p.get_text(strip=True)) > 20])
-        
-        # 清理文字
-        text = re.sub(r'\n{3,}', '\n\n', text)  # 移除多餘空行
-        text = text[:8000]  # 限制長度避免 token 過多
+            title = urlparse(url).netloc
         
         logger.info(f"網頁爬取成功: {title[:50]}... ({len(text)} 字)")
         return title, text, url
         
+    except NonHtmlContentError as e:
+        logger.warning(f"網頁爬取略過: {e} ({url})")
+        return None, None, url
     except requests.exceptions.Timeout:
         logger.error(f"網頁爬取超時: {url}")
         return None, None, url
@@ -705,22 +837,163 @@ def fetch_webpage_content(url):
         return None, None, url
 
 
+def is_quality_content(title, content):
+    """檢查爬取結果是否可用（長度足夠且不是阻擋頁面）"""
+    if not title or not content:
+        return False
+    if len(content) < WEBPAGE_MIN_CHARS:
+        return False
+    head = content[:500].lower()
+    return not any(marker in head for marker in BLOCKED_PAGE_MARKERS)
+
+
+def fetch_webpage_content(url, meta=None):
+    """
+    爬取一般網頁內容：同時啟動 Jina AI Reader 與傳統爬蟲，
+    採用最先通過品質檢查的結果並取消另一方；傳統爬蟲使用自己的 meta，勝出（或作為備援採用）時才複製回 meta，
+    落敗的一方即使稍後才結束也不會影響回傳結果
+    快取重新驗證時（meta 帶有 if_none_match / if_modified_since）先只以傳統爬蟲送出條件式請求，
+    304 或取得可用內容就不必再競速
+    """
+    if meta and (meta.get('if_none_match') or meta.get('if_modified_since')):
+        title, content, _ = fetch_direct_content(url, meta=meta)
+        if meta.get('not_modified'):
+            return None, None, url
+        if is_quality_content(title, content):
+            return title, content, url
+        meta.pop('if_none_match', None)
+        meta.pop('if_modified_since', None)
+
+    cancel_event = threading.Event()
+    racer_meta = {"Jina Reader": {}, "傳統爬蟲": {}}
+    executor = ThreadPoolExecutor(max_workers=2)
+    futures = {
+        executor.submit(tracer.wrap(fetch_with_jina_reader), url, WEBPAGE_RACE_TIMEOUT, cancel_event): "Jina Reader",
+        executor.submit(tracer.wrap(fetch_direct_content), url, cancel_event, racer_meta["傳統爬蟲"]): "傳統爬蟲",
+    }
+    fallback = None
+    
+    try:
+        pending = set(futures)
+        deadline = time.monotonic() + WEBPAGE_RACE_TIMEOUT * 2
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                logger.warning(f"網頁爬取競速逾時: {url}")
+                break
+            for future in done:
+                try:
+                    title, content, _ = future.result()
+                except Exception as e:
+                    logger.error(f"{futures[future]} 爬取失敗: {e}")
+                    continue
+                if is_quality_content(title, content):
+                    logger.info(f"網頁爬取競速由 {futures[future]} 勝出: {url[:50]}...")
+                    if meta is not None:
+                        meta.update(racer_meta[futures[future]])
+                    return title, content, url
+                # 未通過品質檢查但有內容，作為最後備援
+                if title and content and (fallback is None or len(content) > len(fallback[1])):
+                    fallback = (title, content, futures[future])
+    finally:
+        # 落敗的一方不再等待：進行中的請求最多到 WEBPAGE_RACE_TIMEOUT 結束，結果與 meta 都不會被採用
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    if fallback:
+        logger.info(f"網頁爬取結果未通過品質檢查，使用較長的結果: {url[:50]}...")
+        if meta is not None:
+            meta.update(racer_meta[fallback[2]])
+        return fallback[0], fallback[1], url
+    return None, None, url
+
+
+def groq_chat_completion(model, system_prompt, prompt, temperature, max_tokens, max_wait=RATE_LIMIT_MAX_WAIT):
+    """在速率限制下呼叫 Groq 對話模型，回傳回覆文字"""
+    completion = call_with_rate_limit(
+        "groq", model,
+        lambda: get_groq_client().chat.completions.with_raw_response.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens
+        ),
+        estimated_tokens=estimate_tokens(prompt, max_tokens),
+        max_wait=max_wait
+    )
+    return completion.choices[0].message.content.strip()
+
+
+# 長文摘要 map / reduce 呼叫的輸出上限，與 prompt 本身約佔的 token 數
+SUMMARY_MAP_MAX_TOKENS = 500
+SUMMARY_REDUCE_MAX_TOKENS = 800
+SUMMARY_PROMPT_TOKENS = 200
+# 長文摘要每次呼叫排隊等待 Groq 額度的上限（秒）。摘要在 /callback 內同步執行，
+# 爬取、map、reduce 加總必須遠低於 gunicorn 的 120 秒 timeout；超出額度的內容改為取樣（見 summary_max_chunks）
+SUMMARY_MAX_WAIT = float(os.getenv('SUMMARY_MAX_WAIT', '15'))
+
+
+def summary_chunk_chars():
+    """
+    區塊字數不超過 Groq token bucket 容量扣除輸出與 prompt，避免單次 map / reduce 呼叫就超過每分鐘額度
+    （reduce 的輸入最多也是一個區塊長，超過時 summarizer 會再做一輪 map-reduce）
+    """
+    capacity = min(limiter_registry.get("groq", model).token_capacity()
+                   for model in (SUMMARY_SMALL_MODEL, SUMMARY_LARGE_MODEL))
+    return max(500, min(SUMMARY_CHUNK_CHARS, int(capacity) - SUMMARY_REDUCE_MAX_TOKENS - SUMMARY_PROMPT_TOKENS))
+
+
+def summary_max_chunks(chunk_chars):
+    """map 階段最多處理的區塊數：小模型目前可用的 token 加上 SUMMARY_MAX_WAIT 秒內補充的量"""
+    budget = limiter_registry.get("groq", SUMMARY_SMALL_MODEL).token_budget(SUMMARY_MAX_WAIT)
+    per_chunk = chunk_chars + SUMMARY_PROMPT_TOKENS + SUMMARY_MAP_MAX_TOKENS
+    return max(1, int(budget // per_chunk))
+
+
+def summarize_long_text(text, reduce_fn):
+    """依 Groq 額度決定區塊大小與數量後進行 map-reduce 摘要"""
+    chunk_chars = summary_chunk_chars()
+    return map_reduce_summarize(text, summarize_chunk, reduce_fn, chunk_chars=chunk_chars,
+                                max_chunks=summary_max_chunks(chunk_chars))
+
+
+def summarize_chunk(chunk):
+    """
+    Map 階段：摘錄單一區塊的重點
+    只是條列重點，一律使用小模型（也不佔大模型的額度）；最終摘要才由 reduce 依長度路由
+    """
+    prompt = f"以下是一份長文件的其中一段，請用繁體中文條列這段的重點與關鍵數據（最多 8 點），只回覆條列內容：\n\n{chunk}"
+    return groq_chat_completion(
+        SUMMARY_SMALL_MODEL,
+        "你是一個專業的內容分析師，擅長快速抓取文章重點。",
+        prompt,
+        temperature=0.3,
+        max_tokens=SUMMARY_MAP_MAX_TOKENS,
+        max_wait=SUMMARY_MAX_WAIT
+    )
+
+
+@timed_stage('webpage_summary', 'groq')
 def generate_webpage_summary(title, content, url):
     """
     使用 AI 生成網頁內容摘要
+    長文會以 map-reduce 方式分段並行摘要後再合併，涵蓋完整內容
     """
-    if not groq_client:
+    if not get_groq_client():
         logger.warning("未偵測到 Groq 客戶端，跳過摘要生成")
         return content[:200] + "..." if len(content) > 200 else content
 
-    try:
+    def _reduce(text):
         prompt = f"""請閱讀以下網頁內容，並生成一份結構化的摘要：
 
 網頁標題：{title}
 網址：{url}
 
 內容：
-{content[:6000]}
+{text}
 
 請用繁體中文回覆，格式如下：
 📌 重點摘要（3-5 個要點，每點一行）
@@ -728,73 +1001,116 @@ def generate_webpage_summary(title, content, url):
 🔗 相關主題標籤（2-3 個）
 
 請直接回覆摘要內容，不要有開場白。"""
-        
-        completion = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "你是一個專業的內容分析師，擅長快速抓取文章重點並生成結構化摘要。"},
-                {"role": "user", "content": prompt}
-            ],
+        route = route_summary_model(text, TASK_WEBPAGE)
+        summary = groq_chat_completion(
+            route.model,
+            "你是一個專業的內容分析師，擅長快速抓取文章重點並生成結構化摘要。",
+            prompt,
             temperature=0.5,
-            max_tokens=800
+            max_tokens=SUMMARY_REDUCE_MAX_TOKENS,
+            max_wait=SUMMARY_MAX_WAIT
         )
-        
-        summary = completion.choices[0].message.content.strip()
-        logger.info(f"網頁摘要生成成功: {summary[:50]}...")
+        logger.info(f"網頁摘要生成成功 ({route.tier}/{route.model}): {summary[:50]}...")
         return summary
+
+    try:
+        return summarize_long_text(content, _reduce)
     except Exception as e:
         logger.error(f"網頁摘要生成失敗: {e}")
         return content[:200] + "..." if len(content) > 200 else content
 
 
-def save_to_notion(content, summary, note_type):
+@timed_stage('meeting_summary', 'groq')
+def generate_meeting_summary(conversation_text):
     """
-    將內容儲存到 Notion 資料庫
+    使用 AI 生成會議記錄摘要（map-reduce，適用於很長的會議逐字稿）
     """
-    notion_token = os.getenv('NOTION_TOKEN')
-    database_id = os.getenv('NOTION_DATABASE_ID')
-    
-    if not notion_token or not database_id:
-        logger.warning("缺少 Notion 設定，跳過儲存功能")
-        return False
+    if not get_groq_client():
+        logger.warning("未偵測到 Groq 客戶端，跳過會議摘要生成")
+        return conversation_text[:200] + "..." if len(conversation_text) > 200 else conversation_text
+
+    def _reduce(text):
+        prompt = f"""以下是一場會議的記錄內容，請整理成會議摘要：
+
+{text}
+
+請用繁體中文回覆，格式如下：
+📌 討論重點（3-5 點）
+✅ 決議事項
+📋 待辦事項（含負責人，若有提到）
+
+請直接回覆摘要內容，不要有開場白。"""
+        route = route_summary_model(text, TASK_MEETING)
+        summary = groq_chat_completion(
+            route.model,
+            "你是一個專業的會議記錄秘書，擅長整理討論重點與決議。",
+            prompt,
+            temperature=0.5,
+            max_tokens=SUMMARY_REDUCE_MAX_TOKENS,
+            max_wait=SUMMARY_MAX_WAIT
+        )
+        logger.info(f"會議摘要生成成功 ({route.tier}/{route.model}): {summary[:50]}...")
+        return summary
 
     try:
-        import requests
-        url = "https://api.notion.com/v1/pages"
-        headers = {
-            "Authorization": "Bearer " + notion_token,
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28"
-        }
-        
-        data = {
-            "parent": { "database_id": database_id },
-            "properties": {
-                "名稱": {
-                    "title": [{ "text": { "content": content[:2000] } }]  # Notion Title 上限約 2000 字
-                },
-                "摘要": {
-                    "rich_text": [{ "text": { "content": summary } }]
-                },
-                "類型": {
-                    "select": { "name": note_type }
-                }
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            logger.info(f"Notion 儲存成功：{note_type}")
-            return True
-        else:
-            logger.error(f"Notion 儲存失敗 (狀態碼: {response.status_code}): {response.text}")
-            return False
-            
+        return summarize_long_text(conversation_text, _reduce)
     except Exception as e:
-        logger.error(f"Notion 儲存過程出錯 (Exception): {e}")
-        return False
+        logger.error(f"會議摘要生成失敗: {e}")
+        return conversation_text[:200] + "..." if len(conversation_text) > 200 else conversation_text
+
+
+def push_notion_results(user_id, results):
+    """Notion 背景寫入完成後，推送同步結果給用戶（同一用戶的多筆結果合併成一則）"""
+    if not line_bot_api:
+        return
+    lines = [f"{'✅' if ok else '⚠️'} {label}" for label, ok in results]
+    failed = sum(1 for _, ok in results if not ok)
+    header = "☁️ Notion 同步完成" if not failed else f"☁️ Notion 同步結果（{failed} 筆失敗）"
+    line_bot_api.push_message(user_id, TextSendMessage(text=header + "\n\n" + "\n".join(lines)))
+
+
+def notion_status_text(job_id, user_id):
+    """依 Notion 寫入佇列狀態產生回覆文字，並讓用戶在寫入完成時收到通知"""
+    if not job_id:
+        return "⚠️ Notion 同步失敗 (請檢查金鑰)"
+    status = notion_writer.subscribe(job_id, user_id)
+    if status == 'sent':
+        return "✅ 已同步至 Notion"
+    if status == 'failed':
+        return "⚠️ Notion 同步失敗"
+    return "⏳ 正在同步至 Notion，完成後會通知您"
+
+
+def update_note_index(job, ok, data):
+    """Notion 頁面建立完成後，將頁面 id 與連結寫回筆記索引與搜尋索引"""
+    if job.path != "/pages":
+        return
+    canonical_url = job.meta.get('canonical_url')
+    if canonical_url:
+        if ok:
+            note_index.mark_saved(canonical_url, data.get('id'), data.get('url'))
+        else:
+            note_index.remove_pending(canonical_url)
+    if ok and job.meta.get('note_key'):
+        note_search.set_page_url(job.meta['note_key'], data.get('url'))
+        near_dup_index.set_page_url(job.meta['note_key'], data.get('url'))
+
 
+notion_writer.set_notifier(push_notion_results)
+notion_writer.add_listener(update_note_index)
+notion_writer.start()
 
+metrics.callback_gauge('linebot_notion_queue_depth', 'Notion 寫入佇列中尚未完成的工作數',
+                       lambda: notion_writer.get_stats()["pending"])
+metrics.callback_gauge('linebot_single_flight_in_flight', '合併執行中的網址 / 檔案工作數',
+                       lambda: note_flight.get_stats()["in_flight"])
+metrics.callback_gauge('linebot_sessions', '記憶體中的用戶會話數',
+                       lambda: len(session_store))
+metrics.callback_gauge('linebot_meeting_logs_open', '進行中的會議記錄數',
+                       lambda: meeting_logs.get_stats()["open_logs"])
+
+
+@timed_stage('drive_upload', 'google')
 def upload_to_google_drive(file_data, file_name):
     """
     將檔案上傳到 Google Drive 並取得公開分享連結 (使用 OAuth 2.0)
@@ -815,6 +1131,7 @@ def upload_to_google_drive(file_data, file_name):
         if folder_id:
             file_metadata['parents'] = [folder_id]
             
+        from googleapiclient.http import MediaIoBaseUpload
         media = MediaIoBaseUpload(io.BytesIO(file_data), mimetype='image/jpeg', resumable=True)
         file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
         file_id = file.get('id')
@@ -846,6 +1163,7 @@ def get_google_auth_url():
         credentials_json = base64.b64decode(base64_data).decode('utf-8')
         credentials_info = json.loads(credentials_json)
         
+        from google_auth_oauthlib.flow import InstalledAppFlow
         flow = InstalledAppFlow.from_client_config(
             credentials_info,
             scopes=["https://www.googleapis.com/auth/drive"]
@@ -870,6 +1188,7 @@ def complete_google_auth(code):
         credentials_json = base64.b64decode(base64_data).decode('utf-8')
         credentials_info = json.loads(credentials_json)
         
+        from google_auth_oauthlib.flow import InstalledAppFlow
         flow = InstalledAppFlow.from_client_config(
             credentials_info,
             scopes=["https://www.googleapis.com/auth/drive"]
@@ -884,6 +1203,7 @@ def complete_google_auth(code):
         return f"❌ 授權失敗: {e}"
 
 
+@timed_stage('image_analysis')
 def analyze_image_with_ai(image_data):
     """
     使用 Groq Llama 4 Scout 或 OpenAI GPT-4o 讀取圖片
@@ -892,26 +1212,30 @@ def analyze_image_with_ai(image_data):
     base64_image = base64.b64encode(image_data).decode('utf-8')
     
     # 優先使用 Groq Llama 4 Scout（免費，支援視覺）
-    if groq_client:
+    if get_groq_client():
         try:
             logger.info("使用 Groq Llama 4 Scout 分析圖片...")
-            response = groq_client.chat.completions.create(
-                model="meta-llama/llama-4-scout-17b-16e-instruct",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "請幫我分析這張圖片內容。請回覆一個簡單的 json 格式，包含兩個欄位：'title' (適合作為筆記標題，15字以內) 與 'summary' (一段詳細的內容摘要，約 100 字以內)。請只回覆 JSON 字串，不要有其他文字。"},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
+            response = call_with_rate_limit(
+                "groq", "meta-llama/llama-4-scout-17b-16e-instruct",
+                lambda: get_groq_client().chat.completions.with_raw_response.create(
+                    model="meta-llama/llama-4-scout-17b-16e-instruct",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": "請幫我分析這張圖片內容。請回覆一個簡單的 json 格式，包含兩個欄位：'title' (適合作為筆記標題，15字以內) 與 'summary' (一段詳細的內容摘要，約 100 字以內)。請只回覆 JSON 字串，不要有其他文字。"},
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/jpeg;base64,{base64_image}",
+                                    },
                                 },
-                            },
-                        ],
-                    }
-                ],
-                max_tokens=300,
+                            ],
+                        }
+                    ],
+                    max_tokens=300,
+                ),
+                estimated_tokens=IMAGE_TOKEN_ESTIMATE + 300
             )
             
             response_text = response.choices[0].message.content.strip()
@@ -936,26 +1260,32 @@ def analyze_image_with_ai(image_data):
             logger.error(f"Groq Llama 4 圖片分析失敗: {e}")
     
     # 備援：使用 OpenAI GPT-4o（需付費）
-    if openai_client:
+    if get_openai_client():
+        if get_groq_client():
+            record_fallback('image_analysis', 'groq', 'openai')
         try:
             logger.info("使用 OpenAI GPT-4o-mini 分析圖片...")
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "請幫我分析這張圖片內容。請回覆一個簡單的 json 格式，包含兩個欄位：'title' (適合作為筆記標題，15字以內) 與 'summary' (一段詳細的內容摘要，約 100 字以內)。請只回覆 JSON 字串，不要有其他文字。"},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
+            response = call_with_rate_limit(
+                "openai", "gpt-4o-mini",
+                lambda: get_openai_client().chat.completions.with_raw_response.create(
+                    model="gpt-4o-mini",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": "請幫我分析這張圖片內容。請回覆一個簡單的 json 格式，包含兩個欄位：'title' (適合作為筆記標題，15字以內) 與 'summary' (一段詳細的內容摘要，約 100 字以內)。請只回覆 JSON 字串，不要有其他文字。"},
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/jpeg;base64,{base64_image}",
+                                    },
                                 },
-                            },
-                        ],
-                    }
-                ],
-                max_tokens=300,
+                            ],
+                        }
+                    ],
+                    max_tokens=300,
+                ),
+                estimated_tokens=IMAGE_TOKEN_ESTIMATE + 300
             )
             
             response_text = response.choices[0].message.content.strip()
@@ -974,188 +1304,232 @@ def analyze_image_with_ai(image_data):
     return "圖片筆記", "無法分析圖片內容 (請確認 API Key)"
 
 
+def note_key_for(note_type, content):
+    """非網址筆記在搜尋與近似重複索引中的 key"""
+    return f"{note_type}:{content_hash(content.encode('utf-8'))}"
+
+
 def save_to_notion(content, summary, note_type, url=None):
     """
-    將內容儲存到 Notion 資料庫，支援 URL
+    將內容排入 Notion 寫入佇列，支援 URL，並寫入本地搜尋索引
+    回傳佇列工作 id；未設定 Notion 時回傳 None
     """
-    notion_token = os.getenv('NOTION_TOKEN')
-    database_id = os.getenv('NOTION_DATABASE_ID')
+    note_key = note_key_for(note_type, content)
+    note_search.add(note_key, content.split('\n', 1)[0][:100], summary, content, note_type, url)
     
-    if not notion_token or not database_id:
+    if not is_notion_configured():
         logger.warning("缺少 Notion 設定，跳過儲存功能")
-        return False
+        return None
 
-    try:
-        import requests
-        api_url = "https://api.notion.com/v1/pages"
-        headers = {
-            "Authorization": "Bearer " + notion_token,
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28"
+    properties = {
+        "名稱": {
+            "title": [{ "text": { "content": content[:2000] } }]
+        },
+        "摘要": {
+            "rich_text": [{ "text": { "content": summary[:2000] } }]
+        },
+        "類型": {
+            "select": { "name": note_type }
         }
-        
-        properties = {
+    }
+    
+    if url:
+        properties["URL"] = {
+            "url": url
+        }
+    
+    data = {
+        "parent": { "database_id": os.getenv('NOTION_DATABASE_ID') },
+        "properties": properties
+    }
+    
+    return notion_writer.submit("POST", "/pages", data, f"{note_type}：{content[:30]}", meta={"note_key": note_key})
+
+
+def split_notion_text(text, max_len=1800):
+    """將長文依段落切成多段（Notion 每個 block 最多 2000 字，過長的段落會再硬切）"""
+    chunks = []
+    current_chunk = ""
+    for p in text.split('\n'):
+        while len(p) > max_len:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+                current_chunk = ""
+            chunks.append(p[:max_len])
+            p = p[max_len:]
+        if len(current_chunk) + len(p) + 1 > max_len:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+            current_chunk = p
+        else:
+            current_chunk += "\n" + p if current_chunk else p
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def notion_append_followups(chunks):
+    """將文字段落轉成頁面建立後依序執行的附加請求（每批 NOTION_APPEND_BATCH_SIZE 個 block）"""
+    body_blocks = [{
+        "object": "block",
+        "type": "paragraph",
+        "paragraph": {
+            "rich_text": [{"type": "text", "text": {"content": chunk}}]
+        }
+    } for chunk in chunks]
+    return [
+        ("PATCH", "/blocks/{page_id}/children", {"children": body_blocks[i:i + NOTION_APPEND_BATCH_SIZE]})
+        for i in range(0, len(body_blocks), NOTION_APPEND_BATCH_SIZE)
+    ]
+
+
+def save_webpage_to_notion(title, summary, url, webpage_content, note_type="網頁筆記", meta=None):
+    """
+    將網頁內容排入 Notion 寫入佇列，包含 Page 內文
+    分兩階段寫入：先建立含屬性與摘要的頁面，原文再於背景分批附加，不限段落數
+    同時寫入本地搜尋索引；回傳佇列工作 id，未設定 Notion 時回傳 None
+    """
+    note_search.add(url, title, summary, webpage_content, note_type, url)
+    
+    if not is_notion_configured():
+        logger.warning("缺少 Notion 設定，跳過儲存功能")
+        return None
+
+    # 建立頁面時一併送出的 children blocks
+    children = []
+    
+    # 加入來源連結
+    children.append({
+        "object": "block",
+        "type": "bookmark",
+        "bookmark": {
+            "url": url
+        }
+    })
+    
+    # 加入分隔線
+    children.append({
+        "object": "block",
+        "type": "divider",
+        "divider": {}
+    })
+    
+    # 加入 AI 摘要標題
+    children.append({
+        "object": "block",
+        "type": "heading_2",
+        "heading_2": {
+            "rich_text": [{"type": "text", "text": {"content": "📝 AI 摘要"}}]
+        }
+    })
+    
+    # 加入摘要內容
+    children.append({
+        "object": "block",
+        "type": "callout",
+        "callout": {
+            "rich_text": [{"type": "text", "text": {"content": summary[:1800]}}],
+            "icon": {"emoji": "💡"}
+        }
+    })
+    
+    # 加入原文標題
+    children.append({
+        "object": "block",
+        "type": "heading_2",
+        "heading_2": {
+            "rich_text": [{"type": "text", "text": {"content": "📄 原文內容"}}]
+        }
+    })
+    
+    # 網頁原文內容於頁面建立後分批附加
+    followups = notion_append_followups(split_notion_text(webpage_content))
+    
+    data = {
+        "parent": {"database_id": os.getenv('NOTION_DATABASE_ID')},
+        "properties": {
             "名稱": {
-                "title": [{ "text": { "content": content[:2000] } }]
+                "title": [{"text": {"content": title[:2000]}}]
             },
             "摘要": {
-                "rich_text": [{ "text": { "content": summary[:2000] } }]
+                "rich_text": [{"text": {"content": summary[:2000]}}]
             },
             "類型": {
-                "select": { "name": note_type }
-            }
-        }
-        
-        if url:
-            properties["URL"] = {
+                "select": {"name": note_type}
+            },
+            "URL": {
                 "url": url
             }
-        
-        data = {
-            "parent": { "database_id": database_id },
-            "properties": properties
-        }
-        
-        response = requests.post(api_url, headers=headers, json=data)
-        if response.status_code == 200:
-            logger.info(f"Notion 儲存成功：{note_type}")
-            return True
-        else:
-            logger.error(f"Notion 儲存失敗 (狀態碼: {response.status_code}): {response.text}")
-            return False
-            
-    except Exception as e:
-        logger.error(f"Notion 儲存過程出錯 (Exception): {e}")
-        return False
+        },
+        "children": children
+    }
+    
+    meta = dict(meta or {}, note_key=url)
+    return notion_writer.submit("POST", "/pages", data, f"{note_type}：{title[:30]}", followups=followups, meta=meta)
 
 
-def save_webpage_to_notion(title, summary, url, webpage_content, note_type="網頁筆記"):
+def save_meeting_to_notion(title, summary, conversation_text, chunks):
     """
-    將網頁內容儲存到 Notion，包含 Page 內文
+    將會議記錄排入 Notion 寫入佇列：頁面含摘要，逐字稿依 chunks 分批附加到內文
+    同時寫入本地搜尋索引；回傳佇列工作 id，未設定 Notion 時回傳 None
     """
-    notion_token = os.getenv('NOTION_TOKEN')
-    database_id = os.getenv('NOTION_DATABASE_ID')
-    
-    if not notion_token or not database_id:
+    note_type = "會議記錄"
+    note_key = note_key_for(note_type, conversation_text)
+    note_search.add(note_key, title, summary, conversation_text, note_type)
+
+    if not is_notion_configured():
         logger.warning("缺少 Notion 設定，跳過儲存功能")
-        return False
+        return None
 
-    try:
-        import requests
-        api_url = "https://api.notion.com/v1/pages"
-        headers = {
-            "Authorization": "Bearer " + notion_token,
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28"
-        }
-        
-        # 將網頁內容分段（Notion 每個 block 最多 2000 字）
-        def split_content(text, max_len=1800):
-            paragraphs = text.split('\n')
-            chunks = []
-            current_chunk = ""
-            for p in paragraphs:
-                if len(current_chunk) + len(p) + 1 > max_len:
-                    if current_chunk:
-                        chunks.append(current_chunk.strip())
-                    current_chunk = p
-                else:
-                    current_chunk += "\n" + p if current_chunk else p
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            return chunks[:20]  # 最多 20 個區塊
-        
-        # 建立 children blocks
-        children = []
-        
-        # 加入來源連結
-        children.append({
-            "object": "block",
-            "type": "bookmark",
-            "bookmark": {
-                "url": url
-            }
-        })
-        
-        # 加入分隔線
-        children.append({
-            "object": "block",
-            "type": "divider",
-            "divider": {}
-        })
-        
-        # 加入 AI 摘要標題
-        children.append({
+    children = [
+        {
             "object": "block",
             "type": "heading_2",
             "heading_2": {
                 "rich_text": [{"type": "text", "text": {"content": "📝 AI 摘要"}}]
             }
-        })
-        
-        # 加入摘要內容
-        children.append({
+        },
+        {
             "object": "block",
             "type": "callout",
             "callout": {
                 "rich_text": [{"type": "text", "text": {"content": summary[:1800]}}],
                 "icon": {"emoji": "💡"}
             }
-        })
-        
-        # 加入原文標題
-        children.append({
+        },
+        {
             "object": "block",
             "type": "heading_2",
             "heading_2": {
-                "rich_text": [{"type": "text", "text": {"content": "📄 原文內容"}}]
+                "rich_text": [{"type": "text", "text": {"content": "🎙️ 會議內容"}}]
             }
-        })
-        
-        # 加入網頁原文內容
-        content_chunks = split_content(webpage_content)
-        for chunk in content_chunks:
-            if chunk.strip():
-                children.append({
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {
-                        "rich_text": [{"type": "text", "text": {"content": chunk}}]
-                    }
-                })
-        
-        data = {
-            "parent": {"database_id": database_id},
-            "properties": {
-                "名稱": {
-                    "title": [{"text": {"content": title[:2000]}}]
-                },
-                "摘要": {
-                    "rich_text": [{"text": {"content": summary[:2000]}}]
-                },
-                "類型": {
-                    "select": {"name": note_type}
-                },
-                "URL": {
-                    "url": url
-                }
+        },
+    ]
+    followups = notion_append_followups(
+        block for chunk in chunks for block in split_notion_text(chunk)
+    )
+
+    data = {
+        "parent": {"database_id": os.getenv('NOTION_DATABASE_ID')},
+        "properties": {
+            "名稱": {
+                "title": [{"text": {"content": title[:2000]}}]
             },
-            "children": children
-        }
-        
-        response = requests.post(api_url, headers=headers, json=data)
-        if response.status_code == 200:
-            logger.info(f"Notion 網頁筆記儲存成功：{title[:30]}")
-            return True
-        else:
-            logger.error(f"Notion 儲存失敗 (狀態碼: {response.status_code}): {response.text}")
-            return False
-            
-    except Exception as e:
-        logger.error(f"Notion 儲存過程出錯 (Exception): {e}")
-        return False
+            "摘要": {
+                "rich_text": [{"text": {"content": summary[:2000]}}]
+            },
+            "類型": {
+                "select": {"name": note_type}
+            }
+        },
+        "children": children
+    }
+
+    return notion_writer.submit("POST", "/pages", data, f"{note_type}：{title[:30]}", followups=followups,
+                                meta={"note_key": note_key})
 
 
+@timed_stage('transcribe', 'local_whisper')
 def transcribe_audio_with_local_whisper(audio_data):
     """
     使用本地 Whisper 模型轉錄音檔
@@ -1224,35 +1598,45 @@ def transcribe_audio_with_local_whisper(audio_data):
         return None
 
 
+def open_message_sheet():
+    """開啟訊息記錄工作表（缺少標題列時建立），失敗時回傳 None"""
+    client = initialize_google_sheets()
+    if not client:
+        logger.error("無法連接 Google Sheets")
+        return None
+    
+    # 開啟指定的試算表
+    import gspread
+    try:
+        spreadsheet = client.open_by_key(GOOGLE_SHEETS_ID)
+        sheet = spreadsheet.sheet1
+    except gspread.SpreadsheetNotFound:
+        logger.error(f"找不到 Google Sheets ID: {GOOGLE_SHEETS_ID}")
+        return None
+    except Exception as e:
+        logger.error(f"開啟 Google Sheets 失敗: {e}")
+        return None
+    
+    # 檢查是否有標題列，如果沒有則建立
+    try:
+        header = sheet.row_values(1)
+        if not header or len(header) < 4:
+            sheet.clear()
+            sheet.append_row(["時間戳記", "用戶ID", "用戶顯示名稱", "訊息內容"])
+            logger.info("建立 Google Sheets 標題列")
+    except Exception as e:
+        logger.warning(f"檢查標題列時發生錯誤: {e}")
+    return sheet
+
+
+@timed_stage('sheets', 'google')
 def save_message_to_sheets(user_id, user_name, message_text):
     """儲存訊息到 Google Sheets"""
     try:
-        client = initialize_google_sheets()
-        if not client:
-            logger.error("無法連接 Google Sheets")
+        sheet = open_message_sheet()
+        if not sheet:
             return False
         
-        # 開啟指定的試算表
-        try:
-            spreadsheet = client.open_by_key(GOOGLE_SHEETS_ID)
-            sheet = spreadsheet.sheet1
-        except gspread.SpreadsheetNotFound:
-            logger.error(f"找不到 Google Sheets ID: {GOOGLE_SHEETS_ID}")
-            return False
-        except Exception as e:
-            logger.error(f"開啟 Google Sheets 失敗: {e}")
-            return False
-        
-        # 檢查是否有標題列，如果沒有則建立
-        try:
-            header = sheet.row_values(1)
-            if not header or len(header) < 4:
-                sheet.clear()
-                sheet.append_row(["時間戳記", "用戶ID", "用戶顯示名稱", "訊息內容"])
-                logger.info("建立 Google Sheets 標題列")
-        except Exception as e:
-            logger.warning(f"檢查標題列時發生錯誤: {e}")
-        
         # 新增記錄
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         sheet.append_row([timestamp, user_id, user_name, message_text])
@@ -1263,13 +1647,36 @@ def save_message_to_sheets(user_id, user_name, message_text):
     except Exception as e:
         logger.error(f"儲存到 Google Sheets 失敗: {e}")
         return False
+
+
+@timed_stage('sheets', 'google')
+def save_meeting_to_sheets(user_id, user_name, chunks):
+    """
+    會議記錄分段寫入 Google Sheets：每段一列（單格不超過 MEETING_SHEETS_CELL_CHARS 字），
+    以 append_rows 每次送出 MEETING_SHEETS_BATCH_ROWS 列
+    """
+    try:
+        sheet = open_message_sheet()
+        if not sheet:
+            return False
+        
+        rows = [
+            [datetime.fromtimestamp(start).strftime("%Y-%m-%d %H:%M:%S"), user_id, user_name, text]
+            for start, _, text in chunks
+        ]
+        for i in range(0, len(rows), MEETING_SHEETS_BATCH_ROWS):
+            sheet.append_rows(rows[i:i + MEETING_SHEETS_BATCH_ROWS])
+        
+        logger.info(f"成功儲存會議記錄到 Google Sheets - 用戶: {user_name}, 共 {len(rows)} 列")
+        return True
         
     except Exception as e:
-        logger.error(f"儲存到 Google Sheets 失敗: {e}")
+        logger.error(f"儲存會議記錄到 Google Sheets 失敗: {e}")
         return False
 
 
 @app.route("/health", methods=['GET'])
+@track_handler('http_health')
 def health_check():
     """健康檢查端點"""
     try:
@@ -1280,6 +1687,20 @@ def health_check():
         return jsonify({
             "status": "healthy",
             "google_sheets": sheets_status,
+            "rate_limits": limiter_registry.get_stats(),
+            "http_pools": http.get_metrics(),
+            "page_cache": page_cache.get_stats(),
+            "single_flight": note_flight.get_stats(),
+            "notion_writer": notion_writer.get_stats(),
+            "note_index": note_index.get_stats(),
+            "note_search": note_search.get_stats(),
+            "near_dup": near_dup_index.get_stats(),
+            "meeting_logs": meeting_logs.get_stats(),
+            "sessions": session_store.get_stats(),
+            "profile_cache": profile_cache.get_stats(),
+            "warmup": warmup.get_stats(),
+            "profiling": profiler.get_stats(),
+            "tracing": tracer.get_stats(),
             "timestamp": datetime.now().isoformat()
         }), 200
     except Exception as e:
@@ -1291,7 +1712,69 @@ def health_check():
         }), 500
 
 
+@app.route("/metrics", methods=['GET'])
+@track_handler('http_metrics')
+def metrics_endpoint():
+    """Prometheus 指標端點"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+def require_admin():
+    """管理端點需帶 Authorization: Bearer <ADMIN_TOKEN>；未設定 ADMIN_TOKEN 時端點不存在"""
+    if not ADMIN_TOKEN:
+        abort(404)
+    auth = request.headers.get('Authorization', '')
+    token = auth[len('Bearer '):] if auth.startswith('Bearer ') else ''
+    if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        logger.warning(f"管理端點驗證失敗: {request.path}")
+        abort(401)
+
+
+@app.route("/admin/profiling", methods=['GET', 'POST'])
+@track_handler('http_admin')
+def admin_profiling():
+    """查詢或調整效能剖析設定：POST {"enabled": true, "sample_rate": 0.1, "tracemalloc": true}"""
+    require_admin()
+    if request.method == 'POST':
+        options = request.get_json(silent=True) or {}
+        try:
+            profiler.configure(
+                enabled=options.get('enabled'),
+                sample_rate=options.get('sample_rate'),
+                trace_memory=options.get('tracemalloc'),
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"設定格式錯誤: {e}"}), 400
+    return jsonify(profiler.get_stats())
+
+
+@app.route("/admin/profiling/snapshot", methods=['POST'])
+@track_handler('http_admin')
+def admin_memory_snapshot():
+    """取得目前配置最多記憶體的程式位置（需先開啟 tracemalloc）"""
+    require_admin()
+    limit = request.args.get('limit', default=30, type=int)
+    group_by = request.args.get('group_by', 'lineno')
+    if group_by not in ('lineno', 'filename', 'traceback'):
+        return jsonify({"error": "group_by 只能是 lineno、filename 或 traceback"}), 400
+    result = profiler.memory_snapshot(limit, group_by)
+    if result is None:
+        return jsonify({"error": "tracemalloc 未開啟，請先 POST /admin/profiling {\"tracemalloc\": true}"}), 409
+    return jsonify(result)
+
+
+@app.route("/admin/search/optimize", methods=['POST'])
+@track_handler('http_admin')
+def admin_search_optimize():
+    """完整壓縮全文搜尋索引（大量匯入後或離峰時使用）"""
+    require_admin()
+    if not note_search.optimize():
+        return jsonify({"error": "壓縮搜尋索引失敗"}), 500
+    return jsonify(note_search.get_stats())
+
+
 @app.route("/callback", methods=['POST'])
+@track_handler('http_callback')
 def callback():
     """LINE Bot webhook callback"""
     if not handler or not line_bot_api:
@@ -1319,6 +1802,285 @@ def callback():
         abort(500)
 
 
+# validates：fetcher 是否支援 ETag / Last-Modified（page_cache 以 fetcher(url, meta) 呼叫並做條件式重新驗證）
+UrlPlatform = namedtuple('UrlPlatform', ['name', 'note_type', 'emoji', 'waiting_text', 'fetcher', 'validates'])
+
+
+def get_url_platform(url):
+    """判斷網址所屬平台與對應的爬取方式"""
+    if is_threads_url(url):
+        return UrlPlatform("Threads", "Threads 筆記", "🧵", "🧵 正在爬取 Threads 貼文，請稍候...", fetch_threads_content, False)
+    if is_facebook_url(url):
+        return UrlPlatform("Facebook", "Facebook 筆記", "📘", "📘 正在爬取 Facebook 貼文，請稍候...", fetch_facebook_content, False)
+    return UrlPlatform("網頁", "網頁筆記", "🌐", "🌐 正在爬取網頁內容，請稍候...", fetch_webpage_content, True)
+
+
+def existing_note_result(platform, note):
+    """筆記索引中已有此網址：直接以既有頁面回覆"""
+    return {
+        "ok": True,
+        "existing": True,
+        "platform": platform.name,
+        "emoji": platform.emoji,
+        "title": note["title"],
+        "summary": note["summary"],
+        "page_url": note["page_url"],
+        "notion_job": None,
+    }
+
+
+def near_duplicate_result(platform, match):
+    """內容與已儲存的筆記近似：回傳既有筆記，讓用戶決定是否仍要另存"""
+    _, similarity, info = match
+    return {
+        "ok": True,
+        "existing": True,
+        "similarity": similarity,
+        "platform": platform.name,
+        "emoji": platform.emoji,
+        "title": info["title"],
+        "summary": info["summary"],
+        "page_url": info["page_url"] or info["url"],
+        "notion_job": None,
+    }
+
+
+def process_url_note(url, refresh=False):
+    """
+    爬取網址內容、生成 AI 摘要並儲存到 Notion，回傳處理結果
+    已儲存過的網址（或內容相同的網址）直接回傳既有頁面；refresh=True 時強制重新處理
+    """
+    platform = get_url_platform(url)
+    canonical_url = canonicalize_url(url)
+    existing = note_index.find_by_url(canonical_url)
+    if existing and not refresh:
+        logger.info(f"筆記索引命中，略過重新處理: {canonical_url[:80]}")
+        return existing_note_result(platform, existing)
+    
+    if refresh:
+        page_cache.invalidate(canonical_url)
+    start = time.perf_counter()
+    title, content, canonical_url = page_cache.fetch(url, platform.fetcher, platform.validates)
+    observe_stage('fetch_page', platform.name, time.perf_counter() - start, ok=bool(title and content))
+    
+    if not (title and content):
+        return {"ok": False, "platform": platform.name, "emoji": platform.emoji}
+    
+    digest = content_hash(content.encode('utf-8'))
+    if not refresh:
+        same_content = note_index.find_by_hash(digest)
+        if same_content:
+            logger.info(f"內容與已儲存的筆記相同，略過重新處理: {canonical_url[:80]}")
+            note_index.link(canonical_url, same_content)
+            return existing_note_result(platform, same_content)
+        
+        # 轉貼、鏡像等內容近似的網址：在 AI 摘要前攔下
+        match = near_dup_index.find(content, exclude_key=canonical_url)
+        if match:
+            logger.info(f"內容與已儲存的筆記近似 ({match[1]:.0%})，略過重新處理: {canonical_url[:80]}")
+            return near_duplicate_result(platform, match)
+    
+    # 生成 AI 摘要
+    summary = generate_webpage_summary(title, content, canonical_url)
+    
+    # 先寫入近似重複索引，再儲存到 Notion（包含 Page 內文）；頁面建立後由 update_note_index 補上頁面連結
+    near_dup_index.add(canonical_url, content, title, summary, url=canonical_url)
+    notion_job = None
+    if is_notion_configured():
+        note_index.record(canonical_url, digest, title, summary, platform.note_type)
+        notion_job = save_webpage_to_notion(title, summary, canonical_url, content, platform.note_type,
+                                            meta={"canonical_url": canonical_url})
+        if existing and existing["page_id"]:
+            # 強制更新：封存舊頁面，避免重複
+            notion_writer.submit("PATCH", f"/pages/{existing['page_id']}", {"archived": True},
+                                 f"封存舊版：{existing['title'][:30]}")
+    else:
+        logger.warning("缺少 Notion 設定，跳過儲存功能")
+    
+    return {
+        "ok": True,
+        "platform": platform.name,
+        "emoji": platform.emoji,
+        "title": title,
+        "summary": summary,
+        "notion_job": notion_job,
+    }
+
+
+def run_url_note(url, refresh=False):
+    """處理網址筆記；同一網址同時被多人分享時只會執行一次"""
+    return note_flight.do(("url", canonicalize_url(url), refresh), lambda: process_url_note(url, refresh))
+
+
+def format_url_note_result(result, user_id):
+    """將網址筆記處理結果轉為回覆文字"""
+    if not result["ok"]:
+        return f"❌ 無法爬取 {result['platform']} 內容\n\n可能原因：\n• 網站阻擋爬蟲\n• 網址無效或無法連線\n• 貼文需要登入或為私人貼文\n\n請確認網址是否正確。"
+    
+    if result.get("similarity"):
+        page_link = f"🔗 既有筆記：{result['page_url']}" if result["page_url"] else "⏳ 既有筆記的 Notion 頁面建立中"
+        return f"📚 這篇內容與已儲存的筆記高度相似（{result['similarity']:.0%}）\n\n📌 標題：{result['title'][:50]}\n\n🔍 AI 摘要：\n{result['summary']}\n\n{page_link}\n\n💡 若仍要另存為新筆記，請輸入 /refresh 網址"
+    if result.get("existing"):
+        page_link = f"🔗 Notion：{result['page_url']}" if result["page_url"] else "⏳ Notion 頁面建立中"
+        return f"📚 這個網址已經儲存過了！\n\n📌 標題：{result['title'][:50]}\n\n🔍 AI 摘要：\n{result['summary']}\n\n{page_link}\n\n💡 輸入 /refresh 網址 可重新爬取並更新摘要"
+    
+    notion_status = notion_status_text(result["notion_job"], user_id)
+    return f"{result['emoji']} {result['platform']} 助手分析完成！\n\n📌 標題：{result['title'][:50]}\n\n🔍 AI 摘要：\n{result['summary']}\n\n{notion_status}"
+
+
+def process_url_batch(urls):
+    """並行處理多個網址（每則訊息最多 URL_BATCH_MAX_WORKERS 個同時進行），依原順序回傳結果"""
+    def _run(url):
+        try:
+            return run_url_note(url)
+        except Exception as e:
+            logger.error(f"網址處理失敗 {url}: {e}")
+            platform = get_url_platform(url)
+            return {"ok": False, "platform": platform.name, "emoji": platform.emoji}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(URL_BATCH_MAX_WORKERS, len(urls)))) as executor:
+        return list(executor.map(tracer.wrap(_run), urls))
+
+
+def format_url_batch_result(urls, results, user_id, skipped=0):
+    """將多個網址的處理結果合併成一份回覆"""
+    success = sum(1 for result in results if result["ok"])
+    header = f"📚 已處理 {len(urls)} 個網址（成功 {success} 個）"
+    if skipped:
+        header += f"\n⚠️ 單則訊息最多處理 {URL_BATCH_MAX_URLS} 個網址，其餘 {skipped} 個已略過"
+
+    # 依網址數量平均分配摘要長度，盡量讓結果放進單次推送
+    summary_limit = max(100, (LINE_TEXT_MAX_CHARS * LINE_PUSH_MAX_MESSAGES) // max(len(urls), 1) - 200)
+    sections = [header]
+    for index, (url, result) in enumerate(zip(urls, results), 1):
+        if not result["ok"]:
+            sections.append(f"{index}. ❌ 無法爬取 {result['platform']} 內容\n{url}")
+            continue
+        summary = result["summary"]
+        if len(summary) > summary_limit:
+            summary = summary[:summary_limit] + "..."
+        if result.get("similarity"):
+            notion_status = f"📚 與已儲存的筆記相似（{result['similarity']:.0%}）：{result['page_url'] or 'Notion 頁面建立中'}"
+        elif result.get("existing"):
+            notion_status = f"📚 已儲存過：{result['page_url'] or 'Notion 頁面建立中'}"
+        else:
+            notion_status = notion_status_text(result["notion_job"], user_id)
+        sections.append(f"{index}. {result['emoji']} {result['title'][:50]}\n{url}\n\n🔍 AI 摘要：\n{summary}\n\n{notion_status}")
+    return sections
+
+
+def pack_text_messages(sections, max_chars=LINE_TEXT_MAX_CHARS, max_messages=LINE_PUSH_MAX_MESSAGES):
+    """將多個段落組成不超過 LINE 長度與則數限制的文字訊息"""
+    messages = []
+    current = ""
+    for section in sections:
+        section = section[:max_chars]
+        candidate = f"{current}\n\n{'─' * 10}\n\n{section}" if current else section
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        messages.append(current)
+        current = section
+    if current:
+        messages.append(current)
+
+    if len(messages) > max_messages:
+        messages = messages[:max_messages]
+        messages[-1] = messages[-1][:max_chars - 20] + "\n\n…（內容過長已截斷）"
+    return [TextSendMessage(text=text) for text in messages]
+
+
+def transcribe_audio(audio_data):
+    """依序嘗試 Groq、OpenAI 與本地 Whisper 轉錄，回傳 (轉錄文字, 引擎名稱)"""
+    transcription = None
+    engine_name = ""
+    
+    if get_groq_client():
+        logger.info("嘗試使用 Groq Whisper 進行轉錄...")
+        transcription = transcribe_audio_with_groq(audio_data)
+        engine_name = "Groq Whisper"
+    
+    # 如果 Groq 失敗或未設定，嘗試使用 OpenAI (需付費)
+    if not transcription and get_openai_client():
+        if engine_name:
+            record_fallback('transcribe', 'groq', 'openai')
+        logger.info("嘗試使用 OpenAI Whisper 進行轉錄...")
+        transcription = transcribe_audio_with_openai(audio_data)
+        engine_name = "OpenAI Whisper"
+    
+    # 最後備援：嘗試本地轉錄
+    if not transcription:
+        if engine_name:
+            record_fallback('transcribe', 'openai' if engine_name == "OpenAI Whisper" else 'groq', 'local_whisper')
+        logger.info("嘗試使用本地 Whisper 進行備援轉錄...")
+        transcription = transcribe_audio_with_local_whisper(audio_data)
+        engine_name = "本地 Whisper AI"
+    
+    return transcription, engine_name
+
+
+def process_text_note(text):
+    """文字筆記：AI 摘要並排入 Notion 寫入佇列，回傳 (摘要, Notion 工作 id)"""
+    summary = generate_ai_summary(text)
+    near_dup_index.add(note_key_for("文字筆記", text), text, text.split('\n', 1)[0][:50], summary)
+    notion_job = save_to_notion(text, summary, "文字筆記")
+    return summary, notion_job
+
+
+def format_text_note_reply(summary, notion_job, user_id):
+    notion_status = notion_status_text(notion_job, user_id)
+    return f"📝 已收到筆記\n\n🔍 AI 摘要：\n{summary}\n\n{notion_status}"
+
+
+def process_voice_note(transcription):
+    """語音筆記：AI 摘要並排入 Notion 寫入佇列，回傳 (摘要, Notion 工作 id)"""
+    summary = generate_ai_summary(transcription)
+    notion_job = save_to_notion(transcription, summary, "語音筆記")
+    return summary, notion_job
+
+
+def process_image_note(image_data):
+    """圖片筆記：AI 視覺分析、上傳 Google Drive 並存入 Notion"""
+    title, summary = analyze_image_with_ai(image_data)
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_name = f"image_{timestamp}.jpg"
+    drive_url = upload_to_google_drive(image_data, file_name)
+    
+    notion_job = save_to_notion(title, summary, "圖片筆記", drive_url)
+    return title, summary, drive_url, notion_job
+
+
+def content_hash(data):
+    """計算檔案內容雜湊，作為 single-flight 的 key"""
+    return hashlib.sha256(data).hexdigest()
+
+
+NOTE_TYPE_EMOJI = {
+    "網頁筆記": "🌐", "Threads 筆記": "🧵", "Facebook 筆記": "📘",
+    "文字筆記": "📝", "語音筆記": "🎤", "圖片筆記": "🖼️", "會議記錄": "🎙️",
+}
+
+
+def format_search_results(query, hits, elapsed_ms):
+    """將搜尋結果轉為回覆文字"""
+    if not hits:
+        return f"🔎 找不到符合「{query}」的筆記"
+    lines = [f"🔎 「{query}」找到 {len(hits)} 筆筆記（{elapsed_ms:.0f} ms）"]
+    for index, hit in enumerate(hits, 1):
+        emoji = NOTE_TYPE_EMOJI.get(hit["note_type"], "📄")
+        created = datetime.fromtimestamp(hit["created_at"]).strftime("%Y-%m-%d")
+        link = hit["page_url"] or hit["url"]
+        entry = f"{index}. {emoji} {hit['title'][:40]}（{created}）\n{hit['snippet'].strip()}"
+        if link:
+            entry += f"\n🔗 {link}"
+        lines.append(entry)
+    return "\n\n".join(lines)
+
+
+@track_handler('text')
+@profiler.profiled('text')
+@tracer.event_handler('text')
 def handle_text_message(event):
     """處理文字訊息事件"""
     try:
@@ -1327,9 +2089,8 @@ def handle_text_message(event):
         
         logger.info(f"收到文字訊息 - 用戶: {user_id}, 訊息: {message_text[:100]}...")
         
-        # 處理用戶會話和顯示名稱
+        # 處理用戶會話（顯示名稱只在需要時才查詢）
         session = get_user_session(user_id)
-        user_name = get_user_display_name(user_id)
         
         # 處理 OAuth 授權指令 (最高優先權)
         if message_text.startswith("/auth "):
@@ -1343,30 +2104,73 @@ def handle_text_message(event):
             line_bot_api.reply_message(event.reply_token, TextSendMessage(text=f"🔑 請點擊連結進行 Google Drive 授權：\n\n{url}\n\n授權完成後，請回覆：\n/auth 您的授權碼"))
             return
 
+        # 搜尋已儲存的筆記
+        if message_text.startswith("/search"):
+            query = message_text[len("/search"):].strip()
+            if not query:
+                reply_text = "❌ 請在指令後加上關鍵字，例如：\n/search 會議 預算"
+            else:
+                start = time.perf_counter()
+                hits = note_search.search(query, limit=SEARCH_RESULT_LIMIT)
+                reply_text = format_search_results(query, hits, (time.perf_counter() - start) * 1000)
+            line_bot_api.reply_message(event.reply_token, TextSendMessage(text=reply_text[:LINE_TEXT_MAX_CHARS]))
+            return
+
+        # 強制重新爬取並更新已儲存的網址筆記
+        if message_text.startswith("/refresh"):
+            target = message_text[len("/refresh"):].strip()
+            if not is_url(target):
+                line_bot_api.reply_message(event.reply_token, TextSendMessage(text="❌ 請在指令後加上網址，例如：\n/refresh https://example.com/article"))
+                return
+            
+            platform = get_url_platform(target)
+            line_bot_api.reply_message(event.reply_token, TextSendMessage(text=platform.waiting_text))
+            result = run_url_note(target, refresh=True)
+            line_bot_api.push_message(user_id, TextSendMessage(text=format_url_note_result(result, user_id)))
+            return
+
         # 處理會議記錄指令
         if message_text == '/save':
             session.start_recording()
-            reply_text = "🎙️ 開始會議記錄模式！\n\n現在您可以：\n📝 發送文字訊息\n🎤 發送語音訊息\n\n所有內容都會累積顯示，輸入 /end 結束並儲存到 Google Sheets。"
+            reply_text = "🎙️ 開始會議記錄模式！\n\n現在您可以：\n📝 發送文字訊息\n🎤 發送語音訊息\n\n所有內容都會累積記錄，輸入 /status 查看進度，/end 結束並儲存到 Google Sheets。"
         
         elif message_text == '/end':
-            if session.is_recording and session.conversation_buffer:
-                # 儲存到 Google Sheets
-                conversation_text = session.get_conversation_text()
-                save_success = save_message_to_sheets(user_id, user_name, conversation_text)
+            if session.is_recording and session.transcript:
+                # 以記錄檔為準（記憶體中的逐字稿可能因寫入失敗而較少時則用後者），分段儲存到 Google Sheets
+                entries = meeting_logs.read(user_id)
+                if not entries or len(entries) < len(session.transcript):
+                    entries = list(session.transcript)
+                chunks = list(iter_chunks(entries, MEETING_SHEETS_CELL_CHARS))
+                save_success = save_meeting_to_sheets(user_id, get_user_display_name(user_id), chunks)
                 
                 if save_success:
-                    reply_text = f"✅ 會議記錄已儲存到 Google Sheets！\n\n📄 總共記錄了 {len(session.conversation_buffer)} 條內容\n📊 總字數約 {len(conversation_text)} 字元"
+                    # 生成會議摘要並同步至 Notion
+                    conversation_text = session.get_conversation_text()
+                    meeting_summary = generate_meeting_summary(conversation_text)
+                    title = f"會議記錄 {datetime.fromtimestamp(entries[0][0]).strftime('%Y-%m-%d %H:%M')}"
+                    notion_job = save_meeting_to_notion(title, meeting_summary, conversation_text,
+                                                        [text for _, _, text in chunks])
+                    notion_status = notion_status_text(notion_job, user_id)
+                    reply_text = f"✅ 會議記錄已儲存到 Google Sheets！\n\n📄 總共記錄了 {session.transcript.message_count} 條內容\n📊 總字數約 {session.transcript.char_count} 字元\n\n🔍 會議摘要：\n{meeting_summary}\n\n{notion_status}"
+                    session.stop_recording()
                 else:
-                    reply_text = "❌ 儲存失敗，請稍後再試。"
-                
-                session.stop_recording()
+                    # 保留記錄模式與記錄檔，稍後可再次 /end
+                    reply_text = "❌ 儲存失敗，會議記錄仍保留中，請稍後再輸入 /end 重試。"
             else:
                 reply_text = "❌ 目前沒有進行中的會議記錄。\n\n請先輸入 /save 開始記錄模式。"
         
+        elif message_text == '/keep':
+            if session.pending_note:
+                pending_note = session.pending_note
+                session.pending_note = None
+                summary, notion_job = process_text_note(pending_note)
+                reply_text = format_text_note_reply(summary, notion_job, user_id)
+            else:
+                reply_text = "❌ 沒有等待儲存的筆記。"
+        
         elif message_text == '/status':
             if session.is_recording:
-                conversation_text = session.get_conversation_text()
-                reply_text = f"📊 會議記錄狀態：進行中\n\n📝 已記錄 {len(session.conversation_buffer)} 條內容\n📄 目前內容:\n\n{conversation_text[:500]}{'...' if len(conversation_text) > 500 else ''}\n\n輸入 /end 結束並儲存"
+                reply_text = f"📊 會議記錄狀態：進行中\n\n📝 {format_counters(session.transcript)}\n📄 最近內容:\n\n{format_tail(session.transcript)}\n\n輸入 /end 結束並儲存"
             else:
                 reply_text = "📊 會議記錄狀態：未開始\n\n輸入 /save 開始記錄模式"
         
@@ -1374,8 +2178,11 @@ def handle_text_message(event):
             reply_text = """📖 智慧筆記助手使用說明：
 
 🎙️ /save - 開始會議記錄模式
-⏹️ /end - 結束記錄並儲存到 Google Sheets
+⏹️ /end - 結束記錄，生成會議摘要並儲存
 📊 /status - 查看目前記錄狀態
+🔎 /search 關鍵字 - 搜尋已儲存的筆記
+📌 /keep - 仍要儲存被判定為重複的文字筆記
+🔄 /refresh 網址 - 重新爬取已儲存過的網址並更新摘要
 🔑 /auth_url - 重新取得 Google Drive 授權連結
 📖 /help - 顯示此說明
 
@@ -1387,6 +2194,7 @@ def handle_text_message(event):
 
 💡 使用方式：
 • 貼上網址 → 自動爬取並摘要到 Notion
+• 一次貼上多個網址 → 同時處理並合併回覆
 • 傳送圖片 → AI 分析並存入 Notion
 • 傳送語音 → 轉文字並摘要
 • 傳送文字 → AI 摘要並存入 Notion
@@ -1394,66 +2202,47 @@ def handle_text_message(event):
         
         else:
             # 一般文字訊息
+            urls = extract_urls(message_text)
             if session.is_recording:
                 session.add_message(message_text)
-                conversation_text = session.get_conversation_text()
-                reply_text = f"📝 已記錄文字訊息\n\n💬 目前累積內容:\n\n{conversation_text}\n\n📊 共 {len(session.conversation_buffer)} 條記錄 | 輸入 /end 結束並儲存"
+                reply_text = f"📝 已記錄文字訊息\n\n💬 最近內容:\n\n{format_tail(session.transcript)}\n\n📊 {format_counters(session.transcript)} | 輸入 /end 結束並儲存"
+            elif len(urls) > 1:
+                # 一則訊息內含多個網址（例如閱讀清單）：並行處理後合併回覆
+                skipped = max(0, len(urls) - URL_BATCH_MAX_URLS)
+                urls = urls[:URL_BATCH_MAX_URLS]
+                line_bot_api.reply_message(
+                    event.reply_token,
+                    TextSendMessage(text=f"📚 收到 {len(urls)} 個網址，正在同時爬取與摘要，請稍候...")
+                )
+
+                results = process_url_batch(urls)
+                line_bot_api.push_message(user_id, pack_text_messages(format_url_batch_result(urls, results, user_id, skipped)))
+                return
             elif is_url(message_text):
-                # 判斷網址類型並選擇對應的爬取方式
-                if is_threads_url(message_text):
-                    platform = "Threads"
-                    note_type = "Threads 筆記"
-                    line_bot_api.reply_message(
-                        event.reply_token,
-                        TextSendMessage(text="🧵 正在爬取 Threads 貼文，請稍候...")
-                    )
-                    title, content, url = fetch_threads_content(message_text)
-                elif is_facebook_url(message_text):
-                    platform = "Facebook"
-                    note_type = "Facebook 筆記"
-                    line_bot_api.reply_message(
-                        event.reply_token,
-                        TextSendMessage(text="📘 正在爬取 Facebook 貼文，請稍候...")
-                    )
-                    title, content, url = fetch_facebook_content(message_text)
-                else:
-                    platform = "網頁"
-                    note_type = "網頁筆記"
-                    line_bot_api.reply_message(
-                        event.reply_token,
-                        TextSendMessage(text="🌐 正在爬取網頁內容，請稍候...")
-                    )
-                    title, content, url = fetch_webpage_content(message_text)
-                
-                if title and content:
-                    # 生成 AI 摘要
-                    summary = generate_webpage_summary(title, content, url)
-                    
-                    # 儲存到 Notion（包含 Page 內文），使用對應的類型
-                    notion_saved = save_webpage_to_notion(title, summary, url, content, note_type)
-                    
-                    notion_status = "✅ 已同步至 Notion（含原文）" if notion_saved else "⚠️ Notion 同步失敗"
-                    
-                    if platform == "Threads":
-                        emoji = "🧵"
-                    elif platform == "Facebook":
-                        emoji = "📘"
-                    else:
-                        emoji = "🌐"
-                    
-                    result_text = f"{emoji} {platform} 助手分析完成！\n\n📌 標題：{title[:50]}\n\n🔍 AI 摘要：\n{summary}\n\n{notion_status}"
-                else:
-                    result_text = f"❌ 無法爬取 {platform} 內容\n\n可能原因：\n• 網站阻擋爬蟲\n• 網址無效或無法連線\n• 貼文需要登入或為私人貼文\n\n請確認網址是否正確。"
+                # 判斷網址類型並先回覆處理中訊息
+                platform = get_url_platform(message_text)
+                line_bot_api.reply_message(
+                    event.reply_token,
+                    TextSendMessage(text=platform.waiting_text)
+                )
                 
-                line_bot_api.push_message(user_id, TextSendMessage(text=result_text))
+                result = run_url_note(message_text)
+                line_bot_api.push_message(user_id, TextSendMessage(text=format_url_note_result(result, user_id)))
                 return
             else:
-                # 非錄音模式：自動執行 AI 摘要並存入 Notion
-                summary = generate_ai_summary(message_text)
-                notion_saved = save_to_notion(message_text, summary, "文字筆記")
-                
-                notion_status = "✅ 已同步至 Notion" if notion_saved else "⚠️ Notion 同步失敗 (請檢查金鑰)"
-                reply_text = f"📝 已收到筆記\n\n🔍 AI 摘要：\n{summary}\n\n{notion_status}"
+                # 非錄音模式：與已儲存內容近似時先詢問，否則自動執行 AI 摘要並存入 Notion
+                match = near_dup_index.find(message_text)
+                if match:
+                    _, similarity, info = match
+                    session.pending_note = message_text
+                    link = info["page_url"] or info["url"]
+                    reply_text = f"📚 這則筆記與先前儲存的內容高度相似（{similarity:.0%}）\n\n📌 {info['title'][:50]}\n\n🔍 AI 摘要：\n{info['summary']}"
+                    if link:
+                        reply_text += f"\n\n🔗 既有筆記：{link}"
+                    reply_text += "\n\n💡 若仍要另存為新筆記，請輸入 /keep"
+                else:
+                    summary, notion_job = process_text_note(message_text)
+                    reply_text = format_text_note_reply(summary, notion_job, user_id)
         
         # 回覆訊息
         line_bot_api.reply_message(
@@ -1472,6 +2261,9 @@ def handle_text_message(event):
             pass
 
 
+@track_handler('audio')
+@profiler.profiled('audio')
+@tracer.event_handler('audio')
 def handle_audio_message(event):
     """處理語音訊息事件"""
     try:
@@ -1482,8 +2274,9 @@ def handle_audio_message(event):
         session = get_user_session(user_id)
         
         # 1. 下載音檔
-        message_content = line_bot_api.get_message_content(event.message.id)
-        audio_data = message_content.content
+        with stage_timer('line_download', 'line'):
+            message_content = line_bot_api.get_message_content(event.message.id)
+            audio_data = message_content.content
         
         # 2. 先回覆處理中訊息（使用 reply_token）
         try:
@@ -1494,40 +2287,21 @@ def handle_audio_message(event):
         except Exception as e:
             logger.error(f"回覆處理中訊息失敗: {e}")
 
-        # 3. 執行轉錄 (優先使用 Groq)
-        transcription = None
-        engine_name = ""
-        
-        if groq_client:
-            logger.info("嘗試使用 Groq Whisper 進行轉錄...")
-            transcription = transcribe_audio_with_groq(audio_data)
-            engine_name = "Groq Whisper"
-        
-        # 如果 Groq 失敗或未設定，嘗試使用 OpenAI (需付費)
-        if not transcription and openai_client:
-            logger.info("嘗試使用 OpenAI Whisper 進行轉錄...")
-            transcription = transcribe_audio_with_openai(audio_data)
-            engine_name = "OpenAI Whisper"
-        
-        # 最後備援：嘗試本地轉錄
-        if not transcription:
-            logger.info("嘗試使用本地 Whisper 進行備援轉錄...")
-            transcription = transcribe_audio_with_local_whisper(audio_data)
-            engine_name = "本地 Whisper AI"
+        # 3. 執行轉錄 (優先使用 Groq)，相同音檔同時只轉錄一次
+        audio_key = content_hash(audio_data)
+        transcription, engine_name = note_flight.do(("audio", audio_key), lambda: transcribe_audio(audio_data))
 
         # 4. 處理轉錄結果
         if transcription:
             if session.is_recording:
                 # 錄音模式：累積內容
                 session.add_message(f"[語音] {transcription}")
-                conversation_text = session.get_conversation_text()
-                result_text = f"✅ 【{engine_name}】辨識成功！\n\n📝 內容：\n{transcription}\n\n💬 目前累積完整內容：\n\n{conversation_text}\n\n📊 輸入 /end 結束並儲存"
+                result_text = f"✅ 【{engine_name}】辨識成功！\n\n📝 內容：\n{transcription[:LINE_TEXT_MAX_CHARS // 2]}\n\n📊 {format_counters(session.transcript)} | 輸入 /end 結束並儲存"
             else:
                 # 一般助理模式：AI 摘要並存入 Notion
-                summary = generate_ai_summary(transcription)
-                notion_saved = save_to_notion(transcription, summary, "語音筆記")
+                summary, notion_job = note_flight.do(("voice-note", audio_key), lambda: process_voice_note(transcription))
                 
-                notion_status = "✅ 已同步至 Notion" if notion_saved else "⚠️ Notion 同步失敗"
+                notion_status = notion_status_text(notion_job, user_id)
                 result_text = f"🎤 語音助理辨識結果：\n\n{transcription}\n\n🔍 AI 摘要：\n{summary}\n\n{notion_status}\n\n💡 提示：輸入 /save 可開啟會議記錄模式。"
         else:
             result_text = "❌ 語音辨識失敗。原因可能是 API 額度用盡或伺服器繁忙，請稍後再試。"
@@ -1549,6 +2323,9 @@ def handle_audio_message(event):
             pass
 
 
+@track_handler('image')
+@profiler.profiled('image')
+@tracer.event_handler('image')
 def handle_image_message(event):
     """處理圖片訊息事件"""
     try:
@@ -1562,19 +2339,14 @@ def handle_image_message(event):
         )
         
         # 2. 下載圖片
-        message_content = line_bot_api.get_message_content(event.message.id)
-        image_data = message_content.content
-        
-        # 3. AI 視覺分析
-        title, summary = analyze_image_with_ai(image_data)
-        
-        # 4. 上傳到 Google Drive
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_name = f"image_{timestamp}.jpg"
-        drive_url = upload_to_google_drive(image_data, file_name)
+        with stage_timer('line_download', 'line'):
+            message_content = line_bot_api.get_message_content(event.message.id)
+            image_data = message_content.content
         
-        # 5. 儲存到 Notion
-        notion_saved = save_to_notion(title, summary, "圖片筆記", drive_url)
+        # 3. AI 視覺分析、上傳 Google Drive 並儲存到 Notion（相同圖片同時只處理一次）
+        title, summary, drive_url, notion_job = note_flight.do(
+            ("image", content_hash(image_data)), lambda: process_image_note(image_data)
+        )
         
         if drive_url == "NEEDS_AUTH":
             drive_status = "❌ 需要授權"
@@ -1582,11 +2354,11 @@ def handle_image_message(event):
             result_text = f"🖼️ 圖片分析完成，但上傳失敗。\n\n📌 標題：{title}\n\n🔐 原因：Google Drive 需要重新授權。\n請點擊連結授權並回傳授權碼：\n{auth_url}\n\n回傳格式：/auth 您的授權碼"
         elif drive_url == "QUOTA_ERROR":
             drive_status = "❌ 雲端空間不足 (服務帳戶限制)"
-            notion_status = "✅ 已同步至 Notion (無圖片連結)"
+            notion_status = notion_status_text(notion_job, user_id) + " (無圖片連結)"
             result_text = f"🖼️ 圖片分析完成！\n\n📌 標題：{title}\n🔍 摘要：\n{summary}\n\n⚠️ {drive_status}\n{notion_status}\n💡 提示：請將雲端資料夾移動至『共用雲端硬碟』，或檢查空間。"
         else:
             drive_status = f"📂 [雲端連結]({drive_url})" if drive_url else "❌ 雲端上傳失敗"
-            notion_status = "✅ 已同步至 Notion" if notion_saved else "⚠️ Notion 同步失敗"
+            notion_status = notion_status_text(notion_job, user_id)
             result_text = f"🖼️ 圖片分析完成！\n\n📌 標題：{title}\n🔍 摘要：\n{summary}\n\n🔗 {drive_status}\n{notion_status}"
         
         line_bot_api.push_message(
@@ -1605,6 +2377,9 @@ def handle_image_message(event):
             pass
 
 
+@track_handler('other')
+@profiler.profiled('other')
+@tracer.event_handler('other')
 def handle_other_message(event):
     """處理其他類型訊息（圖片、貼圖等）"""
     try:
@@ -1635,6 +2410,20 @@ else:
     logger.warning("LINE Bot handler 未初始化，跳過事件處理器註冊")
 
 
+def start_warmup():
+    """在背景預先載入已設定服務會用到的套件與客戶端，第一個請求不必等待 import"""
+    warmup.register('pydub', 'numpy', _openai_client, _groq_client)
+    if GOOGLE_SHEETS_ID:
+        warmup.register('gspread', 'google.oauth2.service_account')
+    if os.getenv('GOOGLE_REFRESH_TOKEN') or os.getenv('GOOGLE_OAUTH_CREDENTIALS_BASE64') or os.path.exists('token.json'):
+        warmup.register('googleapiclient.discovery', 'googleapiclient.http')
+    warmup.start()
+
+
+if STARTUP_WARMUP:
+    start_warmup()
+
+
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
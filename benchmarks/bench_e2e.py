@@ -0,0 +1,307 @@
+"""
+端對端 Benchmark
+啟動 fakes/ 的本機假服務（LINE、Groq、OpenAI、Notion、Jina Reader、Google API），
+以 gunicorn（與正式環境相同的單一 sync worker）執行 app，對 /callback 送出已簽名的 webhook，
+回報各訊息類型的吞吐量與 p50 / p95 / p99 延遲
+
+/callback 會同步處理完訊息（含推送結果）才回應，因此回應時間即為該訊息的端對端處理時間
+
+使用方式：
+    python benchmarks/bench_e2e.py                                   # 每種訊息 20 則，同時 4 個請求
+    python benchmarks/bench_e2e.py --types text,url --requests 50 --concurrency 8
+    python benchmarks/bench_e2e.py --set groq.latency_ms=2000 --set notion.error_rate=0.2
+    python benchmarks/bench_e2e.py --json e2e.json
+    python benchmarks/bench_e2e.py --baseline e2e.json --threshold 1.3
+        # 與先前結果比較，任一類型 p95 變慢超過 1.3 倍（且超過 200 ms）
+        # 或失敗率增加即以 exit code 1 結束
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from fakes.__main__ import apply_overrides, parse_overrides  # noqa: E402
+from fakes.line import audio_event, image_event, sign_body, text_event, webhook_body  # noqa: E402
+from fakes.server import FakeServices  # noqa: E402
+from fakes.web import random_cjk_text  # noqa: E402
+
+MESSAGE_TYPES = ('text', 'url', 'audio', 'image')
+CHANNEL_SECRET = 'bench-channel-secret'
+# 文字訊息長度（字）：隨機字元，避免被近似重複偵測攔下
+TEXT_MESSAGE_CHARS = 400
+
+# 壓測時放寬 app 端的 Groq / OpenAI 配額，否則結果只反映本機限流；--real-quotas 時保留預設值
+UNLIMITED_QUOTA_ENV = {
+    'GROQ_RPM': '100000', 'GROQ_TPM': '100000000',
+    'OPENAI_RPM': '100000', 'OPENAI_TPM': '100000000',
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def service_account_env(services):
+    """以新產生的 RSA 金鑰建立假的服務帳戶憑證，token_uri 指向假服務"""
+    import rsa
+    _, private_key = rsa.newkeys(2048)
+    info = {
+        "type": "service_account",
+        "project_id": "bench",
+        "private_key_id": uuid.uuid4().hex,
+        "private_key": private_key.save_pkcs1().decode('ascii'),
+        "client_email": "bench@bench.iam.gserviceaccount.com",
+        "client_id": "1",
+        "token_uri": f"{services.url}/google/token",
+    }
+    return {
+        'GOOGLE_SHEETS_ID': 'bench-spreadsheet',
+        'GOOGLE_CREDENTIALS_BASE64': base64.b64encode(json.dumps(info).encode('utf-8')).decode('ascii'),
+        # Drive 使用 OAuth refresh token（同樣由假服務換發 access token）
+        'GOOGLE_REFRESH_TOKEN': 'bench-refresh-token',
+        'GOOGLE_CLIENT_ID': 'bench-client-id',
+        'GOOGLE_CLIENT_SECRET': 'bench-client-secret',
+    }
+
+
+def start_app(services, workdir, port, workers, real_quotas):
+    """以 gunicorn 啟動 app，工作目錄與暫存檔都放在 workdir，回傳 (程序, 記錄檔路徑)"""
+    env = dict(os.environ)
+    env.update(services.env(CHANNEL_SECRET))
+    env.update(service_account_env(services))
+    if not real_quotas:
+        env.update(UNLIMITED_QUOTA_ENV)
+    env.update({
+        'PORT': str(port),
+        'PYTHONPATH': ROOT_DIR + os.pathsep + env.get('PYTHONPATH', ''),
+        'NOTE_INDEX_PATH': os.path.join(workdir, 'note_index.sqlite3'),
+        'NOTION_QUEUE_FILE': os.path.join(workdir, 'notion_queue.jsonl'),
+        'MEETING_LOG_DIR': os.path.join(workdir, 'meetings'),
+    })
+    log_path = os.path.join(workdir, 'app.log')
+    log_file = open(log_path, 'w', encoding='utf-8')
+    # 工作目錄設在 workdir：Drive token 刷新後寫入的 token.json 不會落在專案目錄
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT_DIR, 'gunicorn.conf.py'),
+         '--workers', str(workers), '--bind', f'127.0.0.1:{port}', 'app:app'],
+        cwd=workdir, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+    log_file.close()
+    return process, log_path
+
+
+def wait_for_health(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("app 啟動失敗")
+        try:
+            if requests.get(f"{base_url}/health", timeout=2).ok:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("等待 app 啟動逾時")
+
+
+def build_event(message_type, services, user_id, index, run_id):
+    if message_type == 'text':
+        text = random_cjk_text(random.Random(f"{run_id}-{index}"), TEXT_MESSAGE_CHARS)
+        return text_event(user_id, text)
+    if message_type == 'url':
+        return text_event(user_id, services.site_url(f"{run_id}/{index}"))
+    if message_type == 'audio':
+        return audio_event(user_id)
+    return image_event(user_id)
+
+
+def send(session, callback_url, message_type, event, timeout):
+    """送出一則 webhook，回傳結果 dict（延遲、HTTP 狀態）"""
+    body = webhook_body([event])
+    headers = {'Content-Type': 'application/json', 'X-Line-Signature': sign_body(CHANNEL_SECRET, body)}
+    started = time.perf_counter()
+    try:
+        response = session.post(callback_url, data=body.encode('utf-8'), headers=headers, timeout=timeout)
+        status = response.status_code
+    except requests.exceptions.RequestException:
+        status = None
+    return {
+        "type": message_type,
+        "user_id": event["source"]["userId"],
+        "reply_token": event["replyToken"],
+        "status": status,
+        "latency_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+def mark_failures(results, sent_messages):
+    """依假 LINE 收到的回覆判斷處理結果：HTTP 非 200、沒有任何回覆，或回覆以 ❌ 開頭都算失敗"""
+    texts = {}
+    for sent in sent_messages:
+        key = sent["reply_token"] if sent["kind"] == 'reply' else sent["to"]
+        texts.setdefault(key, []).extend(m.get("text", "") for m in sent["messages"])
+    for result in results:
+        replies = texts.get(result["reply_token"], []) + texts.get(result["user_id"], [])
+        result["ok"] = (result["status"] == 200 and bool(replies)
+                        and not any(text.startswith("❌") for text in replies))
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(results, elapsed_s):
+    summary = {}
+    for message_type in sorted({r["type"] for r in results}, key=MESSAGE_TYPES.index):
+        subset = [r for r in results if r["type"] == message_type]
+        latencies = [r["latency_ms"] for r in subset]
+        summary[message_type] = {
+            "count": len(subset),
+            "errors": sum(1 for r in subset if not r["ok"]),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "mean_ms": round(statistics.mean(latencies), 1),
+        }
+    return {
+        "elapsed_s": round(elapsed_s, 2),
+        "throughput_rps": round(len(results) / elapsed_s, 2) if elapsed_s else 0.0,
+        "types": summary,
+    }
+
+
+def print_report(report, fake_stats):
+    print(f"\n總計 {sum(t['count'] for t in report['types'].values())} 則，"
+          f"耗時 {report['elapsed_s']} s，吞吐量 {report['throughput_rps']} 則/秒")
+    print(f"\n{'類型':<8}{'數量':>6}{'失敗':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'平均(ms)':>10}")
+    for message_type, row in report["types"].items():
+        print(f"{message_type:<8}{row['count']:>6}{row['errors']:>6}{row['p50_ms']:>10.0f}"
+              f"{row['p95_ms']:>10.0f}{row['p99_ms']:>10.0f}{row['mean_ms']:>10.0f}")
+
+    print(f"\n{'假服務':<12}{'請求數':>8}{'注入錯誤':>10}{'429':>6}")
+    for name, gate in fake_stats["gates"].items():
+        print(f"{name:<12}{gate['requests']:>8}{gate['injected_errors']:>10}{gate['rate_limited']:>6}")
+
+
+def compare_baseline(report, baseline, threshold, min_delta_ms):
+    regressions = []
+    for message_type, row in report["types"].items():
+        base = baseline.get("types", {}).get(message_type)
+        if not base:
+            continue
+        if (base["p95_ms"] > 0 and row["p95_ms"] / base["p95_ms"] > threshold
+                and row["p95_ms"] - base["p95_ms"] > min_delta_ms):
+            regressions.append(f"{message_type} p95: {base['p95_ms']} ms -> {row['p95_ms']} ms")
+        if row["errors"] / row["count"] > base["errors"] / base["count"]:
+            regressions.append(f"{message_type} 失敗: {base['errors']}/{base['count']} -> {row['errors']}/{row['count']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端對端 benchmark（本機假服務）")
+    parser.add_argument('--types', default=','.join(MESSAGE_TYPES), help="訊息類型，以逗號分隔")
+    parser.add_argument('--requests', type=int, default=20, help="每種訊息送出的數量")
+    parser.add_argument('--concurrency', type=int, default=4, help="同時送出的請求數")
+    parser.add_argument('--workers', type=int, default=1, help="gunicorn worker 數（正式環境為 1）")
+    parser.add_argument('--timeout', type=float, default=120.0, help="單一 webhook 請求的逾時秒數")
+    parser.add_argument('--set', action='append', default=[], metavar='服務.欄位=值',
+                        help="調整假服務的延遲 / 錯誤率 / 速率限制，可重複指定")
+    parser.add_argument('--real-quotas', action='store_true', help="保留 app 預設的 Groq / OpenAI 配額限制")
+    parser.add_argument('--keep-workdir', action='store_true', help="保留暫存目錄（含 app 記錄檔）")
+    parser.add_argument('--json', help="將結果存成 JSON 檔")
+    parser.add_argument('--baseline', help="與先前的 JSON 結果比較")
+    parser.add_argument('--threshold', type=float, default=1.3, help="判定效能退化的倍數")
+    parser.add_argument('--min-delta-ms', type=float, default=200.0, help="差距小於此毫秒數時不視為退化")
+    args = parser.parse_args()
+
+    types = [t.strip() for t in args.types.split(',') if t.strip()]
+    unknown = set(types) - set(MESSAGE_TYPES)
+    if unknown:
+        parser.error(f"未知的訊息類型: {', '.join(sorted(unknown))}")
+
+    services = FakeServices()
+    apply_overrides(services, parse_overrides(args.set))
+    services.start()
+
+    workdir = tempfile.mkdtemp(prefix='bench_e2e_')
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    process, log_path = start_app(services, workdir, port, args.workers, args.real_quotas)
+    try:
+        wait_for_health(base_url, process)
+        print(f"app 已啟動: {base_url}（記錄檔 {log_path}）")
+
+        run_id = uuid.uuid4().hex[:8]
+        jobs = []
+        for index in range(args.requests):
+            for message_type in types:
+                user_id = 'U' + uuid.uuid4().hex
+                jobs.append((message_type, build_event(message_type, services, user_id, index, run_id)))
+
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+        session.mount('http://', adapter)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(
+                lambda job: send(session, f"{base_url}/callback", job[0], job[1], args.timeout), jobs))
+        elapsed = time.perf_counter() - started
+
+        mark_failures(results, list(services.line.sent))
+        report = summarize(results, elapsed)
+        fake_stats = services.stats()
+        print_report(report, fake_stats)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        services.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report["config"] = {"requests": args.requests, "concurrency": args.concurrency, "workers": args.workers,
+                        "profiles": {name: profile.to_dict() for name, profile in services.profiles.items()}}
+    report["fakes"] = fake_stats
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已儲存至 {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_baseline(report, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("\n❌ 偵測到效能退化：")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n✅ 未偵測到效能退化")
+
+
+if __name__ == '__main__':
+    main()
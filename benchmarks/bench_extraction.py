@@ -0,0 +1,173 @@
+"""
+網頁擷取效能 Benchmark（完全離線）
+重播 benchmarks/corpus 中的 HTML 頁面與 Jina Reader 文字檔，
+回報每頁的解析時間、記憶體峰值與擷取出的文字長度
+
+使用方式：
+    python benchmarks/bench_extraction.py                       # 執行並列出結果
+    python benchmarks/bench_extraction.py --json result.json    # 另存結果
+    python benchmarks/bench_extraction.py --baseline result.json --threshold 1.5
+        # 與先前結果比較，任何頁面中位數變慢超過 1.5 倍（且超過 1 ms）即以 exit code 1 結束
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_extract import extract_html, parse_jina_text, STREAM_CHUNK_SIZE
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+MAX_CHARS = 60000
+
+
+def _chunked(data):
+    return [data[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(data), STREAM_CHUNK_SIZE)]
+
+
+def extract_stream(data):
+    """目前使用的擷取引擎（與串流下載相同，以 64KB 區塊餵入）"""
+    return extract_html(_chunked(data), max_chars=MAX_CHARS)
+
+
+def extract_jina(data):
+    title, content = parse_jina_text(data.decode('utf-8'), MAX_CHARS)
+    return title or '', content or ''
+
+
+def synthetic_large_page(size_mb):
+    """產生大型頁面，模擬內容遠超過保留上限的網頁"""
+    paragraph = "<p>這是一段用來測試大型頁面效能的段落文字，內容會重複很多次以達到指定的檔案大小。</p>\n"
+    repeat = int(size_mb * 1024 * 1024 / len(paragraph.encode('utf-8')))
+    return ("<html><head><title>大型測試頁面</title></head><body><div class='content'>"
+            + paragraph * repeat + "</div></body></html>").encode('utf-8')
+
+
+def load_corpus(synthetic_mb):
+    cases = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        path = os.path.join(CORPUS_DIR, name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        kind = 'jina' if name.endswith('.jina.txt') else 'html'
+        cases.append((name, kind, data))
+    if synthetic_mb:
+        cases.append((f"synthetic_{synthetic_mb}mb.html", 'html', synthetic_large_page(synthetic_mb)))
+    return cases
+
+
+def get_extractors(kind, include_legacy):
+    if kind == 'jina':
+        return [('jina', extract_jina)]
+
+    extractors = [('stream', extract_stream)]
+    if include_legacy:
+        legacy = _load_legacy_extractor()
+        if legacy:
+            extractors.append(('bs4', legacy))
+    return extractors
+
+
+def _load_legacy_extractor():
+    """舊版 BeautifulSoup 擷取方式，僅供比較（需另外安裝 beautifulsoup4）"""
+    try:
+        import re
+        from bs4 import BeautifulSoup
+    except ImportError:
+        return None
+
+    def extract_bs4(data):
+        soup = BeautifulSoup(data, 'lxml')
+        for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe', 'noscript']):
+            element.decompose()
+        title = soup.title.string.strip() if soup.title and soup.title.string else ''
+        if not title:
+            h1 = soup.find('h1')
+            title = h1.get_text(strip=True) if h1 else ''
+        main_content = soup.find('article') or soup.find('main') or soup.find('div', class_=re.compile(r'content|article|post|entry'))
+        if main_content:
+            text = main_content.get_text(separator='\n', strip=True)
+        else:
+            paragraphs = soup.find_all(['p', 'h1', 'h2', 'h3', 'li'])
+            text = '\n'.join([p.get_text(strip=True) for p in paragraphs if len(p.get_text(strip=True)) > 20])
+        return title, re.sub(r'\n{3,}', '\n\n', text)[:MAX_CHARS]
+
+    return extract_bs4
+
+
+def measure(fn, data, runs):
+    """回傳 (中位數 ms, 最慢 ms, 記憶體峰值 KB, (title, text))"""
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn(data)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(timings), max(timings), peak / 1024, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="網頁擷取效能 benchmark（離線）")
+    parser.add_argument('--runs', type=int, default=20, help="每頁執行次數")
+    parser.add_argument('--synthetic-mb', type=float, default=5, help="額外產生的大型頁面大小 (MB)，0 表示不產生")
+    parser.add_argument('--legacy', action='store_true', help="同時執行舊版 BeautifulSoup 擷取以供比較")
+    parser.add_argument('--json', help="將結果存成 JSON 檔")
+    parser.add_argument('--baseline', help="與先前的 JSON 結果比較")
+    parser.add_argument('--threshold', type=float, default=1.5, help="判定效能退化的倍數")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="差距小於此毫秒數時不視為退化（避免微小計時雜訊）")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'頁面':<28}{'擷取器':<8}{'大小(KB)':>10}{'中位數(ms)':>12}{'最慢(ms)':>10}{'峰值(KB)':>10}{'字數':>8}  標題")
+    for name, kind, data in load_corpus(args.synthetic_mb):
+        for extractor_name, fn in get_extractors(kind, args.legacy):
+            median_ms, max_ms, peak_kb, (title, text) = measure(fn, data, args.runs)
+            results.append({
+                "page": name,
+                "extractor": extractor_name,
+                "bytes": len(data),
+                "median_ms": round(median_ms, 3),
+                "max_ms": round(max_ms, 3),
+                "peak_kb": round(peak_kb, 1),
+                "text_chars": len(text),
+                "title": title,
+            })
+            print(f"{name:<28}{extractor_name:<8}{len(data) / 1024:>10.1f}{median_ms:>12.2f}{max_ms:>10.2f}{peak_kb:>10.0f}{len(text):>8}  {title[:30]}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已儲存至 {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = {(r["page"], r["extractor"]): r for r in json.load(f)}
+        regressions = []
+        for r in results:
+            base = baseline.get((r["page"], r["extractor"]))
+            if (base and base["median_ms"] > 0
+                    and r["median_ms"] / base["median_ms"] > args.threshold
+                    and r["median_ms"] - base["median_ms"] > args.min_delta_ms):
+                regressions.append(f"{r['page']} ({r['extractor']}): {base['median_ms']} ms -> {r['median_ms']} ms")
+            if base and base["text_chars"] != r["text_chars"]:
+                print(f"⚠️ 擷取字數變化 {r['page']} ({r['extractor']}): {base['text_chars']} -> {r['text_chars']}")
+        if regressions:
+            print("\n❌ 偵測到效能退化：")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n✅ 未偵測到效能退化")
+
+
+if __name__ == '__main__':
+    main()
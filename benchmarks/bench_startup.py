@@ -0,0 +1,125 @@
+"""
+啟動時間 Benchmark
+以獨立的 Python 程序多次執行 `import app`（關閉背景暖機），回報 import 耗時與
+`python -X importtime` 的模組載入排行，並檢查重量級套件是否被提前載入
+
+使用方式：
+    python benchmarks/bench_startup.py                          # 執行並列出結果
+    python benchmarks/bench_startup.py --top 30                 # 列出最慢的 30 個模組
+    python benchmarks/bench_startup.py --json result.json       # 另存結果
+    python benchmarks/bench_startup.py --baseline result.json --threshold 1.3
+        # 與先前結果比較，import 中位數變慢超過 1.3 倍（且超過 50 ms）
+        # 或有重量級套件在啟動時被載入，即以 exit code 1 結束
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 應在第一次使用時才載入的套件
+HEAVY_MODULES = (
+    'openai', 'groq', 'gspread', 'googleapiclient', 'google_auth_oauthlib',
+    'whisper', 'torch', 'pydub', 'numpy', 'bs4',
+)
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$')
+
+# 量測時關閉暖機執行緒，並提供假的設定讓各模組完整走完初始化
+BENCH_ENV = {
+    'STARTUP_WARMUP': 'false',
+    'CHANNEL_ACCESS_TOKEN': 'bench',
+    'CHANNEL_SECRET': 'bench',
+}
+
+
+def run_import():
+    """在新的程序中 import app，回傳 (-X importtime 的輸出行, 總耗時 ms)"""
+    env = dict(os.environ, **BENCH_ENV)
+    code = "import time; t = time.perf_counter(); import app; print((time.perf_counter() - t) * 1000)"
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return result.stderr.splitlines(), float(result.stdout.strip().splitlines()[-1])
+
+
+def parse_importtime(lines):
+    """回傳 [(模組, 自身 ms, 累計 ms, 層級)]"""
+    modules = []
+    for line in lines:
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us) / 1000, int(cumulative_us) / 1000, len(indent) // 2))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="啟動時間 benchmark")
+    parser.add_argument('--runs', type=int, default=5, help="執行次數")
+    parser.add_argument('--top', type=int, default=15, help="列出 app 直接 import 中最慢的幾個模組")
+    parser.add_argument('--json', help="將結果存成 JSON 檔")
+    parser.add_argument('--baseline', help="與先前的 JSON 結果比較")
+    parser.add_argument('--threshold', type=float, default=1.3, help="判定效能退化的倍數")
+    parser.add_argument('--min-delta-ms', type=float, default=50.0, help="差距小於此毫秒數時不視為退化")
+    args = parser.parse_args()
+
+    timings = []
+    modules = []
+    for _ in range(args.runs):
+        lines, elapsed_ms = run_import()
+        timings.append(elapsed_ms)
+        modules = parse_importtime(lines)
+
+    median_ms = statistics.median(timings)
+    print(f"import app：中位數 {median_ms:.0f} ms，最快 {min(timings):.0f} ms，最慢 {max(timings):.0f} ms（{args.runs} 次）")
+
+    # app 直接 import 的模組（層級 1）依累計時間排序
+    direct = sorted((m for m in modules if m[3] == 1), key=lambda m: m[2], reverse=True)
+    print(f"\n{'模組':<32}{'累計(ms)':>10}{'自身(ms)':>10}")
+    for name, self_ms, cumulative_ms, _ in direct[:args.top]:
+        print(f"{name:<32}{cumulative_ms:>10.1f}{self_ms:>10.1f}")
+
+    loaded = sorted({m[0].split('.')[0] for m in modules} & set(HEAVY_MODULES))
+    if loaded:
+        print(f"\n⚠️ 啟動時載入了重量級套件：{', '.join(loaded)}")
+
+    result = {
+        "median_ms": round(median_ms, 1),
+        "timings_ms": [round(t, 1) for t in timings],
+        "heavy_modules": loaded,
+        "top_modules": [{"module": name, "cumulative_ms": round(cumulative_ms, 1)}
+                        for name, _, cumulative_ms, _ in direct[:args.top]],
+    }
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已儲存至 {args.json}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = []
+        if (baseline["median_ms"] > 0
+                and median_ms / baseline["median_ms"] > args.threshold
+                and median_ms - baseline["median_ms"] > args.min_delta_ms):
+            regressions.append(f"import app: {baseline['median_ms']} ms -> {median_ms:.1f} ms")
+        for name in loaded:
+            if name not in baseline.get("heavy_modules", []):
+                regressions.append(f"啟動時新載入 {name}")
+        if regressions:
+            print("\n❌ 偵測到效能退化：")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n✅ 未偵測到效能退化")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+摘要模型路由 Benchmark
+對 skip / small / large 三個層級各送出樣本內容，回報延遲與成本
+
+使用方式：
+    GROQ_API_KEY=... python benchmarks/bench_summary_tiers.py --runs 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+from model_router import (
+    route_summary_model, estimate_cost, TIER_SKIP, TASK_NOTE, TASK_MEETING,
+    SUMMARY_SKIP_MAX_CHARS, SMALL_MAX_CHARS_BY_TASK,
+)
+
+load_dotenv()
+
+SAMPLE_PARAGRAPH = (
+    "今天和設計團隊討論了新版首頁的改版方向，決定先以行動版為主，"
+    "把最常用的三個功能移到首屏，並在下週三前完成原型交給工程評估。"
+)
+
+# (名稱, 任務類型, 內容)
+SAMPLES = [
+    ("tiny", TASK_NOTE, "明天記得買牛奶"),
+    ("short", TASK_NOTE, SAMPLE_PARAGRAPH * 3),
+    ("longnote", TASK_NOTE, (SAMPLE_PARAGRAPH + "\n") * 40),
+    ("long", TASK_MEETING, (SAMPLE_PARAGRAPH + "\n") * 40),
+]
+
+
+def run_sample(client, task, text, runs):
+    """執行單一樣本，回傳 (route, 延遲列表, 總成本)"""
+    route = route_summary_model(text, task)
+    latencies = []
+    total_cost = 0.0
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        if route.tier != TIER_SKIP:
+            completion = client.chat.completions.create(
+                model=route.model,
+                messages=[
+                    {"role": "system", "content": "你是一個專業的筆記秘書，擅長精簡歸納重點。"},
+                    {"role": "user", "content": f"請將以下內容歸納成精簡摘要：\n\n{text}"}
+                ],
+                temperature=0.7,
+                max_tokens=200
+            )
+            usage = completion.usage
+            total_cost += estimate_cost(route.model, usage.prompt_tokens, usage.completion_tokens)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return route, latencies, total_cost
+
+
+def main():
+    parser = argparse.ArgumentParser(description="摘要模型路由延遲與成本 benchmark")
+    parser.add_argument('--runs', type=int, default=3, help="每個樣本執行次數")
+    args = parser.parse_args()
+
+    client = None
+    if os.getenv('GROQ_API_KEY'):
+        from groq import Groq
+        client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+    else:
+        print("⚠️ 未設定 GROQ_API_KEY，只會列出路由結果")
+
+    small = '，'.join(f"{task} {'不限' if limit is None else f'<= {limit} 字'}"
+                     for task, limit in SMALL_MAX_CHARS_BY_TASK.items())
+    print(f"門檻：skip <= {SUMMARY_SKIP_MAX_CHARS} 字（僅筆記），small：{small}\n")
+    print(f"{'樣本':<8}{'字數':>8}  {'層級':<7}{'模型':<26}{'平均(ms)':>10}{'中位數(ms)':>12}{'成本/次(USD)':>16}")
+
+    for name, task, text in SAMPLES:
+        if client:
+            route, latencies, total_cost = run_sample(client, task, text, args.runs)
+            mean = statistics.mean(latencies)
+            median = statistics.median(latencies)
+            cost = total_cost / args.runs
+        else:
+            route = route_summary_model(text, task)
+            mean = median = cost = 0.0
+        print(f"{name:<8}{len(text):>8}  {route.tier:<7}{str(route.model):<26}{mean:>10.1f}{median:>12.1f}{cost:>16.6f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+Webhook 負載產生與重播工具
+產生帶有正確 X-Line-Signature 的 LINE webhook（文字、網址、語音、圖片），以指定速率與並行數
+送往 /callback，記錄延遲、HTTP 狀態，以及超過 LINE 等待時間（會觸發重送）的請求數；
+也可重播錄下的 JSONL 流量。可用 --rates 逐段提高速率，找出目前 sync worker 設定的飽和點
+
+使用方式：
+    # 對本機 app 每秒 2 則、共 60 則（預設訊息組成 text=4,url=2,audio=1,image=1）
+    python benchmarks/webhook_loadgen.py --url http://127.0.0.1:5000 --channel-secret xxx --rate 2 --count 60
+
+    # 逐段提高速率找飽和點（每段 30 秒）
+    python benchmarks/webhook_loadgen.py --url http://127.0.0.1:5000 --rates 0.5,1,2,4 --stage-duration 30
+
+    # 重播 JSONL：每行為完整 webhook body、單一 event，或含文字欄位（text / body / title）的物件
+    python benchmarks/webhook_loadgen.py --url http://127.0.0.1:5000 --replay requests.jsonl --rate 1
+
+搭配 `python -m fakes` 時，語音 / 圖片內容由假 LINE 提供，網址可用 --url-template 指向假網站：
+    --url-template 'http://127.0.0.1:9900/site/{id}'
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from fakes.line import audio_event, image_event, sign_body, text_event, webhook_body  # noqa: E402
+from fakes.web import random_cjk_text  # noqa: E402
+
+MESSAGE_TYPES = ('text', 'url', 'audio', 'image')
+DEFAULT_MIX = 'text=4,url=2,audio=1,image=1'
+# LINE 平台等待 webhook 回應的時間，超過即視為失敗（開啟重送時會再送一次）
+LINE_REDELIVERY_TIMEOUT = 2.0
+# 重播檔中可當作文字訊息內容的欄位（依序尋找）
+REPLAY_TEXT_FIELDS = ('text', 'body', 'title')
+
+
+def parse_mix(mix):
+    """'text=4,url=2' → {'text': 4, 'url': 2}"""
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in MESSAGE_TYPES:
+            raise SystemExit(f"未知的訊息類型: {name}（可用：{', '.join(MESSAGE_TYPES)}）")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class EventFactory:
+    """依訊息組成產生 (類型, webhook body)，用戶從固定的用戶池中輪流挑選"""
+
+    def __init__(self, mix, users, url_template, text_chars, seed=None):
+        self.types = list(mix)
+        self.weights = [mix[name] for name in self.types]
+        self.users = ['U' + uuid.uuid4().hex for _ in range(users)]
+        self.url_template = url_template
+        self.text_chars = text_chars
+        self.rng = random.Random(seed)
+        self.run_id = uuid.uuid4().hex[:8]
+        self.sequence = 0
+
+    def next(self):
+        message_type = self.rng.choices(self.types, self.weights)[0]
+        user_id = self.rng.choice(self.users)
+        self.sequence += 1
+        if message_type == 'text':
+            event = text_event(user_id, random_cjk_text(self.rng, self.text_chars))
+        elif message_type == 'url':
+            event = text_event(user_id, self.url_template.format(id=f"{self.run_id}-{self.sequence}"))
+        elif message_type == 'audio':
+            event = audio_event(user_id)
+        else:
+            event = image_event(user_id)
+        return message_type, webhook_body([event])
+
+
+def _refresh_event(event):
+    """重播時換上新的 replyToken / webhookEventId / timestamp，避免被當成重複事件"""
+    event = dict(event)
+    if 'replyToken' in event:
+        event['replyToken'] = uuid.uuid4().hex
+    event['webhookEventId'] = uuid.uuid4().hex.upper()[:26]
+    event['timestamp'] = int(time.time() * 1000)
+    return event
+
+
+def _event_label(event):
+    message = event.get('message') or {}
+    return message.get('type') or event.get('type', 'unknown')
+
+
+def load_replay(path, users, refresh=True):
+    """
+    讀取 JSONL 重播檔，回傳 [(標籤, webhook body)]
+    每行可為完整 webhook body（含 events）、單一 event，或含文字欄位的物件（轉成文字訊息）
+    """
+    user_ids = ['U' + uuid.uuid4().hex for _ in range(users)]
+    jobs = []
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if 'events' in record:
+                events = [_refresh_event(e) if refresh else e for e in record['events']]
+                label = _event_label(events[0]) if events else 'empty'
+                jobs.append((label, webhook_body(events, record.get('destination', 'Ufakebotdestination'))))
+            elif 'message' in record and 'type' in record:
+                event = _refresh_event(record) if refresh else record
+                jobs.append((_event_label(event), webhook_body([event])))
+            else:
+                text = next((record[field] for field in REPLAY_TEXT_FIELDS if record.get(field)), None)
+                if not text:
+                    print(f"略過第 {line_no} 行：找不到 events 或文字欄位", file=sys.stderr)
+                    continue
+                user_id = user_ids[(line_no - 1) % len(user_ids)]
+                jobs.append(('text', webhook_body([text_event(user_id, str(text))])))
+    return jobs
+
+
+def send(session, callback_url, channel_secret, label, body, timeout, scheduled):
+    """送出一則 webhook；delay_ms 為實際送出時間落後排程的時間（客戶端排隊）"""
+    headers = {'Content-Type': 'application/json', 'X-Line-Signature': sign_body(channel_secret, body)}
+    started = time.perf_counter()
+    status = None
+    timed_out = False
+    try:
+        response = session.post(callback_url, data=body.encode('utf-8'), headers=headers, timeout=timeout)
+        status = response.status_code
+    except requests.exceptions.Timeout:
+        timed_out = True
+    except requests.exceptions.RequestException:
+        pass
+    return {
+        "type": label,
+        "status": status,
+        "timed_out": timed_out,
+        "latency_ms": (time.perf_counter() - started) * 1000,
+        "delay_ms": max(0.0, (started - scheduled) * 1000) if scheduled is not None else 0.0,
+    }
+
+
+def run_stage(jobs, callback_url, channel_secret, rate, concurrency, timeout, progress=True):
+    """
+    送出一批請求。rate 為 0 時以 concurrency 個請求持續送出（closed loop）；
+    否則依 rate 排程送出（open loop），worker 都忙碌時請求在客戶端排隊，排隊時間記在 delay_ms
+    """
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+    results = []
+    lock = threading.Lock()
+
+    def record(future):
+        with lock:
+            results.append(future.result())
+            if progress and len(results) % 10 == 0:
+                print(f"  已完成 {len(results)}/{len(jobs)}", file=sys.stderr)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, (label, body) in enumerate(jobs):
+            scheduled = None
+            if rate:
+                scheduled = started + index / rate
+                wait = scheduled - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+            future = executor.submit(send, session, callback_url, channel_secret, label, body, timeout, scheduled)
+            future.add_done_callback(record)
+    return results, time.perf_counter() - started
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(results, elapsed_s, redelivery_timeout):
+    def row(subset):
+        latencies = [r["latency_ms"] for r in subset]
+        statuses = {}
+        for r in subset:
+            key = str(r["status"]) if r["status"] is not None else ('timeout' if r["timed_out"] else 'error')
+            statuses[key] = statuses.get(key, 0) + 1
+        return {
+            "count": len(subset),
+            "statuses": statuses,
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "max_ms": round(max(latencies), 1) if latencies else 0.0,
+            # LINE 等不到回應（逾時或超過等待時間）的請求會被視為失敗並可能重送
+            "redelivery_risk": sum(1 for r in subset
+                                   if r["timed_out"] or r["latency_ms"] > redelivery_timeout * 1000),
+            "p95_delay_ms": round(percentile([r["delay_ms"] for r in subset], 95), 1),
+        }
+
+    labels = sorted({r["type"] for r in results},
+                    key=lambda t: (MESSAGE_TYPES.index(t) if t in MESSAGE_TYPES else len(MESSAGE_TYPES), t))
+    return {
+        "elapsed_s": round(elapsed_s, 2),
+        "throughput_rps": round(len(results) / elapsed_s, 2) if elapsed_s else 0.0,
+        "all": row(results),
+        "types": {label: row([r for r in results if r["type"] == label]) for label in labels},
+    }
+
+
+def print_stage(title, summary):
+    print(f"\n== {title}：{summary['all']['count']} 則，耗時 {summary['elapsed_s']} s，"
+          f"吞吐量 {summary['throughput_rps']} 則/秒 ==")
+    print(f"{'類型':<8}{'數量':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'最慢(ms)':>10}"
+          f"{'重送風險':>10}{'排隊p95':>10}  狀態碼")
+    for label, row in list(summary["types"].items()) + [("全部", summary["all"])]:
+        statuses = ', '.join(f"{k}×{v}" for k, v in sorted(row["statuses"].items()))
+        print(f"{label:<8}{row['count']:>6}{row['p50_ms']:>10.0f}{row['p95_ms']:>10.0f}{row['p99_ms']:>10.0f}"
+              f"{row['max_ms']:>10.0f}{row['redelivery_risk']:>10}{row['p95_delay_ms']:>10.0f}  {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LINE webhook 負載產生與重播工具",
+                                     epilog=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="app 的網址（送往 <url>/callback）")
+    parser.add_argument('--channel-secret', default=os.getenv('CHANNEL_SECRET'),
+                        help="用來簽名的 Channel Secret（預設讀取 CHANNEL_SECRET）")
+    parser.add_argument('--rate', type=float, default=0.0, help="每秒送出幾則（0 表示依並行數持續送出）")
+    parser.add_argument('--rates', help="逐段測試的速率，以逗號分隔，例如 0.5,1,2,4")
+    parser.add_argument('--count', type=int, default=50, help="每段送出幾則（重播時預設為整個檔案）")
+    parser.add_argument('--stage-duration', type=float, help="每段秒數（有指定速率時取代 --count）")
+    parser.add_argument('--concurrency', type=int, default=8, help="同時進行的請求數上限")
+    parser.add_argument('--timeout', type=float, default=60.0, help="單一請求的逾時秒數")
+    parser.add_argument('--redelivery-timeout', type=float, default=LINE_REDELIVERY_TIMEOUT,
+                        help="超過此秒數才回應即計入重送風險")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="訊息組成權重")
+    parser.add_argument('--users', type=int, default=20, help="模擬的用戶數")
+    parser.add_argument('--url-template', default='https://example.com/?loadgen={id}',
+                        help="網址訊息的格式，{id} 會換成唯一編號")
+    parser.add_argument('--text-chars', type=int, default=400, help="文字訊息長度（字）")
+    parser.add_argument('--replay', help="重播 JSONL 檔")
+    parser.add_argument('--keep-tokens', action='store_true', help="重播時保留原本的 replyToken / webhookEventId")
+    parser.add_argument('--seed', type=int, help="亂數種子（訊息組成與內容可重現）")
+    parser.add_argument('--json', help="將結果存成 JSON 檔")
+    args = parser.parse_args()
+
+    if not args.channel_secret:
+        parser.error("需要 --channel-secret 或 CHANNEL_SECRET 環境變數")
+
+    rates = [float(r) for r in args.rates.split(',')] if args.rates else [args.rate]
+    callback_url = args.url.rstrip('/') + '/callback'
+    factory = None if args.replay else EventFactory(parse_mix(args.mix), args.users, args.url_template,
+                                                    args.text_chars, args.seed)
+
+    stages = []
+    for rate in rates:
+        if args.replay:
+            # 每段重新讀取，讓每次重播都換上新的 replyToken
+            jobs = load_replay(args.replay, args.users, refresh=not args.keep_tokens)
+        else:
+            count = int(rate * args.stage_duration) if rate and args.stage_duration else args.count
+            jobs = [factory.next() for _ in range(count)]
+        title = f"速率 {rate:g} 則/秒" if rate else f"並行 {args.concurrency}"
+        print(f"{title}：送出 {len(jobs)} 則到 {callback_url}", file=sys.stderr)
+        results, elapsed = run_stage(jobs, callback_url, args.channel_secret, rate, args.concurrency, args.timeout)
+        summary = summarize(results, elapsed, args.redelivery_timeout)
+        summary["rate"] = rate
+        print_stage(title, summary)
+        stages.append(summary)
+
+    if len(stages) > 1:
+        # 吞吐量跟不上目標速率、或排隊時間持續增加時，即已達飽和
+        print(f"\n{'目標速率':>10}{'實際吞吐量':>12}{'p95(ms)':>10}{'排隊p95(ms)':>14}{'重送風險':>10}")
+        for stage in stages:
+            print(f"{stage['rate']:>10g}{stage['throughput_rps']:>12}{stage['all']['p95_ms']:>10.0f}"
+                  f"{stage['all']['p95_delay_ms']:>14.0f}{stage['all']['redelivery_risk']:>10}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"url": callback_url, "concurrency": args.concurrency, "stages": stages},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n結果已儲存至 {args.json}")
+
+
+if __name__ == '__main__':
+    main()
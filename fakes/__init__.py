@@ -0,0 +1,7 @@
+"""
+LINE、Groq、OpenAI、Notion、Jina Reader 與 Google API 的本機假服務，供端對端效能測試使用
+"""
+from fakes.behavior import DEFAULT_PROFILES, ServiceGate, ServiceProfile, default_profiles
+from fakes.server import FakeServices
+
+__all__ = ['DEFAULT_PROFILES', 'FakeServices', 'ServiceGate', 'ServiceProfile', 'default_profiles']
@@ -0,0 +1,62 @@
+"""
+單獨啟動假服務，方便手動測試：
+
+    python -m fakes --port 9900 --set groq.latency_ms=800 --set notion.error_rate=0.1
+
+啟動後印出 app 需要的環境變數
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes.behavior import DEFAULT_PROFILES  # noqa: E402
+from fakes.server import FakeServices  # noqa: E402
+
+
+def parse_overrides(items):
+    """把 ["groq.latency_ms=800", ...] 轉成 {服務: {欄位: 值}}"""
+    overrides = {}
+    for item in items:
+        key, _, value = item.partition('=')
+        service, _, field = key.partition('.')
+        if service not in DEFAULT_PROFILES or not field or not value:
+            raise SystemExit(f"無效的設定: {item}（格式：服務.欄位=值，服務：{', '.join(DEFAULT_PROFILES)}）")
+        overrides.setdefault(service, {})[field] = value
+    return overrides
+
+
+def apply_overrides(services, overrides):
+    for service, values in overrides.items():
+        services.set_profile(service, **values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9900)
+    parser.add_argument('--channel-secret', default='fake-channel-secret')
+    parser.add_argument('--set', action='append', default=[], metavar='服務.欄位=值',
+                        help='調整假服務行為，可重複指定')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    services = FakeServices(host=args.host, port=args.port)
+    apply_overrides(services, parse_overrides(args.set))
+    services.start()
+
+    for name, value in services.env(args.channel_secret).items():
+        print(f"{name}={value}")
+    print(f"# 統計資料: {services.url}/stats")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        services.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+假服務的延遲、錯誤率與速率限制設定
+每個服務一份 ServiceProfile，請求進來時由 ServiceGate 依設定延遲、隨機回傳錯誤或 429
+"""
+import random
+import threading
+import time
+
+from flask import jsonify
+
+from rate_limiter import TokenBucket
+
+
+class ServiceProfile:
+    """
+    latency_ms: 每個請求的基本延遲；jitter_ms: 額外的隨機延遲（0 ~ jitter_ms）
+    error_rate: 回傳 error_status 的機率；rate_limit_per_sec: 超過即回傳 429（0 表示不限制）
+    retry_after: 429 回應的 Retry-After 秒數
+    """
+    FIELDS = {
+        'latency_ms': float, 'jitter_ms': float, 'error_rate': float, 'error_status': int,
+        'rate_limit_per_sec': float, 'retry_after': float,
+    }
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, error_status=500,
+                 rate_limit_per_sec=0, retry_after=1.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit_per_sec = rate_limit_per_sec
+        self.retry_after = retry_after
+
+    def update(self, **values):
+        for name, value in values.items():
+            if name not in self.FIELDS:
+                raise ValueError(f"未知的設定: {name}")
+            setattr(self, name, self.FIELDS[name](value))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+# 各服務的預設設定，延遲接近正式環境常見的數值
+DEFAULT_PROFILES = {
+    'line': {'latency_ms': 40, 'jitter_ms': 20},
+    'line_data': {'latency_ms': 80, 'jitter_ms': 40},
+    'groq': {'latency_ms': 400, 'jitter_ms': 300},
+    'openai': {'latency_ms': 1200, 'jitter_ms': 600},
+    'notion': {'latency_ms': 300, 'jitter_ms': 200, 'rate_limit_per_sec': 3},
+    'jina': {'latency_ms': 1500, 'jitter_ms': 1000},
+    'site': {'latency_ms': 200, 'jitter_ms': 200},
+    'google': {'latency_ms': 250, 'jitter_ms': 150},
+}
+
+
+def default_profiles():
+    return {name: ServiceProfile(**values) for name, values in DEFAULT_PROFILES.items()}
+
+
+class ServiceGate:
+    """套用 ServiceProfile 並統計請求數"""
+
+    def __init__(self, name, profile):
+        self.name = name
+        self.profile = profile
+        self._lock = threading.Lock()
+        self._bucket = None
+        self.requests = 0
+        self.injected_errors = 0
+        self.rate_limited = 0
+
+    def _rate_limited(self):
+        rate = self.profile.rate_limit_per_sec
+        if not rate:
+            return False
+        with self._lock:
+            if self._bucket is None or self._bucket.base_refill_per_sec != rate:
+                self._bucket = TokenBucket(rate, rate)
+            now = time.monotonic()
+            if self._bucket.wait_time(1, now) > 0:
+                return True
+            self._bucket.consume(1, now)
+            return False
+
+    def before_request(self):
+        """Flask before_request：回傳錯誤回應，或延遲後回傳 None 交給實際處理函式"""
+        profile = self.profile
+        with self._lock:
+            self.requests += 1
+        if self._rate_limited():
+            with self._lock:
+                self.rate_limited += 1
+            response = jsonify({"error": {"message": "rate limited", "code": "rate_limited"}})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(profile.retry_after)
+            return response
+
+        delay = profile.latency_ms + random.uniform(0, profile.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000)
+
+        if profile.error_rate and random.random() < profile.error_rate:
+            with self._lock:
+                self.injected_errors += 1
+            response = jsonify({"error": {"message": "injected error", "code": "internal_error"}})
+            response.status_code = profile.error_status
+            return response
+        return None
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "injected_errors": self.injected_errors,
+                "rate_limited": self.rate_limited,
+                "profile": self.profile.to_dict(),
+            }
@@ -0,0 +1,233 @@
+"""
+Google API 假服務（GOOGLE_API_BASE=<base>/google）
+- /token：OAuth / 服務帳戶換發 access token
+- Drive v3：discovery 文件（改寫 rootUrl 指向本服務）、上傳（含 resumable）與權限設定
+- Sheets v4：試算表資料存在記憶體，支援 gspread 用到的 metadata、batchUpdate 與 values 讀寫
+"""
+import json
+import os
+import re
+import threading
+import uuid
+from urllib.parse import unquote
+
+from flask import Blueprint, jsonify, request
+
+_CELL_PATTERN = re.compile(r'^([A-Za-z]*)(\d*)$')
+
+
+def _column_index(letters):
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + ord(char) - ord('A') + 1
+    return max(index - 1, 0)
+
+
+def parse_range(range_name):
+    """
+    解析 A1 表示法，回傳 (工作表名稱, 起始列, 起始欄, 結束列)，皆為 0-based，結束列 None 表示不限
+    例如 "'Sheet1'!A2" → ("Sheet1", 1, 0, 1)；"'Sheet1'" → ("Sheet1", 0, 0, None)
+    """
+    title, _, cells = range_name.partition('!')
+    title = title.strip("'").replace("''", "'")
+    if not cells:
+        return title, 0, 0, None
+    start, _, end = cells.partition(':')
+    match = _CELL_PATTERN.match(start)
+    if not match:
+        raise ValueError(f"無法解析範圍: {range_name}")
+    start_col = _column_index(match.group(1)) if match.group(1) else 0
+    start_row = int(match.group(2)) - 1 if match.group(2) else 0
+    if not end:
+        end_row = start_row if match.group(2) else None
+    else:
+        end_match = _CELL_PATTERN.match(end)
+        end_row = int(end_match.group(2)) - 1 if end_match and end_match.group(2) else None
+    return title, start_row, start_col, end_row
+
+
+def _load_drive_discovery():
+    import googleapiclient
+    path = os.path.join(os.path.dirname(googleapiclient.__file__),
+                        'discovery_cache', 'documents', 'drive.v3.json')
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FakeSpreadsheet:
+    def __init__(self, spreadsheet_id):
+        self.spreadsheet_id = spreadsheet_id
+        self.sheets = {}
+        self._next_sheet_id = 0
+        self.add_sheet("Sheet1")
+
+    def add_sheet(self, title, rows=1000, cols=26):
+        properties = {
+            "sheetId": self._next_sheet_id, "title": title, "index": len(self.sheets),
+            "sheetType": "GRID", "gridProperties": {"rowCount": rows, "columnCount": cols},
+        }
+        self._next_sheet_id += 1
+        self.sheets[title] = {"properties": properties, "rows": []}
+        return properties
+
+    def metadata(self):
+        return {
+            "spreadsheetId": self.spreadsheet_id,
+            "properties": {"title": f"Fake {self.spreadsheet_id}", "locale": "zh_TW", "timeZone": "Asia/Taipei"},
+            "sheets": [{"properties": sheet["properties"]} for sheet in self.sheets.values()],
+        }
+
+
+class FakeGoogle:
+    def __init__(self, gate):
+        self.gate = gate
+        self._lock = threading.Lock()
+        self.spreadsheets = {}
+        self.tokens = 0
+        self.uploads = 0
+        self.upload_bytes = 0
+        self.permissions = 0
+        self.appended_rows = 0
+        self._pending_uploads = {}
+
+    def _spreadsheet(self, spreadsheet_id):
+        if spreadsheet_id not in self.spreadsheets:
+            self.spreadsheets[spreadsheet_id] = FakeSpreadsheet(spreadsheet_id)
+        return self.spreadsheets[spreadsheet_id]
+
+    def _finish_upload(self, size):
+        with self._lock:
+            self.uploads += 1
+            self.upload_bytes += size
+        return jsonify({"id": uuid.uuid4().hex})
+
+    def blueprint(self):
+        bp = Blueprint('fake_google', __name__, url_prefix='/google')
+        bp.before_request(self.gate.before_request)
+
+        @bp.route('/token', methods=['POST'])
+        def token():
+            with self._lock:
+                self.tokens += 1
+            return jsonify({"access_token": f"fake-{uuid.uuid4().hex}", "expires_in": 3600,
+                            "token_type": "Bearer", "scope": "https://www.googleapis.com/auth/drive"})
+
+        @bp.route('/discovery/v1/apis/drive/v3/rest', methods=['GET'])
+        def drive_discovery():
+            document = _load_drive_discovery()
+            root = request.host_url.rstrip('/') + bp.url_prefix + '/'
+            document['rootUrl'] = root
+            document['mtlsRootUrl'] = root
+            document['baseUrl'] = root + document['servicePath']
+            return jsonify(document)
+
+        @bp.route('/upload/drive/v3/files', methods=['POST'])
+        @bp.route('/resumable/upload/drive/v3/files', methods=['POST'])
+        def upload():
+            if request.args.get('uploadType') == 'resumable':
+                upload_id = uuid.uuid4().hex
+                with self._lock:
+                    self._pending_uploads[upload_id] = request.get_json(silent=True) or {}
+                response = jsonify({})
+                response.headers['Location'] = f"{request.base_url}?uploadType=resumable&upload_id={upload_id}"
+                return response
+            return self._finish_upload(len(request.get_data()))
+
+        @bp.route('/upload/drive/v3/files', methods=['PUT'])
+        @bp.route('/resumable/upload/drive/v3/files', methods=['PUT'])
+        def upload_chunk():
+            with self._lock:
+                self._pending_uploads.pop(request.args.get('upload_id'), None)
+            return self._finish_upload(len(request.get_data()))
+
+        @bp.route('/drive/v3/files/<file_id>/permissions', methods=['POST'])
+        def permissions(file_id):
+            with self._lock:
+                self.permissions += 1
+            body = request.get_json(force=True)
+            return jsonify({"kind": "drive#permission", "id": "anyoneWithLink",
+                            "type": body.get('type'), "role": body.get('role')})
+
+        @bp.route('/v4/spreadsheets/<path:rest>', methods=['GET', 'POST', 'PUT'])
+        def spreadsheets(rest):
+            return self._sheets_request(unquote(rest))
+
+        return bp
+
+    def _sheets_request(self, rest):
+        spreadsheet_id, _, values_path = rest.partition('/values/')
+        with self._lock:
+            if not values_path:
+                if spreadsheet_id.endswith(':batchUpdate'):
+                    spreadsheet = self._spreadsheet(spreadsheet_id[:-len(':batchUpdate')])
+                    return jsonify(self._batch_update(spreadsheet, request.get_json(force=True)))
+                return jsonify(self._spreadsheet(spreadsheet_id).metadata())
+
+            spreadsheet = self._spreadsheet(spreadsheet_id)
+            if values_path.endswith((':append', ':clear')):
+                range_name, _, action = values_path.rpartition(':')
+            else:
+                range_name, action = values_path, ''
+            title, start_row, start_col, end_row = parse_range(range_name)
+            sheet = spreadsheet.sheets.get(title)
+            if sheet is None:
+                return jsonify({"error": {"code": 400, "message": f"Unable to parse range: {range_name}",
+                                          "status": "INVALID_ARGUMENT"}}), 400
+            rows = sheet["rows"]
+
+            if action == 'append':
+                values = request.get_json(force=True).get('values', [])
+                first = len(rows) + 1
+                rows.extend([str(cell) for cell in row] for row in values)
+                self.appended_rows += len(values)
+                return jsonify({"spreadsheetId": spreadsheet_id, "updates": {
+                    "updatedRange": f"'{title}'!A{first}", "updatedRows": len(values)}})
+            if action == 'clear':
+                sheet["rows"] = []
+                return jsonify({"spreadsheetId": spreadsheet_id, "clearedRange": f"'{title}'"})
+            if request.method == 'PUT':
+                values = request.get_json(force=True).get('values', [])
+                for offset, row in enumerate(values):
+                    index = start_row + offset
+                    while len(rows) <= index:
+                        rows.append([])
+                    target = rows[index]
+                    while len(target) < start_col + len(row):
+                        target.append('')
+                    target[start_col:start_col + len(row)] = [str(cell) for cell in row]
+                return jsonify({"spreadsheetId": spreadsheet_id, "updatedRange": range_name,
+                                "updatedRows": len(values)})
+
+            selected = rows[start_row:None if end_row is None else end_row + 1]
+            selected = [row[start_col:] for row in selected]
+            result = {"range": range_name, "majorDimension": "ROWS"}
+            if any(selected):
+                result["values"] = selected
+            return jsonify(result)
+
+    def _batch_update(self, spreadsheet, body):
+        replies = []
+        for item in body.get('requests', []):
+            if 'addSheet' in item:
+                properties = item['addSheet'].get('properties', {})
+                grid = properties.get('gridProperties', {})
+                added = spreadsheet.add_sheet(properties.get('title', f"Sheet{len(spreadsheet.sheets) + 1}"),
+                                              grid.get('rowCount', 1000), grid.get('columnCount', 26))
+                replies.append({"addSheet": {"properties": added}})
+            else:
+                replies.append({})
+        return {"spreadsheetId": spreadsheet.spreadsheet_id, "replies": replies}
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "tokens": self.tokens,
+                "uploads": self.uploads,
+                "upload_bytes": self.upload_bytes,
+                "permissions": self.permissions,
+                "appended_rows": self.appended_rows,
+                "spreadsheets": {
+                    spreadsheet_id: {title: len(sheet["rows"]) for title, sheet in spreadsheet.sheets.items()}
+                    for spreadsheet_id, spreadsheet in self.spreadsheets.items()
+                },
+            }
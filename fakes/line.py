@@ -0,0 +1,139 @@
+"""
+LINE Messaging API 假服務，以及產生已簽名 webhook 的工具函式
+- /line：reply、push、profile（對應 LINE_API_ENDPOINT）
+- /line-data：訊息內容下載（對應 LINE_API_DATA_ENDPOINT），內容依 message id 決定性產生
+"""
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask import Blueprint, Response, jsonify, request
+
+# 假音檔 / 圖片的大小（bytes）
+AUDIO_CONTENT_BYTES = 32 * 1024
+IMAGE_CONTENT_BYTES = 120 * 1024
+# 保留最近幾則送出的訊息供檢查
+SENT_HISTORY_SIZE = 1000
+
+
+def sign_body(channel_secret, body):
+    """計算 X-Line-Signature（body 為 bytes 或 str）"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hmac.new(channel_secret.encode('utf-8'), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def _base_event(user_id, message):
+    return {
+        "type": "message",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "source": {"type": "user", "userId": user_id},
+        "webhookEventId": uuid.uuid4().hex.upper()[:26],
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": uuid.uuid4().hex,
+        "message": message,
+    }
+
+
+def new_message_id():
+    return str(uuid.uuid4().int)[:18]
+
+
+# 假 LINE 以 message id 的最後一位區分內容類型：圖片以 9 結尾，其餘當作音檔
+def image_message_id():
+    return new_message_id()[:-1] + '9'
+
+
+def audio_message_id():
+    return new_message_id()[:-1] + '1'
+
+
+def text_event(user_id, text):
+    return _base_event(user_id, {"type": "text", "id": new_message_id(), "quoteToken": uuid.uuid4().hex, "text": text})
+
+
+def audio_event(user_id, message_id=None, duration_ms=15000):
+    return _base_event(user_id, {
+        "type": "audio", "id": message_id or audio_message_id(), "duration": duration_ms,
+        "contentProvider": {"type": "line"},
+    })
+
+
+def image_event(user_id, message_id=None):
+    return _base_event(user_id, {
+        "type": "image", "id": message_id or image_message_id(), "quoteToken": uuid.uuid4().hex,
+        "contentProvider": {"type": "line"},
+    })
+
+
+def webhook_body(events, destination="Ufakebotdestination"):
+    return json.dumps({"destination": destination, "events": events}, ensure_ascii=False)
+
+
+def message_content(message_id, size):
+    """依 message id 決定性產生內容（相同 id 內容相同，不同 id 內容不同）"""
+    seed = hashlib.sha256(message_id.encode('utf-8')).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+class FakeLine:
+    def __init__(self, gate, data_gate):
+        self.gate = gate
+        self.data_gate = data_gate
+        self._lock = threading.Lock()
+        self.sent = deque(maxlen=SENT_HISTORY_SIZE)
+        self.replies = 0
+        self.pushes = 0
+        self.downloads = 0
+
+    def _record(self, kind, payload):
+        with self._lock:
+            if kind == 'reply':
+                self.replies += 1
+            else:
+                self.pushes += 1
+            self.sent.append({"kind": kind, "to": payload.get("to"), "reply_token": payload.get("replyToken"),
+                              "time": time.time(),
+                              "messages": payload.get("messages", [])})
+
+    def blueprints(self):
+        api = Blueprint('fake_line', __name__, url_prefix='/line')
+        data = Blueprint('fake_line_data', __name__, url_prefix='/line-data')
+        api.before_request(self.gate.before_request)
+        data.before_request(self.data_gate.before_request)
+
+        @api.route('/v2/bot/message/reply', methods=['POST'])
+        def reply():
+            self._record('reply', request.get_json(force=True))
+            return jsonify({})
+
+        @api.route('/v2/bot/message/push', methods=['POST'])
+        def push():
+            self._record('push', request.get_json(force=True))
+            return jsonify({})
+
+        @api.route('/v2/bot/profile/<user_id>', methods=['GET'])
+        def profile(user_id):
+            return jsonify({"userId": user_id, "displayName": f"測試用戶 {user_id[-4:]}",
+                            "pictureUrl": "", "statusMessage": ""})
+
+        @data.route('/v2/bot/message/<message_id>/content', methods=['GET'])
+        def content(message_id):
+            with self._lock:
+                self.downloads += 1
+            if message_id.endswith('9'):
+                return Response(message_content(message_id, IMAGE_CONTENT_BYTES), mimetype='image/jpeg')
+            return Response(message_content(message_id, AUDIO_CONTENT_BYTES), mimetype='audio/x-m4a')
+
+        return [api, data]
+
+    def get_stats(self):
+        with self._lock:
+            return {"replies": self.replies, "pushes": self.pushes, "downloads": self.downloads}
@@ -0,0 +1,110 @@
+"""
+Groq / OpenAI 假服務（OpenAI 相容 API）
+- /groq/openai/v1/...（GROQ_BASE_URL=<base>/groq）
+- /openai/v1/...（OPENAI_BASE_URL=<base>/openai/v1）
+對話回傳依輸入長度產生的摘要文字；含圖片的請求回傳 {title, summary} JSON；轉錄回傳純文字
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+
+from flask import Blueprint, Response, jsonify, request
+
+from fakes.web import random_cjk_text
+
+# 假轉錄文字的長度（字），夠長才會走到 AI 摘要
+TRANSCRIPT_CHARS = 300
+
+
+def _fake_summary(prompt):
+    digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:8]
+    return (f"📌 重點摘要\n- 測試摘要 {digest}\n- 原文約 {len(prompt)} 字\n"
+            f"💡 關鍵資訊：假服務產生的內容\n🔗 #測試 #benchmark")
+
+
+def _has_image(messages):
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, list) and any(part.get('type') == 'image_url' for part in content):
+            return True
+    return False
+
+
+def _prompt_text(messages):
+    parts = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(part.get('text', '') for part in content if part.get('type') == 'text')
+    return '\n'.join(parts)
+
+
+class FakeLLM:
+    """同一份邏輯分別掛在 Groq 與 OpenAI 的路徑下"""
+
+    def __init__(self, name, gate, url_prefix):
+        self.name = name
+        self.gate = gate
+        self.url_prefix = url_prefix
+        self._lock = threading.Lock()
+        self.completions = 0
+        self.transcriptions = 0
+
+    def blueprint(self):
+        bp = Blueprint(f'fake_{self.name}', __name__, url_prefix=self.url_prefix)
+        bp.before_request(self.gate.before_request)
+
+        @bp.route('/chat/completions', methods=['POST'])
+        def chat_completions():
+            body = request.get_json(force=True)
+            messages = body.get('messages', [])
+            prompt = _prompt_text(messages)
+            if _has_image(messages):
+                digest = hashlib.sha256(prompt.encode('utf-8') + str(time.time()).encode()).hexdigest()[:6]
+                content = json.dumps({"title": f"測試圖片 {digest}", "summary": "假服務產生的圖片描述。"},
+                                     ensure_ascii=False)
+            else:
+                content = _fake_summary(prompt)
+            with self._lock:
+                self.completions += 1
+            prompt_tokens = len(prompt)
+            completion_tokens = len(content)
+            return jsonify({
+                "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get('model'),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+
+        @bp.route('/audio/transcriptions', methods=['POST'])
+        def transcriptions():
+            upload = request.files.get('file')
+            data = upload.read() if upload else b''
+            with self._lock:
+                self.transcriptions += 1
+            # 依音檔內容決定轉錄文字：相同音檔結果相同
+            text = random_cjk_text(random.Random(hashlib.sha256(data).digest()), TRANSCRIPT_CHARS)
+            if request.form.get('response_format', 'json') == 'text':
+                return Response(text + '\n', mimetype='text/plain')
+            return jsonify({"text": text})
+
+        return bp
+
+    def get_stats(self):
+        with self._lock:
+            return {"completions": self.completions, "transcriptions": self.transcriptions}
@@ -0,0 +1,103 @@
+"""
+Notion API 假服務（NOTION_API_URL=<base>/notion/v1）
+建立頁面、附加 blocks、封存頁面，以及寫入結果不明時用來查證的資料庫查詢與列出內文
+頁面只保存屬性與 blocks，不驗證內容格式
+"""
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from flask import Blueprint, jsonify, request
+
+
+class FakeNotion:
+    def __init__(self, gate):
+        self.gate = gate
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.appended_blocks = 0
+        self.archived = 0
+        self._pages = {}  # page id -> {"database_id", "properties", "created_time", "children"}
+
+    def blueprint(self):
+        bp = Blueprint('fake_notion', __name__, url_prefix='/notion/v1')
+        bp.before_request(self.gate.before_request)
+
+        @bp.route('/pages', methods=['POST'])
+        def create_page():
+            body = request.get_json(force=True)
+            page_id = str(uuid.uuid4())
+            children = list(body.get('children', []))
+            with self._lock:
+                self.pages += 1
+                self.appended_blocks += len(children)
+                self._pages[page_id] = {
+                    "database_id": (body.get('parent') or {}).get('database_id'),
+                    "properties": body.get('properties', {}),
+                    # 與 Notion 相同只精確到分鐘
+                    "created_time": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:00.000Z'),
+                    "children": children,
+                }
+            return jsonify({"object": "page", "id": page_id,
+                            "url": f"https://www.notion.so/{page_id.replace('-', '')}"})
+
+        @bp.route('/blocks/<block_id>/children', methods=['PATCH'])
+        def append_children(block_id):
+            body = request.get_json(force=True)
+            children = list(body.get('children', []))
+            with self._lock:
+                self.appended_blocks += len(children)
+                if block_id in self._pages:
+                    self._pages[block_id]["children"].extend(children)
+            return jsonify({"object": "list", "results": children, "has_more": False})
+
+        @bp.route('/blocks/<block_id>/children', methods=['GET'])
+        def list_children(block_id):
+            page_size = min(int(request.args.get('page_size', 100)), 100)
+            start = int(request.args.get('start_cursor') or 0)
+            with self._lock:
+                children = list(self._pages.get(block_id, {}).get("children", []))
+            end = start + page_size
+            has_more = end < len(children)
+            return jsonify({"object": "list", "results": children[start:end], "has_more": has_more,
+                            "next_cursor": str(end) if has_more else None})
+
+        @bp.route('/databases/<database_id>/query', methods=['POST'])
+        def query_database(database_id):
+            body = request.get_json(force=True)
+            condition = body.get('filter') or {}
+            with self._lock:
+                pages = [{"object": "page", "id": page_id, "created_time": page["created_time"],
+                          "url": f"https://www.notion.so/{page_id.replace('-', '')}",
+                          "properties": page["properties"]}
+                         for page_id, page in self._pages.items()
+                         if page["database_id"] == database_id and _matches(page["properties"], condition)]
+            pages.sort(key=lambda page: page["created_time"], reverse=True)
+            return jsonify({"object": "list", "results": pages[:body.get('page_size', 100)], "has_more": False})
+
+        @bp.route('/pages/<page_id>', methods=['PATCH'])
+        def update_page(page_id):
+            body = request.get_json(force=True)
+            if body.get('archived'):
+                with self._lock:
+                    self.archived += 1
+            return jsonify({"object": "page", "id": page_id, "archived": bool(body.get('archived'))})
+
+        return bp
+
+    def get_stats(self):
+        with self._lock:
+            return {"pages": self.pages, "appended_blocks": self.appended_blocks, "archived": self.archived}
+
+
+def _matches(properties, condition):
+    """只支援 url / title 的 equals 條件"""
+    if not condition:
+        return True
+    value = properties.get(condition.get('property'), {})
+    if 'url' in condition:
+        return value.get('url') == condition['url'].get('equals')
+    if 'title' in condition:
+        text = ''.join(item.get('text', {}).get('content', '') for item in value.get('title', []))
+        return text == condition['title'].get('equals')
+    return False
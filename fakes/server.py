@@ -0,0 +1,102 @@
+"""
+把所有假服務掛在同一個本機 HTTP 服務上（背景執行緒，多執行緒處理請求）
+"""
+import logging
+import threading
+
+from flask import Flask, jsonify
+from werkzeug.serving import make_server
+
+from fakes.behavior import ServiceGate, default_profiles
+from fakes.google import FakeGoogle
+from fakes.line import FakeLine
+from fakes.llm import FakeLLM
+from fakes.notion import FakeNotion
+from fakes.web import FakeWeb
+
+logger = logging.getLogger(__name__)
+
+
+class FakeServices:
+    """
+    profiles: {服務名稱: ServiceProfile}，未提供的服務使用 DEFAULT_PROFILES
+    port 為 0 時由系統分配
+    """
+
+    def __init__(self, profiles=None, host='127.0.0.1', port=0):
+        self.profiles = default_profiles()
+        self.profiles.update(profiles or {})
+        self.gates = {name: ServiceGate(name, profile) for name, profile in self.profiles.items()}
+
+        self.line = FakeLine(self.gates['line'], self.gates['line_data'])
+        self.groq = FakeLLM('groq', self.gates['groq'], '/groq/openai/v1')
+        self.openai = FakeLLM('openai', self.gates['openai'], '/openai/v1')
+        self.notion = FakeNotion(self.gates['notion'])
+        self.web = FakeWeb(self.gates['jina'], self.gates['site'])
+        self.google = FakeGoogle(self.gates['google'])
+
+        self.app = Flask('fakes')
+        for blueprint in (self.line.blueprints() + self.web.blueprints() +
+                          [self.groq.blueprint(), self.openai.blueprint(),
+                           self.notion.blueprint(), self.google.blueprint()]):
+            self.app.register_blueprint(blueprint)
+        self.app.add_url_rule('/stats', 'stats', lambda: jsonify(self.stats()))
+
+        # 假服務的存取紀錄太多，只保留警告
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self._server = make_server(host, port, self.app, threaded=True)
+        self.host = host
+        self.port = self._server.server_port
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-services', daemon=True)
+        self._thread.start()
+        logger.info(f"假服務已啟動: {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def set_profile(self, service, **values):
+        self.profiles[service].update(**values)
+
+    def site_url(self, name):
+        """供網址訊息使用的假網站網址"""
+        return f"{self.url}/site/{name}"
+
+    def env(self, channel_secret):
+        """讓 app 改連本服務所需的環境變數（API 金鑰皆為假值）"""
+        base = self.url
+        return {
+            'CHANNEL_ACCESS_TOKEN': 'fake-channel-access-token',
+            'CHANNEL_SECRET': channel_secret,
+            'LINE_API_ENDPOINT': f"{base}/line",
+            'LINE_API_DATA_ENDPOINT': f"{base}/line-data",
+            'GROQ_API_KEY': 'fake-groq-key',
+            'GROQ_BASE_URL': f"{base}/groq",
+            'OPENAI_API_KEY': 'fake-openai-key',
+            'OPENAI_BASE_URL': f"{base}/openai/v1",
+            'NOTION_TOKEN': 'fake-notion-token',
+            'NOTION_DATABASE_ID': 'fake-notion-database',
+            'NOTION_API_URL': f"{base}/notion/v1",
+            'JINA_READER_BASE': f"{base}/jina",
+            'GOOGLE_API_BASE': f"{base}/google",
+        }
+
+    def stats(self):
+        return {
+            "gates": {name: gate.get_stats() for name, gate in self.gates.items()},
+            "line": self.line.get_stats(),
+            "groq": self.groq.get_stats(),
+            "openai": self.openai.get_stats(),
+            "notion": self.notion.get_stats(),
+            "web": self.web.get_stats(),
+            "google": self.google.get_stats(),
+        }
@@ -0,0 +1,72 @@
+"""
+r.jina.ai 與一般網站的假服務
+- /jina/<網址>：Jina Reader 的純文字格式（JINA_READER_BASE=<base>/jina）
+- /site/<名稱>：一般 HTML 頁面，供競速爬取中的傳統爬蟲使用
+同一網址每次產生相同內容，不同網址內容不同（避免被近似重複偵測攔下）
+"""
+import hashlib
+import random
+import threading
+
+from flask import Blueprint, Response
+
+# 假文章的段落數與每段字數
+ARTICLE_PARAGRAPHS = 12
+PARAGRAPH_CHARS = 180
+
+# CJK 統一表意文字範圍：隨機取字，不同網址的內容幾乎沒有共同 shingle
+_CJK_FIRST, _CJK_LAST = 0x4E00, 0x9FA5
+
+
+def random_cjk_text(rng, length):
+    return ''.join(chr(rng.randint(_CJK_FIRST, _CJK_LAST)) for _ in range(length))
+
+
+def fake_article(key):
+    """回傳 (標題, [段落])"""
+    digest = hashlib.sha256(key.encode('utf-8'))
+    rng = random.Random(digest.digest())
+    title = f"測試文章 {digest.hexdigest()[:8]}"
+    paragraphs = [random_cjk_text(rng, PARAGRAPH_CHARS) + '。' for _ in range(ARTICLE_PARAGRAPHS)]
+    return title, paragraphs
+
+
+class FakeWeb:
+    def __init__(self, jina_gate, site_gate):
+        self.jina_gate = jina_gate
+        self.site_gate = site_gate
+        self._lock = threading.Lock()
+        self.jina_reads = 0
+        self.site_reads = 0
+
+    def blueprints(self):
+        jina = Blueprint('fake_jina', __name__, url_prefix='/jina')
+        site = Blueprint('fake_site', __name__, url_prefix='/site')
+        jina.before_request(self.jina_gate.before_request)
+        site.before_request(self.site_gate.before_request)
+
+        @jina.route('/<path:target>', methods=['GET'])
+        def read(target):
+            with self._lock:
+                self.jina_reads += 1
+            # Jina 以目標網址為 key，需與 /site 頁面內容一致
+            key = target.rstrip('/').rsplit('/site/', 1)[-1]
+            title, paragraphs = fake_article(key)
+            text = f"Title: {title}\n\n" + '\n\n'.join(paragraphs)
+            return Response(text, mimetype='text/plain')
+
+        @site.route('/<path:name>', methods=['GET'])
+        def page(name):
+            with self._lock:
+                self.site_reads += 1
+            title, paragraphs = fake_article(name.rstrip('/'))
+            body = ''.join(f"<p>{paragraph}</p>" for paragraph in paragraphs)
+            html = (f"<html><head><title>{title}</title></head><body>"
+                    f"<article><h1>{title}</h1>{body}</article></body></html>")
+            return Response(html, mimetype='text/html')
+
+        return [jina, site]
+
+    def get_stats(self):
+        with self._lock:
+            return {"jina_reads": self.jina_reads, "site_reads": self.site_reads}
@@ -0,0 +1,18 @@
+"""
+LINE 事件處理器的參數轉交
+line-bot-sdk 以 inspect.getfullargspec 判斷處理器接受幾個參數，這個函式不會追到 functools.wraps 的原函式，
+遇到 decorator 的 *args 就會多傳 destination；各 decorator 以 call_with_own_args 只轉交原函式接受的位置參數
+"""
+import functools
+import inspect
+
+
+@functools.lru_cache(maxsize=None)
+def _max_positional(func):
+    spec = inspect.getfullargspec(func)
+    return None if spec.varargs else len(spec.args)
+
+
+def call_with_own_args(func, args, kwargs):
+    """以 func 本身接受的位置參數數量呼叫 func（多出的參數捨棄）"""
+    return func(*args[:_max_positional(func)], **kwargs)
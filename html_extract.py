@@ -0,0 +1,312 @@
+"""
+網頁文字擷取引擎
+以串流方式下載 HTML（有位元組上限、非 HTML 內容直接中止），
+並使用 lxml parser target 在單次掃描中擷取標題與主要內文，不建立完整的 DOM 樹
+"""
+import os
+import re
+import codecs
+import logging
+
+from charset_normalizer import from_bytes
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# 下載位元組上限，超過即停止下載
+HTML_MAX_BYTES = int(os.getenv('HTML_MAX_BYTES', str(2 * 1024 * 1024)))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain')
+
+# 不擷取文字的元素
+SKIP_TAGS = {'script', 'style', 'nav', 'footer', 'header', 'aside', 'iframe', 'noscript', 'svg', 'template'}
+# 沒有 article/main 時用來組成內文的段落元素
+PARAGRAPH_TAGS = {'p', 'h1', 'h2', 'h3', 'li'}
+CONTENT_CLASS_PATTERN = re.compile(r'content|article|post|entry')
+
+_META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([A-Za-z0-9_\-]+)', re.IGNORECASE)
+_META_CHARSET_TEXT_PATTERN = re.compile(r'(<meta[^>]+charset=["\']?)[A-Za-z0-9_\-]+', re.IGNORECASE)
+
+
+class NonHtmlContentError(Exception):
+    """回應內容不是 HTML"""
+
+
+def sniff_encoding(head, header_encoding=None):
+    """
+    決定解碼方式：優先使用 HTTP header，其次 <meta charset>；都沒有時
+    head 是合法 UTF-8 就用 UTF-8，否則以 charset_normalizer 偵測（Big5、GBK 等未宣告編碼的舊網頁），仍無法判斷才用 UTF-8
+    """
+    if header_encoding:
+        return header_encoding
+    match = _META_CHARSET_PATTERN.search(head[:4096])
+    if match:
+        return match.group(1).decode('ascii', errors='ignore')
+    try:
+        # final=False：區塊結尾被切開的多位元組字元不算錯誤
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    best = from_bytes(head).best()
+    if best is not None and best.encoding != 'ascii':
+        return best.encoding
+    return 'utf-8'
+
+
+class _Container:
+    """擷取中的內文區塊"""
+
+    def __init__(self, max_chars):
+        self.parts = []
+        self.length = 0
+        self.max_chars = max_chars
+        self.depth = 0  # >0 表示目前位於此區塊內
+        self.seen = False
+
+    @property
+    def full(self):
+        # length 包含每段之間的換行，合併後的實際長度為 length - 1
+        return self.length > self.max_chars
+
+    def add(self, text):
+        if not self.full:
+            self.parts.append(text)
+            self.length += len(text) + 1
+
+    def text(self):
+        return '\n'.join(self.parts)
+
+
+class HtmlTextExtractor:
+    """
+    lxml parser target：在解析事件中直接擷取文字
+    - 標題：<title>，沒有則使用第一個 <h1>
+    - 內文：第一個 <article>，其次 <main>，再其次 class 含 content/article/post/entry 的 <div>，
+      都沒有時組合長度超過 20 字的段落
+    """
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.skip_depth = 0
+        self.in_title = False
+        self.title_parts = []
+        self.h1_parts = []
+        self.h1_depth = 0
+        self.h1_done = False
+        self.containers = {
+            'article': _Container(max_chars),
+            'main': _Container(max_chars),
+            'div': _Container(max_chars),
+        }
+        self.paragraphs = _Container(max_chars)
+        self.paragraph_parts = None
+        self.paragraph_depth = 0
+        self.pending = []
+
+    # --- lxml target 介面 ---
+
+    def start(self, tag, attrib):
+        self._flush()
+        if not isinstance(tag, str):
+            return
+        if self.skip_depth or tag in SKIP_TAGS:
+            self.skip_depth += 1
+            return
+
+        if tag == 'title':
+            self.in_title = True
+        elif tag == 'h1' and not self.h1_done:
+            self.h1_depth += 1
+
+        for name, container in self.containers.items():
+            if container.depth:
+                container.depth += 1
+            elif not container.seen and self._opens(name, tag, attrib):
+                container.depth = 1
+                container.seen = True
+
+        if self.paragraph_parts is not None:
+            self.paragraph_depth += 1
+        elif tag in PARAGRAPH_TAGS:
+            self.paragraph_parts = []
+            self.paragraph_depth = 1
+
+    def end(self, tag):
+        self._flush()
+        if not isinstance(tag, str):
+            return
+        if self.skip_depth:
+            self.skip_depth -= 1
+            return
+
+        if tag == 'title':
+            self.in_title = False
+        elif tag == 'h1' and self.h1_depth:
+            self.h1_depth -= 1
+            if not self.h1_depth:
+                self.h1_done = True
+
+        for container in self.containers.values():
+            if container.depth:
+                container.depth -= 1
+
+        if self.paragraph_parts is not None:
+            self.paragraph_depth -= 1
+            if self.paragraph_depth <= 0:
+                text = ''.join(self.paragraph_parts)
+                if len(text) > 20:
+                    self.paragraphs.add(text)
+                self.paragraph_parts = None
+
+    def data(self, data):
+        if not self.skip_depth:
+            self.pending.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        self._flush()
+        title = ''.join(self.title_parts).strip() or ''.join(self.h1_parts).strip()
+
+        text = ''
+        for name in ('article', 'main', 'div'):
+            if self.containers[name].seen:
+                text = self.containers[name].text()
+                break
+        if not text:
+            text = self.paragraphs.text()
+
+        text = re.sub(r'\n{3,}', '\n\n', text)
+        return title, text[:self.max_chars]
+
+    # --- 內部工具 ---
+
+    @staticmethod
+    def _opens(name, tag, attrib):
+        if name == 'div':
+            return tag == 'div' and bool(CONTENT_CLASS_PATTERN.search(attrib.get('class', '')))
+        return tag == name
+
+    def _flush(self):
+        """將累積的文字節點（可能被分成多次 data 事件）分派到各區塊"""
+        if not self.pending:
+            return
+        raw = ''.join(self.pending)
+        self.pending = []
+        text = raw.strip()
+        if not text:
+            return
+
+        if self.in_title:
+            self.title_parts.append(raw)
+        if self.h1_depth:
+            self.h1_parts.append(text)
+        for container in self.containers.values():
+            if container.depth:
+                container.add(text)
+        if self.paragraph_parts is not None:
+            self.paragraph_parts.append(text)
+
+    @property
+    def done(self):
+        """目前會被採用的區塊已經收滿，可以提早停止下載"""
+        for name in ('article', 'main', 'div'):
+            if self.containers[name].seen:
+                return self.containers[name].full
+        return self.paragraphs.full
+
+
+def extract_html(chunks, encoding=None, max_chars=8000):
+    """
+    從 HTML 位元組（或位元組區塊的 iterable）擷取 (title, text)
+    不需下載時可直接傳入 bytes，供 benchmark 與離線測試使用
+    """
+    if isinstance(chunks, (bytes, bytearray)):
+        chunks = [bytes(chunks)]
+
+    extractor = HtmlTextExtractor(max_chars)
+    # 統一轉為 UTF-8 餵給 parser
+    parser = etree.HTMLParser(target=extractor, encoding='utf-8')
+    decoder = None
+    fed = False
+    for chunk in chunks:
+        if decoder is None:
+            # 以增量解碼器處理區塊邊界上被切開的多位元組字元
+            try:
+                decoder = codecs.getincrementaldecoder(sniff_encoding(chunk, encoding))(errors='replace')
+            except LookupError:
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        text = decoder.decode(chunk)
+        if text:
+            # 內容已轉為 UTF-8，改寫 <meta charset> 避免 libxml2 在串流中途切換編碼
+            text = _META_CHARSET_TEXT_PATTERN.sub(r'\1utf-8', text)
+            parser.feed(text.encode('utf-8'))
+            fed = True
+        if extractor.done:
+            break
+
+    if not fed:
+        return '', ''
+    return parser.close()
+
+
+def extract_from_response(response, max_chars=8000, max_bytes=HTML_MAX_BYTES, cancel_event=None):
+    """
+    串流讀取 requests 回應並擷取 (title, text)
+    - Content-Type 不是 HTML 時拋出 NonHtmlContentError
+    - 超過 max_bytes 或內文已收滿時停止下載
+    - cancel_event 被設定時回傳 (None, None)
+    """
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type and content_type not in HTML_CONTENT_TYPES:
+        raise NonHtmlContentError(f"不支援的內容類型: {content_type}")
+
+    header_encoding = response.encoding if 'charset' in response.headers.get('Content-Type', '').lower() else None
+    state = {"bytes": 0, "cancelled": False}
+
+    def _chunks():
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            if cancel_event is not None and cancel_event.is_set():
+                state["cancelled"] = True
+                return
+            if state["bytes"] + len(chunk) > max_bytes:
+                logger.info(f"網頁超過 {max_bytes} bytes 上限，停止下載")
+                # 在標籤邊界截斷，避免切在多位元組字元中間
+                head = chunk[:max_bytes - state["bytes"]]
+                cut = head.rfind(b'<')
+                yield head[:cut] if cut > 0 else head
+                return
+            state["bytes"] += len(chunk)
+            yield chunk
+
+    title, text = extract_html(_chunks(), header_encoding, max_chars)
+    if state["cancelled"]:
+        return None, None
+    return title, text
+
+
+def parse_jina_text(raw_text, max_chars=8000):
+    """
+    解析 Jina Reader 的純文字回應，回傳 (title, content)
+    Jina 格式第一行通常是標題（'Title: ...' 或 '# ...'）；內容過短時回傳 (None, None)
+    """
+    content = raw_text.strip()
+    if not content or len(content) < 30:
+        return None, None
+
+    # 從內容中提取標題（Jina 格式通常第一行是標題）
+    lines = content.split('\n')
+    title = lines[0].strip() if lines else "網頁內容"
+
+    # 移除標題行，保留正文
+    if title.startswith('# '):
+        title = title[2:]
+    if title.startswith('Title: '):
+        title = title[7:]
+
+    # 清理內容
+    content = '\n'.join(lines[1:]).strip() if len(lines) > 1 else content
+    return title, content[:max_chars]
@@ -0,0 +1,144 @@
+"""
+共用 HTTP 用戶端
+每個 host 使用獨立的 requests.Session 與連線池，保持 keep-alive，
+統一設定連線/讀取逾時，並在 429 / 5xx 時以指數退避重試
+"""
+import os
+import threading
+import time
+import logging
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class SafeRetry(Retry):
+    """
+    冪等方法 (GET/HEAD...) 遇到 429/5xx 都重試；
+    POST/PATCH 只在 429 時重試，避免 5xx 後重送造成重複建立資料
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and self.total:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _build_retry():
+    return SafeRetry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=HTTP_MAX_RETRIES,
+        status=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class HttpClient:
+    """依 host 管理連線池的 HTTP 用戶端"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _get_session(self, host, retry):
+        key = (host, retry)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    max_retries=_build_retry() if retry else Retry(total=0, raise_on_status=False),
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[key] = session
+                self._stats.setdefault(host, {"requests": 0, "errors": 0, "total_ms": 0.0})
+            return session
+
+    def request(self, method, url, timeout=None, retry=True, **kwargs):
+        """
+        發送 HTTP 請求
+        timeout 可為單一數字（讀取逾時）或 (connect, read) tuple
+        retry=False 時不做自動重試，交由呼叫端處理（例如自行排程的佇列）
+        """
+        host = urlparse(url).netloc.lower()
+        session = self._get_session(host, retry)
+
+        if timeout is None:
+            timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        elif not isinstance(timeout, tuple):
+            timeout = (min(HTTP_CONNECT_TIMEOUT, timeout), timeout)
+
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(host, start, error=True)
+            raise
+        self._record(host, start, error=response.status_code >= 500)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def _record(self, host, start, error=False):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            stats = self._stats.setdefault(host, {"requests": 0, "errors": 0, "total_ms": 0.0})
+            stats["requests"] += 1
+            stats["total_ms"] += elapsed_ms
+            if error:
+                stats["errors"] += 1
+
+    def get_metrics(self):
+        """回傳各 host 的請求統計與連線池狀態"""
+        metrics = {}
+        with self._lock:
+            sessions = list(self._sessions.items())
+            stats = {host: dict(values) for host, values in self._stats.items()}
+
+        for host, values in stats.items():
+            values["avg_ms"] = round(values.pop("total_ms") / values["requests"], 1) if values["requests"] else 0.0
+            values.update({"connections_opened": 0, "pooled_requests": 0, "idle_connections": 0})
+            metrics[host] = values
+
+        for (host, _retry), session in sessions:
+            adapter = session.get_adapter('https://')
+            pools = adapter.poolmanager.pools
+            for pool_key in list(pools.keys()):
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                metrics[host]["connections_opened"] += pool.num_connections
+                metrics[host]["pooled_requests"] += pool.num_requests
+                if pool.pool is not None:
+                    metrics[host]["idle_connections"] += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        return metrics
+
+
+http = HttpClient()
@@ -0,0 +1,95 @@
+"""
+延遲初始化
+openai、groq、gspread、googleapiclient 等套件光是 import 就要數百毫秒，
+自動擴展的平台上冷啟動時間會直接反映在第一個請求的延遲；
+改為第一次使用時才 import 與建立客戶端，並可在啟動後由背景執行緒預先暖機
+"""
+import os
+import importlib
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 啟動後是否在背景預先載入重量級套件與客戶端
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'true').lower() == 'true'
+# 啟動後延遲幾秒才開始暖機（讓出 CPU 給第一個請求）
+STARTUP_WARMUP_DELAY = float(os.getenv('STARTUP_WARMUP_DELAY', '0'))
+
+
+class LazyValue:
+    """第一次 get() 時才呼叫 factory 建立，之後都回傳同一個物件（factory 回傳 None 或失敗時也不再重試）"""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._value = None
+        self.init_ms = None
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    logger.error(f"{self.name} 初始化失敗: {e}")
+                    self._value = None
+                self.init_ms = round((time.perf_counter() - start) * 1000, 1)
+                self._loaded = True
+        return self._value
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+
+class Warmup:
+    """背景預先 import 模組並初始化 LazyValue"""
+
+    def __init__(self):
+        self.modules = []
+        self.values = []
+        self.started_at = None
+        self.finished_ms = None
+        self._thread = None
+
+    def register(self, *items):
+        """登記要暖機的項目：模組名稱字串或 LazyValue"""
+        for item in items:
+            (self.values if isinstance(item, LazyValue) else self.modules).append(item)
+
+    def start(self, delay=STARTUP_WARMUP_DELAY):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(delay,), name="startup-warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self, delay):
+        if delay:
+            time.sleep(delay)
+        self.started_at = time.perf_counter()
+        for name in self.modules:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                logger.warning(f"暖機時無法載入 {name}: {e}")
+        for value in self.values:
+            value.get()
+        self.finished_ms = round((time.perf_counter() - self.started_at) * 1000, 1)
+        logger.info(f"背景暖機完成，耗時 {self.finished_ms} ms")
+
+    def get_stats(self):
+        return {
+            "enabled": self._thread is not None,
+            "finished_ms": self.finished_ms,
+            "clients": {value.name: {"loaded": value.loaded, "init_ms": value.init_ms} for value in self.values},
+        }
+
+
+warmup = Warmup()
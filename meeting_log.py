@@ -0,0 +1,220 @@
+"""
+會議記錄 write-ahead log
+會議模式中的每則訊息都以 JSON Lines 附加到該用戶的記錄檔，fsync 批次進行
+（累積一定筆數或超過時間間隔才同步到磁碟），worker 重啟後可從記錄檔恢復進行中的會議；
+/end 時直接從記錄檔分段讀取，分批寫入 Google Sheets 與 Notion
+"""
+import os
+import re
+import json
+import tempfile
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+MEETING_LOG_DIR = os.getenv('MEETING_LOG_DIR', os.path.join(tempfile.gettempdir(), 'meeting_logs'))
+# 累積幾筆或經過幾秒做一次 fsync
+MEETING_LOG_FSYNC_EVERY = int(os.getenv('MEETING_LOG_FSYNC_EVERY', '10'))
+MEETING_LOG_FSYNC_INTERVAL = float(os.getenv('MEETING_LOG_FSYNC_INTERVAL', '1.0'))
+
+_UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9_-]')
+
+
+class MeetingLog:
+    """單一會議的記錄檔"""
+
+    def __init__(self, path, user_id, started_at=None):
+        self.path = path
+        self.user_id = user_id
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        new_file = started_at is None
+        self._file = open(path, 'w' if new_file else 'a', encoding='utf-8')
+        if new_file:
+            self._write({"user_id": user_id, "started_at": int(time.time())})
+            self.sync()
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def append(self, timestamp, content):
+        """附加一筆訊息，回傳這次是否有 fsync"""
+        self._write({"t": int(timestamp), "c": content})
+        self.unsynced += 1
+        if self.unsynced >= MEETING_LOG_FSYNC_EVERY or time.monotonic() - self.last_sync >= MEETING_LOG_FSYNC_INTERVAL:
+            self.sync()
+            return True
+        return False
+
+    def sync(self):
+        if self._file.closed:
+            return
+        os.fsync(self._file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+
+def read_log(path):
+    """讀取記錄檔，回傳 (user_id, started_at, [(epoch 秒, 內容)])；結尾寫到一半的行會被略過"""
+    user_id = None
+    started_at = None
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"略過損毀的會議記錄行: {path}")
+                continue
+            if "c" in record:
+                entries.append((record["t"], record["c"]))
+            elif "user_id" in record:
+                user_id = record["user_id"]
+                started_at = record.get("started_at")
+    return user_id, started_at, entries
+
+
+def iter_chunks(entries, max_chars):
+    """將訊息依序合併成不超過 max_chars 的段落，產生 (開始時間, 結束時間, 文字)"""
+    parts = []
+    length = 0
+    start = end = None
+    for timestamp, content in entries:
+        if len(content) > max_chars:
+            content = content[:max_chars]
+        if parts and length + len(content) + 1 > max_chars:
+            yield start, end, '\n'.join(parts)
+            parts = []
+            length = 0
+        if not parts:
+            start = timestamp
+        parts.append(content)
+        length += len(content) + 1
+        end = timestamp
+    if parts:
+        yield start, end, '\n'.join(parts)
+
+
+class MeetingLogStore:
+    """管理所有進行中會議的記錄檔，背景執行緒定期 fsync 尚未同步的內容"""
+
+    def __init__(self, directory=MEETING_LOG_DIR):
+        self.directory = directory
+        self._logs = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+        self.appended = 0
+        self.fsyncs = 0
+
+    def path_for(self, user_id):
+        return os.path.join(self.directory, _UNSAFE_CHARS.sub('_', user_id) + '.log')
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="meeting-log-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(MEETING_LOG_FSYNC_INTERVAL)
+            with self._lock:
+                for log in self._logs.values():
+                    if log.unsynced:
+                        try:
+                            log.sync()
+                            self.fsyncs += 1
+                        except OSError as e:
+                            logger.error(f"會議記錄 fsync 失敗: {e}")
+
+    def open(self, user_id):
+        """開始新的會議記錄（覆蓋該用戶舊的記錄檔）"""
+        try:
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                old = self._logs.pop(user_id, None)
+                if old:
+                    old.close()
+                self._logs[user_id] = MeetingLog(self.path_for(user_id), user_id)
+                self._start_flusher()
+        except OSError as e:
+            logger.error(f"無法建立會議記錄檔: {e}")
+
+    def append(self, user_id, timestamp, content):
+        try:
+            with self._lock:
+                log = self._logs.get(user_id)
+                if log is None:
+                    return
+                if log.append(timestamp, content):
+                    self.fsyncs += 1
+                self.appended += 1
+        except OSError as e:
+            logger.error(f"寫入會議記錄失敗: {e}")
+
+    def read(self, user_id):
+        """同步後讀取該用戶的完整記錄，檔案不存在時回傳 None"""
+        with self._lock:
+            log = self._logs.get(user_id)
+            if log:
+                log.sync()
+        try:
+            return read_log(self.path_for(user_id))[2]
+        except OSError:
+            return None
+
+    def close(self, user_id, remove=True):
+        """結束會議；remove=True 時刪除記錄檔"""
+        with self._lock:
+            log = self._logs.pop(user_id, None)
+            if log:
+                log.close()
+        if remove:
+            try:
+                os.remove(self.path_for(user_id))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"刪除會議記錄檔失敗: {e}")
+
+    def recover(self):
+        """啟動時掃描記錄檔，回傳 {user_id: [(epoch 秒, 內容)]} 並重新開啟以便繼續附加"""
+        recovered = {}
+        if not os.path.isdir(self.directory):
+            return recovered
+        for name in os.listdir(self.directory):
+            if not name.endswith('.log'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                user_id, started_at, entries = read_log(path)
+            except OSError as e:
+                logger.error(f"讀取會議記錄檔失敗 {name}: {e}")
+                continue
+            if not user_id:
+                continue
+            with self._lock:
+                self._logs[user_id] = MeetingLog(path, user_id, started_at=started_at)
+                self._start_flusher()
+            recovered[user_id] = entries
+        if recovered:
+            logger.info(f"從記錄檔恢復 {len(recovered)} 個進行中的會議")
+        return recovered
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "open_logs": len(self._logs),
+                "appended": self.appended,
+                "fsyncs": self.fsyncs,
+            }
+
+
+meeting_logs = MeetingLogStore()
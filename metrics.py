@@ -0,0 +1,276 @@
+"""
+效能指標 (Prometheus 文字格式)
+各處理階段與服務供應商的延遲 histogram、備援與錯誤 counter、佇列深度與進行中請求 gauge，
+由 /metrics 端點輸出給 Prometheus 抓取；不依賴 prometheus_client，單一 worker 內以 lock 保護
+"""
+import functools
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+from handler_args import call_with_own_args
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 延遲 histogram 的 bucket 上界（秒），涵蓋 LINE API 的數十毫秒到本地 Whisper 的數分鐘
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要標籤 {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class CallbackGauge(_Metric):
+    """抓取時才呼叫 callback 取值的 gauge；callback 回傳數字，或 {標籤值 tuple: 數字}"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def render(self):
+        try:
+            values = self._callback()
+        except Exception as e:
+            logger.warning(f"讀取指標 {self.name} 失敗: {e}")
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items()) if value is not None
+        ]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def callback_gauge(self, name, documentation, callback, labelnames=()):
+        return self._register(CallbackGauge(name, documentation, callback, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """輸出 Prometheus 文字格式"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    'linebot_stage_seconds', '各處理階段耗時（秒）', ('stage', 'provider', 'outcome'))
+HANDLER_SECONDS = metrics.histogram(
+    'linebot_handler_seconds', '事件處理器與 HTTP 端點耗時（秒）', ('handler', 'outcome'))
+HANDLER_IN_FLIGHT = metrics.gauge(
+    'linebot_handler_in_flight', '處理中的事件與請求數', ('handler',))
+ERRORS = metrics.counter(
+    'linebot_errors_total', '各階段失敗次數', ('stage', 'provider'))
+FALLBACKS = metrics.counter(
+    'linebot_fallbacks_total', '改用備援服務的次數', ('stage', 'from_provider', 'to_provider'))
+
+
+def _record(stage, provider, seconds, ok):
+    outcome = 'ok' if ok else 'error'
+    STAGE_SECONDS.observe(seconds, stage=stage, provider=provider, outcome=outcome)
+    if not ok:
+        ERRORS.inc(stage=stage, provider=provider)
+
+
+def observe_stage(stage, provider, seconds, ok=True, **attributes):
+    """記錄一段已結束的階段，同時在目前的 trace 中留下對應的 span（attributes 為 span 的附加欄位）"""
+    _record(stage, provider, seconds, ok)
+    tracer.record_span(stage, seconds, ok=ok, provider=provider or None, **attributes)
+
+
+@contextmanager
+def stage_timer(stage, provider=''):
+    """記錄 with 區塊的耗時（並開啟對應的 span）；區塊拋出例外時記為失敗"""
+    start = time.perf_counter()
+    with tracer.span(stage, provider=provider or None):
+        try:
+            yield
+        except Exception:
+            _record(stage, provider, time.perf_counter() - start, ok=False)
+            raise
+        _record(stage, provider, time.perf_counter() - start, ok=True)
+
+
+def timed_stage(stage, provider=''):
+    """
+    記錄函式耗時的 decorator（並開啟對應的 span）
+    本專案的函式失敗時多半回傳 None（或 False）而非拋出例外，這兩種結果也記為失敗
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            with tracer.span(stage, provider=provider or None) as span:
+                try:
+                    result = func(*args, **kwargs)
+                except Exception:
+                    _record(stage, provider, time.perf_counter() - start, ok=False)
+                    raise
+                ok = result is not None and result is not False
+                if not ok:
+                    span.set_error()
+                _record(stage, provider, time.perf_counter() - start, ok=ok)
+                return result
+        return wrapper
+    return decorator
+
+
+def record_fallback(stage, from_provider, to_provider):
+    FALLBACKS.inc(stage=stage, from_provider=from_provider, to_provider=to_provider)
+
+
+def track_handler(name):
+    """包裝事件處理器 / HTTP 端點：進行中數量、耗時與未捕捉的例外"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            HANDLER_IN_FLIGHT.inc(handler=name)
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = call_with_own_args(func, args, kwargs)
+                outcome = 'ok'
+                return result
+            finally:
+                HANDLER_IN_FLIGHT.dec(handler=name)
+                HANDLER_SECONDS.observe(time.perf_counter() - start, handler=name, outcome=outcome)
+                if outcome == 'error':
+                    ERRORS.inc(stage='handler', provider=name)
+        return wrapper
+    return decorator
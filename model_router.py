@@ -0,0 +1,67 @@
+"""
+摘要模型路由
+依輸入長度與任務類型選擇摘要模型：
+- 極短內容直接略過 LLM
+- 筆記（文字、語音逐字稿）一律使用小型 instant 模型，只需 30-50 字的摘要
+- 長網頁、會議逐字稿超過各自的門檻才使用大型模型
+"""
+import os
+from collections import namedtuple
+
+# 路由層級
+TIER_SKIP = "skip"
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+# 任務類型：note (文字/語音筆記)、webpage (網頁)、meeting (會議記錄)
+TASK_NOTE = "note"
+TASK_WEBPAGE = "webpage"
+TASK_MEETING = "meeting"
+
+# 門檻設定（字元數，可由環境變數調整）
+SUMMARY_SKIP_MAX_CHARS = int(os.getenv('SUMMARY_SKIP_MAX_CHARS', '20'))
+SUMMARY_SMALL_MAX_CHARS = int(os.getenv('SUMMARY_SMALL_MAX_CHARS', '1500'))
+# 各任務使用小模型的字數上限，None 表示一律使用小模型（過長的筆記由 summarizer 分段）
+SMALL_MAX_CHARS_BY_TASK = {
+    TASK_NOTE: None,
+    TASK_WEBPAGE: int(os.getenv('SUMMARY_WEBPAGE_SMALL_MAX_CHARS', str(SUMMARY_SMALL_MAX_CHARS))),
+    TASK_MEETING: int(os.getenv('SUMMARY_MEETING_SMALL_MAX_CHARS', str(SUMMARY_SMALL_MAX_CHARS))),
+}
+
+# 模型設定
+SUMMARY_SMALL_MODEL = os.getenv('SUMMARY_SMALL_MODEL', 'llama-3.1-8b-instant')
+SUMMARY_LARGE_MODEL = os.getenv('SUMMARY_LARGE_MODEL', 'llama-3.3-70b-versatile')
+
+# 每百萬 token 價格 (USD)：(輸入, 輸出)，供 benchmark 估算成本
+MODEL_PRICING = {
+    'llama-3.1-8b-instant': (0.05, 0.08),
+    'llama-3.3-70b-versatile': (0.59, 0.79),
+}
+
+ModelRoute = namedtuple('ModelRoute', ['tier', 'model'])
+
+
+def route_summary_model(text, task=TASK_NOTE):
+    """
+    依內容長度與任務類型選擇摘要模型
+    回傳 ModelRoute(tier, model)，tier 為 skip 時 model 為 None
+    """
+    length = len(text.strip()) if text else 0
+
+    # 只有一般筆記才會略過 LLM，網頁與會議內容一律需要摘要
+    if task == TASK_NOTE and length <= SUMMARY_SKIP_MAX_CHARS:
+        return ModelRoute(TIER_SKIP, None)
+
+    small_max_chars = SMALL_MAX_CHARS_BY_TASK.get(task, SUMMARY_SMALL_MAX_CHARS)
+    if small_max_chars is None or length <= small_max_chars:
+        return ModelRoute(TIER_SMALL, SUMMARY_SMALL_MODEL)
+
+    return ModelRoute(TIER_LARGE, SUMMARY_LARGE_MODEL)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """依 MODEL_PRICING 估算單次呼叫成本 (USD)，未知模型回傳 0"""
+    if model not in MODEL_PRICING:
+        return 0.0
+    input_price, output_price = MODEL_PRICING[model]
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
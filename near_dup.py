@@ -0,0 +1,234 @@
+"""
+近似重複內容偵測 (MinHash + LSH)
+同一篇文章常以不同網址出現（轉貼、鏡像站、Facebook 與 Threads 互相轉發），內容雜湊無法比對；
+以字元 shingle 計算 MinHash 簽章，再用 LSH 分桶快速找出候選，在 AI 摘要前攔下近似重複的內容
+- shingle 與 MinHash 以 numpy 向量化計算，一般文章數毫秒、6 萬字的長文約 50 毫秒
+- 簽章存於 SQLite（預設與筆記索引共用檔案），啟動後第一次查詢時載入記憶體
+- numpy 在第一次計算或載入簽章時才 import，不拖慢啟動
+"""
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+NEAR_DUP_PATH = os.getenv(
+    'NEAR_DUP_PATH', os.getenv('NOTE_INDEX_PATH', os.path.join(tempfile.gettempdir(), 'note_index.db'))
+)
+# 估計的 Jaccard 相似度達到此值即視為近似重複
+NEAR_DUP_THRESHOLD = float(os.getenv('NEAR_DUP_THRESHOLD', '0.8'))
+# 內容太短時不比對（短句容易誤判）
+NEAR_DUP_MIN_CHARS = int(os.getenv('NEAR_DUP_MIN_CHARS', '200'))
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+# 32 個 band × 每 band 4 列：相似度 0.8 的內容幾乎一定會成為候選，再以簽章估計值過濾
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+# 分批計算 MinHash，避免長文產生過大的中間矩陣
+_SHINGLE_BATCH = 4096
+
+# multiply-shift 雜湊族：((a * x + b) mod 2^64) >> 32，a 為奇數，uint64 溢位即為取模
+# 參數在 _load_numpy() 中產生
+np = None
+_PERM_A = _PERM_B = _SHIFT = None
+_numpy_lock = threading.Lock()
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS near_dup (
+    note_key TEXT PRIMARY KEY,
+    signature BLOB,
+    title TEXT,
+    summary TEXT,
+    url TEXT,
+    page_url TEXT
+);
+"""
+
+
+def _load_numpy():
+    """第一次使用時載入 numpy 並產生雜湊參數"""
+    global np, _PERM_A, _PERM_B, _SHIFT
+    if np is not None:
+        return
+    with _numpy_lock:
+        if np is not None:
+            return
+        import numpy
+        rng = numpy.random.RandomState(20240611)
+        _PERM_A = (rng.randint(0, 1 << 62, size=(NUM_PERM, 1), dtype=numpy.int64).astype(numpy.uint64)
+                   << numpy.uint64(1)) | numpy.uint64(1)
+        _PERM_B = rng.randint(0, 1 << 62, size=(NUM_PERM, 1), dtype=numpy.int64).astype(numpy.uint64)
+        _SHIFT = numpy.uint64(32)
+        np = numpy
+
+
+def normalize_text(text):
+    """轉小寫並移除空白與標點，排版或轉貼時加入的符號不影響比對"""
+    return _NON_WORD.sub('', (text or '').lower())
+
+
+def shingle_hashes(text):
+    """以 numpy 計算所有長度 SHINGLE_SIZE 的字元 shingle 的 32-bit 雜湊（去重）"""
+    _load_numpy()
+    normalized = normalize_text(text)
+    if len(normalized) < SHINGLE_SIZE:
+        return np.empty(0, dtype=np.uint64)
+
+    codes = np.frombuffer(normalized.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    # 多項式滾動雜湊：每個位置一次向量運算，uint64 溢位即為 mod 2^64
+    hashes = np.zeros(len(codes) - SHINGLE_SIZE + 1, dtype=np.uint64)
+    for offset in range(SHINGLE_SIZE):
+        hashes = hashes * np.uint64(1000003) + codes[offset:offset + len(hashes)]
+    hashes ^= hashes >> np.uint64(29)
+    return np.unique(hashes & np.uint64(0xFFFFFFFF))
+
+
+def minhash_signature(text):
+    """計算 MinHash 簽章（NUM_PERM 個 uint64），shingle 不足時回傳 None"""
+    shingles = shingle_hashes(text)
+    if not len(shingles):
+        return None
+    signature = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(shingles), _SHINGLE_BATCH):
+        batch = shingles[start:start + _SHINGLE_BATCH][np.newaxis, :]
+        permuted = (_PERM_A * batch + _PERM_B) >> _SHIFT
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature
+
+
+def estimate_similarity(sig_a, sig_b):
+    """以簽章相同的比例估計 Jaccard 相似度"""
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+def _band_keys(signature):
+    bands = signature.reshape(LSH_BANDS, LSH_ROWS)
+    return [(index, band.tobytes()) for index, band in enumerate(bands)]
+
+
+class NearDuplicateIndex:
+    """MinHash 簽章的 LSH 索引"""
+
+    def __init__(self, path=NEAR_DUP_PATH, threshold=NEAR_DUP_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._conn = None
+        self._signatures = {}
+        self._buckets = {}
+        self._info = {}
+        self.checks = 0
+        self.matches = 0
+
+    def _connect(self):
+        """開啟資料庫並將所有簽章載入記憶體（只在第一次使用時執行）"""
+        if self._conn is None:
+            _load_numpy()
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.executescript(_SCHEMA)
+            for note_key, blob, title, summary, url, page_url in conn.execute("SELECT * FROM near_dup"):
+                self._insert(note_key, np.frombuffer(blob, dtype=np.uint64).copy(),
+                             {"title": title, "summary": summary, "url": url, "page_url": page_url})
+            self._conn = conn
+        return self._conn
+
+    def _insert(self, note_key, signature, info):
+        if note_key in self._signatures:
+            self._remove(note_key)
+        self._signatures[note_key] = signature
+        self._info[note_key] = info
+        for band_key in _band_keys(signature):
+            self._buckets.setdefault(band_key, set()).add(note_key)
+
+    def _remove(self, note_key):
+        signature = self._signatures.pop(note_key)
+        self._info.pop(note_key, None)
+        for band_key in _band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket:
+                bucket.discard(note_key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def find(self, text, exclude_key=None):
+        """
+        尋找與 text 近似的已儲存內容
+        回傳 (note_key, 相似度, {title, summary, url, page_url})，沒有時回傳 None
+        """
+        if len(normalize_text(text)) < NEAR_DUP_MIN_CHARS:
+            return None
+        signature = minhash_signature(text)
+        if signature is None:
+            return None
+
+        try:
+            with self._lock:
+                self._connect()
+                self.checks += 1
+                candidates = set()
+                for band_key in _band_keys(signature):
+                    candidates.update(self._buckets.get(band_key, ()))
+                candidates.discard(exclude_key)
+
+                best = None
+                for note_key in candidates:
+                    similarity = estimate_similarity(signature, self._signatures[note_key])
+                    if similarity >= self.threshold and (best is None or similarity > best[1]):
+                        best = (note_key, similarity, dict(self._info[note_key]))
+                if best:
+                    self.matches += 1
+                return best
+        except sqlite3.Error as e:
+            logger.error(f"讀取近似重複索引失敗: {e}")
+            return None
+
+    def add(self, note_key, text, title, summary, url=None, page_url=None):
+        """將已儲存的內容加入索引"""
+        if len(normalize_text(text)) < NEAR_DUP_MIN_CHARS:
+            return
+        signature = minhash_signature(text)
+        if signature is None:
+            return
+        info = {"title": title, "summary": summary, "url": url, "page_url": page_url}
+        try:
+            with self._lock:
+                conn = self._connect()
+                self._insert(note_key, signature, info)
+                conn.execute(
+                    "INSERT OR REPLACE INTO near_dup (note_key, signature, title, summary, url, page_url) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (note_key, signature.tobytes(), title, summary, url, page_url),
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"寫入近似重複索引失敗: {e}")
+
+    def set_page_url(self, note_key, page_url):
+        """Notion 頁面建立後補上連結"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                if note_key in self._info:
+                    self._info[note_key]["page_url"] = page_url
+                conn.execute("UPDATE near_dup SET page_url = ? WHERE note_key = ?", (page_url, note_key))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"更新近似重複索引失敗: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "documents": len(self._signatures),
+                "buckets": len(self._buckets),
+                "checks": self.checks,
+                "matches": self.matches,
+            }
+
+
+near_dup_index = NearDuplicateIndex()
@@ -0,0 +1,118 @@
+"""
+本地筆記索引 (SQLite)
+記錄已存入 Notion 的網址筆記：正規化網址與內容雜湊 → Notion 頁面 id / 連結與 AI 摘要，
+再次分享相同網址（或不同網址但內容相同）時可直接回覆既有頁面，不必重新爬取、摘要與建立頁面
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+NOTE_INDEX_PATH = os.getenv('NOTE_INDEX_PATH', os.path.join(tempfile.gettempdir(), 'note_index.db'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    canonical_url TEXT PRIMARY KEY,
+    content_hash TEXT,
+    title TEXT,
+    summary TEXT,
+    note_type TEXT,
+    page_id TEXT,
+    page_url TEXT,
+    created_at REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_notes_content_hash ON notes (content_hash);
+"""
+
+
+class NoteIndex:
+    """執行緒安全的筆記索引（單一連線 + lock）"""
+
+    def __init__(self, path=NOTE_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _query_one(self, sql, params):
+        try:
+            with self._lock:
+                row = self._connect().execute(sql, params).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"讀取筆記索引失敗: {e}")
+            return None
+        if row is None:
+            return None
+        with self._lock:
+            self.hits += 1
+        return dict(row)
+
+    def find_by_url(self, canonical_url):
+        return self._query_one("SELECT * FROM notes WHERE canonical_url = ?", (canonical_url,))
+
+    def find_by_hash(self, content_hash):
+        return self._query_one(
+            "SELECT * FROM notes WHERE content_hash = ? ORDER BY updated_at DESC LIMIT 1", (content_hash,)
+        )
+
+    def _execute(self, sql, params, action):
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(sql, params)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"{action}筆記索引失敗: {e}")
+
+    def record(self, canonical_url, content_hash, title, summary, note_type, page_id=None, page_url=None):
+        """寫入（或覆蓋）一筆索引；排入 Notion 佇列時頁面尚未建立，之後再由 mark_saved 補上頁面 id"""
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO notes (canonical_url, content_hash, title, summary, note_type, page_id, "
+            "page_url, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (canonical_url, content_hash, title, summary, note_type, page_id, page_url, now, now),
+            "寫入",
+        )
+
+    def link(self, canonical_url, existing):
+        """不同網址但內容相同：新增一筆指向既有頁面的索引"""
+        self.record(canonical_url, existing['content_hash'], existing['title'], existing['summary'],
+                    existing['note_type'], existing['page_id'], existing['page_url'])
+
+    def mark_saved(self, canonical_url, page_id, page_url):
+        """Notion 頁面建立成功，記錄頁面 id 與連結"""
+        self._execute(
+            "UPDATE notes SET page_id = ?, page_url = ?, updated_at = ? WHERE canonical_url = ?",
+            (page_id, page_url, time.time(), canonical_url),
+            "更新",
+        )
+
+    def remove_pending(self, canonical_url):
+        """Notion 寫入最終失敗時移除尚未建立頁面的索引，下次分享會重新處理"""
+        self._execute(
+            "DELETE FROM notes WHERE canonical_url = ? AND page_id IS NULL", (canonical_url,), "移除"
+        )
+
+    def get_stats(self):
+        try:
+            with self._lock:
+                count = self._connect().execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        except sqlite3.Error:
+            count = None
+        return {"notes": count, "hits": self.hits}
+
+
+note_index = NoteIndex()
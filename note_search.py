@@ -0,0 +1,222 @@
+"""
+本地全文搜尋 (SQLite FTS5)
+所有筆記（文字、語音、圖片、網頁、會議記錄）在儲存時同步寫入索引，
+/search 指令以 bm25 排序（標題 > 摘要 > 內文）在本機查詢，不必到 Notion 翻找
+- 中文沒有空白分詞：寫入前在每個中日韓字元兩側加空白，讓 unicode61 以單字為 token，
+  查詢時再把關鍵字轉成相鄰單字的 phrase，任意長度的關鍵字都能走索引
+- 每寫入一定筆數做一次小量 merge，讓 segment 數維持在低檔；累積更多筆數後由背景執行緒（或 POST /admin/search/optimize）
+  以 optimize() 完整壓縮，optimize 使用獨立連線，不會卡住寫入與查詢共用的連線
+"""
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+NOTE_SEARCH_PATH = os.getenv(
+    'NOTE_SEARCH_PATH', os.getenv('NOTE_INDEX_PATH', os.path.join(tempfile.gettempdir(), 'note_index.db'))
+)
+# 每寫入幾筆做一次增量 merge，以及每次 merge 的頁數
+NOTE_SEARCH_MERGE_EVERY = int(os.getenv('NOTE_SEARCH_MERGE_EVERY', '100'))
+NOTE_SEARCH_MERGE_PAGES = int(os.getenv('NOTE_SEARCH_MERGE_PAGES', '500'))
+# 每寫入幾筆在背景做一次完整壓縮（0 表示只由管理端點觸發）
+NOTE_SEARCH_OPTIMIZE_EVERY = int(os.getenv('NOTE_SEARCH_OPTIMIZE_EVERY', '2000'))
+# 內文最多索引的字數
+NOTE_SEARCH_MAX_CONTENT = int(os.getenv('NOTE_SEARCH_MAX_CONTENT', '60000'))
+
+# bm25 欄位權重：title, summary, content
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+# 中日韓文字（各自成為一個 token）
+_CJK_RANGE = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_CJK_CHAR = re.compile(f'([{_CJK_RANGE}])')
+# 顯示時移除中日韓文字與全形標點之間多出的空白
+_CJK_DISPLAY_RANGE = _CJK_RANGE + '\u3000-\u303f\uff00-\uffef'
+_CJK_GAP = re.compile(f'(?<=[{_CJK_DISPLAY_RANGE}]) +(?=[{_CJK_DISPLAY_RANGE}])')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_docs (
+    id INTEGER PRIMARY KEY,
+    note_key TEXT UNIQUE,
+    title TEXT,
+    note_type TEXT,
+    url TEXT,
+    page_url TEXT,
+    created_at REAL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(title, summary, content, tokenize='unicode61');
+"""
+
+
+def segment(text):
+    """在中日韓字元兩側加入空白，讓 tokenizer 以單字切分"""
+    return _CJK_CHAR.sub(r' \1 ', text or '')
+
+
+def unsegment(text):
+    """移除 segment() 加入的空白（用於顯示 snippet）"""
+    return _CJK_GAP.sub('', re.sub(r' {2,}', ' ', text))
+
+
+def build_match_query(query):
+    """每個關鍵字轉成一個 phrase（中文字逐字相鄰），多個關鍵字以 AND 組合"""
+    phrases = []
+    for term in query.split():
+        tokens = re.findall(r'\w+', segment(term))
+        if tokens:
+            phrases.append('"' + ' '.join(tokens) + '"')
+    return ' '.join(phrases)
+
+
+class NoteSearch:
+    """筆記全文索引；search_docs 存放中繼資料，search_fts 以相同 rowid 存放可搜尋的文字"""
+
+    def __init__(self, path=NOTE_SEARCH_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._optimize_lock = threading.Lock()  # 同時只跑一個 optimize
+        self._conn = None
+        self.writes_since_merge = 0
+        self.writes_since_optimize = 0
+        self.searches = 0
+        self.optimized = 0
+        self.last_optimize_ms = None
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def add(self, note_key, title, summary, content, note_type, url=None, page_url=None):
+        """新增或更新一筆筆記（相同 note_key 會覆蓋）"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT id, page_url FROM search_docs WHERE note_key = ?", (note_key,)).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM search_fts WHERE rowid = ?", (row['id'],))
+                    conn.execute(
+                        "UPDATE search_docs SET title = ?, note_type = ?, url = ?, page_url = ?, created_at = ? "
+                        "WHERE id = ?",
+                        (title, note_type, url, page_url or row['page_url'], time.time(), row['id']),
+                    )
+                    doc_id = row['id']
+                else:
+                    doc_id = conn.execute(
+                        "INSERT INTO search_docs (note_key, title, note_type, url, page_url, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (note_key, title, note_type, url, page_url, time.time()),
+                    ).lastrowid
+                conn.execute(
+                    "INSERT INTO search_fts (rowid, title, summary, content) VALUES (?, ?, ?, ?)",
+                    (doc_id, segment(title), segment(summary), segment((content or '')[:NOTE_SEARCH_MAX_CONTENT])),
+                )
+                self.writes_since_merge += 1
+                self.writes_since_optimize += 1
+                if self.writes_since_merge >= NOTE_SEARCH_MERGE_EVERY:
+                    # 增量合併：每次只處理有限頁數，不會長時間鎖住索引
+                    conn.execute("INSERT INTO search_fts (search_fts, rank) VALUES ('merge', ?)",
+                                 (NOTE_SEARCH_MERGE_PAGES,))
+                    self.writes_since_merge = 0
+                conn.commit()
+                optimize_due = 0 < NOTE_SEARCH_OPTIMIZE_EVERY <= self.writes_since_optimize
+        except sqlite3.Error as e:
+            logger.error(f"寫入搜尋索引失敗: {e}")
+            return
+        if optimize_due and not self._optimize_lock.locked():
+            threading.Thread(target=self.optimize, kwargs={"wait": False}, name="note-search-optimize",
+                             daemon=True).start()
+
+    def set_page_url(self, note_key, page_url):
+        """Notion 頁面建立後補上連結"""
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("UPDATE search_docs SET page_url = ? WHERE note_key = ?", (page_url, note_key))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"更新搜尋索引失敗: {e}")
+
+    def search(self, query, limit=5):
+        """依關鍵字搜尋，回傳 [{title, note_type, url, page_url, snippet, created_at}]"""
+        match = build_match_query(query)
+        if not match:
+            return []
+
+        sql = (
+            "SELECT d.title AS title, snippet(search_fts, -1, '【', '】', '…', 24) AS snippet, "
+            "d.note_type AS note_type, d.url AS url, d.page_url AS page_url, d.created_at AS created_at "
+            "FROM search_fts JOIN search_docs AS d ON d.id = search_fts.rowid "
+            "WHERE search_fts MATCH ? ORDER BY bm25(search_fts, {}, {}, {}) LIMIT ?".format(*BM25_WEIGHTS)
+        )
+        try:
+            with self._lock:
+                rows = self._connect().execute(sql, (match, limit)).fetchall()
+                self.searches += 1
+        except sqlite3.Error as e:
+            logger.error(f"搜尋筆記失敗: {e}")
+            return []
+        results = []
+        for row in rows:
+            hit = dict(row)
+            hit['snippet'] = unsegment(hit['snippet'])
+            results.append(hit)
+        return results
+
+    def optimize(self, wait=True):
+        """
+        完整合併所有 segment（每 NOTE_SEARCH_OPTIMIZE_EVERY 筆寫入在背景執行，也可由管理端點觸發）
+        使用獨立連線且不持有 self._lock：WAL 模式下查詢照常進行，寫入只在 SQLite 層等待寫鎖
+        wait=False 時若已有 optimize 在執行就直接略過
+        """
+        if not self._optimize_lock.acquire(blocking=wait):
+            return True
+        try:
+            with self._lock:
+                self._connect()  # 確保資料表已建立
+                writes = self.writes_since_optimize
+            start = time.perf_counter()
+            conn = sqlite3.connect(self.path, timeout=60)
+            try:
+                conn.execute("INSERT INTO search_fts (search_fts) VALUES ('optimize')")
+                conn.commit()
+            finally:
+                conn.close()
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+            with self._lock:
+                # 壓縮期間新寫入的筆數留到下一次
+                self.writes_since_optimize = max(0, self.writes_since_optimize - writes)
+                self.optimized += 1
+                self.last_optimize_ms = elapsed_ms
+            logger.info(f"搜尋索引已完整壓縮 ({elapsed_ms} ms)")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"壓縮搜尋索引失敗: {e}")
+            return False
+        finally:
+            self._optimize_lock.release()
+
+    def get_stats(self):
+        try:
+            with self._lock:
+                count = self._connect().execute("SELECT COUNT(*) FROM search_docs").fetchone()[0]
+        except sqlite3.Error:
+            count = None
+        return {
+            "documents": count,
+            "searches": self.searches,
+            "writes_since_optimize": self.writes_since_optimize,
+            "optimized": self.optimized,
+            "last_optimize_ms": self.last_optimize_ms,
+        }
+
+
+note_search = NoteSearch()
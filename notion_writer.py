@@ -0,0 +1,470 @@
+"""
+Notion 非同步寫入佇列 (write-behind)
+使用者請求只負責把寫入工作排入佇列並立即回覆，背景執行緒再以 token bucket
+控制在 Notion 約 3 req/s 的限制內送出；429 / 5xx / 連線錯誤以指數退避重試，
+尚未完成的工作會寫入磁碟，重新啟動後繼續送出。
+建立頁面與附加 blocks 重送會重複寫入：只有 429 或連線未建立時直接重送，
+5xx / 讀取逾時等結果不明的情況，重送前先查詢頁面或內文是否已寫入。
+大型頁面分兩階段寫入：先建立只含屬性與摘要的頁面，內文再以 followups 依序分批附加
+"""
+import os
+import json
+import heapq
+import uuid
+import tempfile
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+import requests
+import urllib3
+
+from http_client import http
+from metrics import observe_stage
+from rate_limiter import TokenBucket
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+NOTION_API_URL = os.getenv('NOTION_API_URL', "https://api.notion.com/v1")
+NOTION_VERSION = "2022-06-28"
+
+NOTION_RATE_PER_SEC = float(os.getenv('NOTION_RATE_PER_SEC', '3'))
+NOTION_MAX_ATTEMPTS = int(os.getenv('NOTION_MAX_ATTEMPTS', '8'))
+NOTION_BACKOFF_BASE = float(os.getenv('NOTION_BACKOFF_BASE', '1'))
+NOTION_BACKOFF_MAX = float(os.getenv('NOTION_BACKOFF_MAX', '60'))
+# 保留最近完成的工作結果，供晚一步訂閱的用戶查詢
+FINISHED_HISTORY_SIZE = 1000
+# 每次附加的 block 數（Notion 上限 100 個 / 請求、500KB / 請求）
+NOTION_APPEND_BATCH_SIZE = int(os.getenv('NOTION_APPEND_BATCH_SIZE', '50'))
+# 結果不明的建立頁面工作，以此誤差範圍比對 created_time（Notion 的 created_time 只到分鐘）
+NOTION_CREATED_TIME_SLACK = 120
+NOTION_QUEUE_FILE = os.getenv('NOTION_QUEUE_FILE', os.path.join(tempfile.gettempdir(), 'notion_queue.json'))
+
+
+def is_notion_configured():
+    return bool(os.getenv('NOTION_TOKEN') and os.getenv('NOTION_DATABASE_ID'))
+
+
+def notion_headers():
+    return {
+        "Authorization": "Bearer " + os.getenv('NOTION_TOKEN', ''),
+        "Content-Type": "application/json",
+        "Notion-Version": NOTION_VERSION,
+    }
+
+
+class NotionJob:
+    """一次 Notion API 寫入"""
+
+    def __init__(self, method, path, payload, label, user_ids=None, job_id=None, attempts=0, followups=None,
+                 meta=None, trace=None, unconfirmed_since=None, root_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.root_id = root_id or self.id  # 整串寫入（建立頁面 + followups）第一筆工作的 id，即 submit 回傳的 id
+        self.method = method
+        self.path = path
+        self.payload = payload
+        self.label = label
+        self.user_ids = list(user_ids or [])  # 完成後要通知的用戶
+        self.attempts = attempts
+        # 成功後依序執行的後續寫入 [(method, path, payload)]，path 中的 {page_id} 會代入建立的頁面 id
+        self.followups = [tuple(item) for item in (followups or [])]
+        self.meta = meta or {}  # 呼叫端自訂資料，完成時原樣交給 listeners
+        self.trace = trace  # 排入時的追蹤資訊（tracer.context()），重試與重新啟動後仍接在同一個 trace
+        self.unconfirmed_since = unconfirmed_since  # 第一次結果不明的送出時間（epoch 秒），重送前需先確認
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "payload": self.payload,
+            "label": self.label,
+            "user_ids": self.user_ids,
+            "attempts": self.attempts,
+            "followups": self.followups,
+            "meta": self.meta,
+            "trace": self.trace,
+            "unconfirmed_since": self.unconfirmed_since,
+            "root_id": self.root_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["method"], data["path"], data["payload"], data.get("label", ""),
+                   data.get("user_ids"), data["id"], data.get("attempts", 0), data.get("followups"),
+                   data.get("meta"), data.get("trace"), data.get("unconfirmed_since"),
+                   data.get("root_id"))
+
+
+class NotionWriter:
+    """單一背景執行緒依序送出 Notion 寫入，並在同一用戶的工作全部完成後彙整通知"""
+
+    def __init__(self, store_path=NOTION_QUEUE_FILE, rate_per_sec=NOTION_RATE_PER_SEC):
+        self.store_path = store_path
+        self._bucket = TokenBucket(rate_per_sec, rate_per_sec)
+        self._cond = threading.Condition()
+        self._heap = []  # (預定送出時間, 序號, job)
+        self._seq = 0
+        self._jobs = {}
+        self._finished = OrderedDict()  # root id -> 整串寫入是否成功
+        self._results = {}  # user_id -> [(label, ok)]，等該用戶沒有待送工作時一起通知
+        self._notifier = None
+        self._listeners = []
+        self._thread = None
+        self._persist_lock = threading.Lock()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def set_notifier(self, notifier):
+        """notifier(user_id, results) 會在該用戶的寫入全部完成後被呼叫，results 為 [(label, ok)]"""
+        self._notifier = notifier
+
+    def add_listener(self, listener):
+        """listener(job, ok, data) 會在每筆工作完成時被呼叫，data 為 Notion 回應內容（失敗時為 None）"""
+        self._listeners.append(listener)
+
+    def start(self):
+        """載入上次未完成的工作並啟動背景執行緒（可重複呼叫）"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            for job in self._load():
+                self._jobs[job.id] = job
+                self._schedule(job, 0)
+            if self._jobs:
+                logger.info(f"恢復 {len(self._jobs)} 筆未完成的 Notion 寫入")
+            self._thread = threading.Thread(target=self._run, name="notion-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, method, path, payload, label, user_id=None, followups=None, meta=None):
+        """
+        排入一筆寫入工作，回傳 job id
+        followups 會在此工作成功後逐一排入（前一筆成功才送下一筆，確保附加順序）
+        """
+        job = NotionJob(method, path, payload, label, [user_id] if user_id else None, followups=followups, meta=meta,
+                        trace=tracer.context())
+        with self._cond:
+            self._jobs[job.id] = job
+            self._schedule(job, 0)
+            self._cond.notify()
+        self._persist()
+        self.start()
+        return job.id
+
+    def subscribe(self, job_id, user_id):
+        """
+        讓用戶在工作完成時收到通知（多位用戶共用同一筆寫入時各自訂閱）
+        job_id 為 submit 回傳的 id，狀態以整串寫入（含 followups）為準：
+        回傳 'pending'（已訂閱）、'sent'、'failed'，查無此工作時回傳 None
+        """
+        with self._cond:
+            job = self._jobs.get(job_id) or next(
+                (other for other in self._jobs.values() if other.root_id == job_id), None)
+            if job is not None:
+                if user_id not in job.user_ids:
+                    job.user_ids.append(user_id)
+                return 'pending'
+            if job_id in self._finished:
+                return 'sent' if self._finished[job_id] else 'failed'
+            return None
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._jobs),
+                "sent": self.sent,
+                "retried": self.retried,
+                "failed": self.failed,
+            }
+
+    # --- 背景執行緒 ---
+
+    def _schedule(self, job, delay):
+        self._seq += 1
+        heapq.heappush(self._heap, (time.monotonic() + delay, self._seq, job))
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if self._heap:
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        return heapq.heappop(self._heap)[2]
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            # 控制送出速率（只有這個執行緒使用 bucket）
+            wait = self._bucket.wait_time(1, time.monotonic())
+            if wait > 0:
+                time.sleep(wait)
+            self._bucket.consume(1, time.monotonic())
+            with tracer.resume(job.trace):
+                try:
+                    self._send(job)
+                except Exception as e:
+                    logger.error(f"Notion 寫入發生未預期錯誤: {e}")
+                    self._finish(job, False)
+
+    def _send(self, job):
+        if job.unconfirmed_since is not None:
+            # 上一次送出結果不明，先確認是否其實已經寫入
+            try:
+                applied = self._find_applied(job)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.warning(f"無法確認 Notion 寫入結果，稍後重試 ({job.label[:30]}): {e}")
+                self._retry(job)
+                return
+            if applied is not None:
+                logger.info(f"Notion 寫入先前已完成，不再重送 ({job.method} {job.path[:40]})：{job.label[:30]}")
+                self._finish(job, True, applied)
+                return
+
+        sent_at = time.time()
+        start = time.perf_counter()
+        try:
+            response = http.request(job.method, NOTION_API_URL + job.path, headers=notion_headers(),
+                                    json=job.payload, retry=False, timeout=30)
+        except requests.exceptions.RequestException as e:
+            observe_stage('notion_api', 'notion', time.perf_counter() - start, ok=False,
+                          method=job.method, attempt=job.attempts + 1)
+            if _is_idempotent(job) or _never_sent(e):
+                logger.warning(f"Notion 連線錯誤，稍後重試 ({job.label[:30]}): {e}")
+                self._retry(job)
+            else:
+                self._retry_unconfirmed(job, sent_at, f"連線錯誤: {e}")
+            return
+        observe_stage('notion_api', 'notion', time.perf_counter() - start, ok=response.status_code == 200,
+                      method=job.method, attempt=job.attempts + 1, status_code=response.status_code)
+
+        if response.status_code == 200:
+            logger.info(f"Notion 寫入成功 ({job.method} {job.path[:40]})：{job.label[:30]}")
+            self._finish(job, True, _json_or_empty(response))
+        elif response.status_code == 429 or response.status_code >= 500:
+            retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+            if response.status_code == 429 and retry_after:
+                self._bucket.block_for(retry_after)
+            if response.status_code == 429 or _is_idempotent(job):
+                logger.warning(f"Notion 暫時無法寫入 (狀態碼: {response.status_code})，稍後重試: {job.label[:30]}")
+                self._retry(job, retry_after)
+            else:
+                self._retry_unconfirmed(job, sent_at, f"狀態碼: {response.status_code}", retry_after)
+        else:
+            logger.error(f"Notion 儲存失敗 (狀態碼: {response.status_code}): {response.text}")
+            self._finish(job, False)
+
+    def _retry(self, job, retry_after=None):
+        job.attempts += 1
+        if job.attempts >= NOTION_MAX_ATTEMPTS:
+            logger.error(f"Notion 寫入重試 {job.attempts} 次仍失敗，放棄: {job.label[:30]}")
+            self._finish(job, False)
+            return
+        delay = min(NOTION_BACKOFF_MAX, NOTION_BACKOFF_BASE * (2 ** (job.attempts - 1)))
+        if retry_after:
+            delay = max(delay, retry_after)
+        with self._cond:
+            self.retried += 1
+            self._schedule(job, delay)
+        self._persist()
+
+    def _retry_unconfirmed(self, job, sent_at, reason, retry_after=None):
+        """非冪等工作送出後結果不明：能查證的工作標記後重試（重送前先確認），其餘直接放棄以免重複寫入"""
+        if not _can_verify(job):
+            logger.error(f"Notion 寫入結果不明 ({reason})，為避免重複寫入不再重送: {job.label[:30]}")
+            self._finish(job, False)
+            return
+        if job.unconfirmed_since is None:
+            job.unconfirmed_since = sent_at
+        logger.warning(f"Notion 寫入結果不明 ({reason})，重送前會先確認是否已寫入: {job.label[:30]}")
+        self._retry(job, retry_after)
+
+    def _find_applied(self, job):
+        """查詢結果不明的工作是否已經寫入，已寫入時回傳對應的 Notion 資料，否則回傳 None"""
+        if job.path.endswith('/children'):
+            return self._find_appended_children(job)
+        return self._find_created_page(job)
+
+    def _find_created_page(self, job):
+        """在資料庫中以 URL（沒有時以標題）查詢送出後才建立的頁面"""
+        database_id = job.payload['parent']['database_id']
+        response = http.request('POST', f"{NOTION_API_URL}/databases/{database_id}/query", headers=notion_headers(),
+                                json={"filter": _page_filter(job.payload.get('properties', {})),
+                                      "sorts": [{"timestamp": "created_time", "direction": "descending"}],
+                                      "page_size": 10},
+                                retry=False, timeout=30)
+        response.raise_for_status()
+        since = job.unconfirmed_since - NOTION_CREATED_TIME_SLACK
+        for page in response.json().get('results', []):
+            if _parse_time(page.get('created_time')) >= since:
+                return page
+        return None
+
+    def _find_appended_children(self, job):
+        """讀取目前的內文，最後幾個 block 與這次要附加的內容相同即視為已附加"""
+        expected = [_block_signature(block) for block in job.payload.get('children', [])]
+        if not expected:
+            return None
+        blocks = []
+        params = {"page_size": 100}
+        while True:
+            response = http.request('GET', NOTION_API_URL + job.path, headers=notion_headers(), params=params,
+                                    retry=False, timeout=30)
+            response.raise_for_status()
+            data = response.json()
+            blocks.extend(data.get('results', []))
+            if not data.get('has_more') or not data.get('next_cursor'):
+                break
+            params = {"page_size": 100, "start_cursor": data['next_cursor']}
+        tail = blocks[-len(expected):]
+        if [_block_signature(block) for block in tail] == expected:
+            return {"object": "list", "results": tail}
+        return None
+
+    def _finish(self, job, ok, data=None):
+        notify = {}
+        with self._cond:
+            self._jobs.pop(job.id, None)
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            chained = ok and job.followups and self._chain(job, (data or {}).get('id'))
+            # 整串寫入完成（或中途失敗）才記錄結果，該用戶沒有其他待送工作時合併通知
+            if not chained:
+                # 後續內容無法排入時整串視為失敗
+                chain_ok = ok and not job.followups
+                self._finished[job.root_id] = chain_ok
+                while len(self._finished) > FINISHED_HISTORY_SIZE:
+                    self._finished.popitem(last=False)
+                for user_id in job.user_ids:
+                    self._results.setdefault(user_id, []).append((job.label, chain_ok))
+                    if not any(user_id in other.user_ids for other in self._jobs.values()):
+                        notify[user_id] = self._results.pop(user_id)
+        self._persist()
+
+        for listener in self._listeners:
+            try:
+                listener(job, ok, data)
+            except Exception as e:
+                logger.error(f"Notion 寫入完成事件處理失敗: {e}")
+
+        if self._notifier:
+            for user_id, results in notify.items():
+                try:
+                    self._notifier(user_id, results)
+                except Exception as e:
+                    logger.error(f"Notion 同步結果通知失敗: {e}")
+
+    def _chain(self, job, page_id):
+        """排入 job 的下一筆後續寫入（需持有 self._cond）"""
+        followups = job.followups
+        if any('{page_id}' in path for _, path, _ in followups):
+            if not page_id:
+                logger.error(f"Notion 回應缺少頁面 id，無法附加後續內容：{job.label[:30]}")
+                return False
+            followups = [(method, path.replace('{page_id}', page_id), payload)
+                         for method, path, payload in followups]
+        method, path, payload = followups[0]
+        next_job = NotionJob(method, path, payload, job.label, job.user_ids, followups=followups[1:], trace=job.trace,
+                             root_id=job.root_id)
+        self._jobs[next_job.id] = next_job
+        self._schedule(next_job, 0)
+        return True
+
+    # --- 持久化 ---
+
+    def _persist(self):
+        with self._cond:
+            jobs = [job.to_dict() for job in self._jobs.values()]
+        with self._persist_lock:
+            try:
+                tmp_path = self.store_path + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(jobs, f, ensure_ascii=False)
+                os.replace(tmp_path, self.store_path)
+            except OSError as e:
+                logger.warning(f"無法寫入 Notion 佇列檔案: {e}")
+
+    def _load(self):
+        try:
+            with open(self.store_path, encoding='utf-8') as f:
+                return [NotionJob.from_dict(data) for data in json.load(f)]
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"無法讀取 Notion 佇列檔案: {e}")
+            return []
+
+
+def _json_or_empty(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+
+def _is_idempotent(job):
+    """重送不會重複寫入的工作（更新頁面屬性、封存）；建立頁面與附加 blocks 都不是"""
+    return job.method in ('GET', 'PATCH') and not job.path.endswith('/children')
+
+
+def _never_sent(error):
+    """連線建立階段就失敗（連線逾時、連線被拒），請求一定沒有送到 Notion"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], 'reason', None), urllib3.exceptions.NewConnectionError)
+    return False
+
+
+def _can_verify(job):
+    """結果不明時能否查證：附加 blocks，或建立在資料庫中、帶有 URL 或標題的頁面"""
+    if job.path.endswith('/children'):
+        return True
+    return (job.method == 'POST' and job.path == '/pages'
+            and bool(job.payload.get('parent', {}).get('database_id'))
+            and _page_filter(job.payload.get('properties', {})) is not None)
+
+
+def _page_filter(properties):
+    """以頁面的 URL 屬性（沒有時以標題）組成資料庫查詢條件"""
+    for name, value in properties.items():
+        if value.get('url'):
+            return {"property": name, "url": {"equals": value['url']}}
+    for name, value in properties.items():
+        if 'title' in value:
+            return {"property": name, "title": {"equals": _plain_text(value['title'])}}
+    return None
+
+
+def _plain_text(rich_text):
+    return ''.join((item.get('text') or {}).get('content', item.get('plain_text', '')) for item in rich_text)
+
+
+def _block_signature(block):
+    block_type = block.get('type')
+    return block_type, _plain_text((block.get(block_type) or {}).get('rich_text', []))
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return 0
+
+
+def _parse_retry_after(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+notion_writer = NotionWriter()
@@ -0,0 +1,228 @@
+"""
+網址內容快取
+以正規化後的網址為 key 快取爬取結果（標題、內文、ETag、Last-Modified），
+TTL 過期後以條件式 GET 重新驗證，同一篇文章被多人分享時只需爬取一次
+"""
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from http_client import http
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', '3600'))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv('PAGE_CACHE_MAX_ENTRIES', '500'))
+
+# 追蹤用參數（完全比對，所有網域）
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'igsh', 'mibextid', 'xmt',
+    'mc_cid', 'mc_eid', 'ref_src', 'ref_url',
+}
+# 追蹤用參數（前綴比對）
+TRACKING_PREFIXES = ('utm_', '__tn__', '__cft__', 'hc_', 'ga_')
+# 只在特定網域（含子網域）才是追蹤用的參數；其他網站可能有實際用途（例如 GitHub 的 ?ref=<branch>）
+HOST_TRACKING_PARAMS = {
+    'youtube.com': {'si', 'feature'},
+    'youtu.be': {'si', 'feature'},
+    'spotify.com': {'si'},
+    'facebook.com': {'ref', 'sfnsn'},
+    'threads.com': {'ref'},
+    'instagram.com': {'ref'},
+    'taobao.com': {'spm'},
+    'tmall.com': {'spm'},
+    'aliexpress.com': {'spm'},
+    'mp.weixin.qq.com': {'from', 'isappinstalled'},
+    'xiaohongshu.com': {'share_id', 'xhsshare'},
+}
+
+# 同一服務的別名網域
+HOST_ALIASES = {
+    'threads.net': 'www.threads.com',
+    'www.threads.net': 'www.threads.com',
+    'threads.com': 'www.threads.com',
+    'facebook.com': 'www.facebook.com',
+    'm.facebook.com': 'www.facebook.com',
+    'mbasic.facebook.com': 'www.facebook.com',
+    'web.facebook.com': 'www.facebook.com',
+    'fb.com': 'www.facebook.com',
+    'www.fb.com': 'www.facebook.com',
+}
+
+# 需要追蹤轉址才能得到真正網址的短網址服務
+SHORT_URL_HOSTS = {'fb.watch', 'www.fb.watch'}
+
+_short_url_lock = threading.Lock()
+_short_url_targets = {}
+
+
+def _host_tracking_params(host):
+    params = set()
+    for domain, names in HOST_TRACKING_PARAMS.items():
+        if host == domain or host.endswith('.' + domain):
+            params |= names
+    return params
+
+
+def _strip_tracking(query, host=''):
+    host_params = _host_tracking_params(host)
+    params = []
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        lowered = key.lower()
+        if lowered in TRACKING_PARAMS or lowered in host_params or lowered.startswith(TRACKING_PREFIXES):
+            continue
+        params.append((key, value))
+    return urlencode(sorted(params))
+
+
+def resolve_short_url(url):
+    """追蹤 fb.watch 等短網址的轉址目標（結果會記住，每個短網址只查一次）"""
+    with _short_url_lock:
+        if url in _short_url_targets:
+            return _short_url_targets[url]
+
+    target = url
+    try:
+        response = http.request('HEAD', url, allow_redirects=False, timeout=5)
+        location = response.headers.get('Location')
+        if response.status_code in (301, 302, 303, 307, 308) and location:
+            target = location
+    except Exception as e:
+        logger.warning(f"短網址解析失敗: {url} ({e})")
+        return url
+
+    with _short_url_lock:
+        _short_url_targets[url] = target
+    return target
+
+
+def canonicalize_url(url, resolve_short=True):
+    """
+    正規化網址：
+    - scheme/網域轉小寫，移除預設 port 與 fragment
+    - 移除 utm_*、fbclid 等追蹤參數（si、ref 等只在已知網域移除），其餘參數排序
+    - 統一 threads.net/threads.com、m.facebook.com/fb.com 等別名，fb.watch 追蹤轉址
+    """
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or 'https').lower()
+    host = (parts.hostname or '').lower()
+
+    if resolve_short and host in SHORT_URL_HOSTS:
+        target = resolve_short_url(url.strip())
+        if target != url.strip():
+            return canonicalize_url(target, resolve_short=False)
+
+    host = HOST_ALIASES.get(host, host)
+    query = _strip_tracking(parts.query, host)
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+class CachedPage:
+    """快取的網頁內容與驗證資訊"""
+
+    def __init__(self, title, content, etag=None, last_modified=None):
+        self.title = title
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.time()
+
+    def is_fresh(self, ttl=PAGE_CACHE_TTL):
+        return time.time() - self.fetched_at < ttl
+
+    def has_validators(self):
+        return bool(self.etag or self.last_modified)
+
+
+class PageCache:
+    """執行緒安全的 LRU 網頁快取"""
+
+    def __init__(self, max_entries=PAGE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+            }
+
+    def fetch(self, url, fetcher, validates=False):
+        """
+        透過快取取得網址內容
+        正規化網址只作為快取 key，實際爬取仍使用用戶傳來的網址（部分參數對特定網站有意義）
+        fetcher 需回傳 (title, content, url)；validates=False 時以 fetcher(url) 呼叫，過期後直接重新爬取
+        validates=True 時以 fetcher(url, meta) 呼叫，fetcher 可將 etag / last_modified 寫入 meta，
+        快取過期但有驗證資訊時，meta 會帶 if_none_match / if_modified_since，由 fetcher 以平常的 headers
+        送出條件式請求：304 時設定 meta['not_modified'] 並沿用快取，200 時直接回傳新內容（不必再下載一次）
+        回傳 (title, content, canonical_url)
+        """
+        key = canonicalize_url(url)
+        entry = self.get(key)
+
+        meta = {}
+        if entry is not None:
+            if entry.is_fresh():
+                with self._lock:
+                    self.hits += 1
+                logger.info(f"網頁快取命中: {key[:80]}")
+                return entry.title, entry.content, key
+            if entry.has_validators():
+                meta['if_none_match'] = entry.etag
+                meta['if_modified_since'] = entry.last_modified
+
+        if validates:
+            title, content, _ = fetcher(url.strip(), meta)
+        else:
+            title, content, _ = fetcher(url.strip())
+        if entry is not None and meta.get('not_modified'):
+            entry.fetched_at = time.time()
+            with self._lock:
+                self.hits += 1
+                self.revalidated += 1
+            logger.info(f"網頁快取重新驗證成功 (304): {key[:80]}")
+            return entry.title, entry.content, key
+
+        with self._lock:
+            self.misses += 1
+        if title and content:
+            self.put(key, CachedPage(title, content, meta.get('etag'), meta.get('last_modified')))
+        return title, content, key
+
+
+page_cache = PageCache()
@@ -0,0 +1,115 @@
+"""
+LINE 用戶資料快取
+顯示名稱只在 /end 寫入 Sheets 等少數地方需要，查詢時才向 LINE 取得並快取 PROFILE_CACHE_TTL 秒；
+取得失敗（用戶封鎖、已刪除帳號或 API 錯誤）也會快取 PROFILE_NEGATIVE_TTL 秒，避免反覆呼叫 API
+"""
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', '86400'))
+PROFILE_NEGATIVE_TTL = int(os.getenv('PROFILE_NEGATIVE_TTL', '300'))
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv('PROFILE_CACHE_MAX_ENTRIES', '10000'))
+# 預熱時同時查詢的數量
+PROFILE_PREWARM_WORKERS = int(os.getenv('PROFILE_PREWARM_WORKERS', '4'))
+
+
+class ProfileCache:
+    """user_id → 顯示名稱（None 表示查詢失敗）的 LRU + TTL 快取"""
+
+    def __init__(self, ttl=PROFILE_CACHE_TTL, negative_ttl=PROFILE_NEGATIVE_TTL,
+                 max_entries=PROFILE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._fetcher = None
+        self._entries = OrderedDict()  # user_id -> (到期時間, 顯示名稱或 None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def set_fetcher(self, fetcher):
+        """設定查詢函式 fetcher(user_id) -> 顯示名稱（失敗時拋出例外）"""
+        self._fetcher = fetcher
+
+    def _lookup(self, user_id, now):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return False, None
+        if entry[0] <= now:
+            del self._entries[user_id]
+            return False, None
+        self._entries.move_to_end(user_id)
+        return True, entry[1]
+
+    def _store(self, user_id, name, now):
+        expires_at = now + (self.ttl if name is not None else self.negative_ttl)
+        self._entries[user_id] = (expires_at, name)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _fetch(self, user_id):
+        if self._fetcher is None:
+            return None
+        try:
+            return self._fetcher(user_id)
+        except Exception as e:
+            logger.warning(f"無法取得用戶 {user_id} 的顯示名稱: {e}")
+            with self._lock:
+                self.errors += 1
+            return None
+
+    def get(self, user_id):
+        """取得顯示名稱，快取未命中時才查詢；查詢失敗回傳 None"""
+        now = time.monotonic()
+        with self._lock:
+            found, name = self._lookup(user_id, now)
+            if found:
+                self.hits += 1
+                return name
+            self.misses += 1
+
+        name = self._fetch(user_id)
+        with self._lock:
+            self._store(user_id, name, time.monotonic())
+        return name
+
+    def prewarm(self, user_ids):
+        """批次預先查詢尚未快取的用戶（例如啟動時恢復的會議用戶），回傳實際查詢的數量"""
+        now = time.monotonic()
+        with self._lock:
+            pending = [user_id for user_id in dict.fromkeys(user_ids) if not self._lookup(user_id, now)[0]]
+        if not pending or self._fetcher is None:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=PROFILE_PREWARM_WORKERS) as executor:
+            names = list(executor.map(self._fetch, pending))
+        with self._lock:
+            now = time.monotonic()
+            for user_id, name in zip(pending, names):
+                self._store(user_id, name, now)
+        logger.info(f"預先載入 {len(pending)} 位用戶的顯示名稱")
+        return len(pending)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+            }
+
+
+profile_cache = ProfileCache()
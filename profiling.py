@@ -0,0 +1,241 @@
+"""
+按需效能剖析
+依抽樣比例以 cProfile 剖析 LINE 事件處理器，每次抽樣寫出 .prof 與前幾名的文字摘要，
+並累加成各處理器的彙總 profile；開啟 tracemalloc 時另外記錄該事件前後的記憶體配置差異，
+也可隨時取得目前配置最多記憶體的程式位置（音檔 buffer、base64 字串、HTML 解析樹等）
+預設關閉，由環境變數或 /admin/profiling 端點切換，輸出寫到 PROFILING_DIR
+"""
+import os
+import io
+import time
+import random
+import pstats
+import cProfile
+import functools
+import tempfile
+import threading
+import tracemalloc
+import logging
+from datetime import datetime
+
+from handler_args import call_with_own_args
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+# 抽樣比例（0 ~ 1），例如 0.05 表示剖析 5% 的事件
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0.05'))
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'profiles'))
+# 每個處理器保留的抽樣檔數與文字摘要列出的函式數
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', '50'))
+PROFILING_TOP = int(os.getenv('PROFILING_TOP', '30'))
+# tracemalloc 會讓配置記憶體變慢並多佔記憶體，需另外開啟；FRAMES 為每筆配置保留的呼叫層數
+PROFILING_TRACEMALLOC = os.getenv('PROFILING_TRACEMALLOC', 'false').lower() == 'true'
+PROFILING_TRACEMALLOC_FRAMES = int(os.getenv('PROFILING_TRACEMALLOC_FRAMES', '10'))
+
+# 統計記憶體配置時略過 tracemalloc、剖析資料本身（彙總 profile）與 import 機制
+_TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, pstats.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def _format_stats(stats, sort, limit):
+    buffer = io.StringIO()
+    stats.stream = buffer
+    stats.sort_stats(sort).print_stats(limit)
+    return buffer.getvalue()
+
+
+def _format_top(statistics, limit):
+    lines = []
+    for stat in statistics[:limit]:
+        frame = stat.traceback[0]
+        size_diff = getattr(stat, 'size_diff', None)
+        prefix = f"{size_diff / 1024:+.1f} KiB " if size_diff is not None else ""
+        lines.append(f"{prefix}{stat.size / 1024:.1f} KiB in {stat.count} blocks  {frame.filename}:{frame.lineno}")
+    return '\n'.join(lines)
+
+
+class Profiler:
+    """
+    同一時間只剖析一個事件（cProfile 在新版 Python 中全域只能啟用一個），
+    抽樣到的事件遇到另一個剖析進行中時直接略過
+    """
+
+    def __init__(self, output_dir=PROFILING_DIR, enabled=PROFILING_ENABLED, sample_rate=PROFILING_SAMPLE_RATE,
+                 trace_memory=PROFILING_TRACEMALLOC):
+        self.output_dir = output_dir
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+        self._aggregates = {}
+        self.sampled = 0
+        self.skipped_busy = 0
+        self.snapshots = 0
+        self.last_files = []
+        if trace_memory:
+            self.set_trace_memory(True)
+
+    @property
+    def trace_memory(self):
+        return tracemalloc.is_tracing()
+
+    def set_trace_memory(self, on):
+        if on and not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILING_TRACEMALLOC_FRAMES)
+            logger.info(f"tracemalloc 已開啟（{PROFILING_TRACEMALLOC_FRAMES} 層）")
+        elif not on and tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc 已關閉")
+
+    def configure(self, enabled=None, sample_rate=None, trace_memory=None):
+        """執行期間調整設定（/admin/profiling 使用）"""
+        with self._lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if sample_rate is not None:
+                self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if trace_memory is not None:
+            self.set_trace_memory(bool(trace_memory))
+        logger.info(f"效能剖析設定: enabled={self.enabled}, sample_rate={self.sample_rate}, "
+                    f"tracemalloc={self.trace_memory}")
+
+    def _handler_dir(self, name):
+        path = os.path.join(self.output_dir, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _prune(self, directory):
+        """每個處理器只保留最近 PROFILING_MAX_FILES 次抽樣"""
+        samples = sorted(f for f in os.listdir(directory) if f.endswith('.prof') and not f.startswith('aggregate'))
+        for name in samples[:-PROFILING_MAX_FILES] if PROFILING_MAX_FILES > 0 else []:
+            for path in (os.path.join(directory, name), os.path.join(directory, name[:-5] + '.txt')):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _write(self, name, profile, elapsed_ms, memory_diff):
+        directory = self._handler_dir(name)
+        stem = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{elapsed_ms:.0f}ms"
+        prof_path = os.path.join(directory, stem + '.prof')
+        profile.dump_stats(prof_path)
+
+        stats = pstats.Stats(profile)
+        report = [f"{name}：{elapsed_ms:.1f} ms", "", _format_stats(stats, 'cumulative', PROFILING_TOP)]
+        if memory_diff:
+            report += ["", "== 記憶體配置變化（依程式位置） ==", _format_top(memory_diff, PROFILING_TOP)]
+        with open(os.path.join(directory, stem + '.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(report))
+
+        with self._lock:
+            aggregate = self._aggregates.get(name)
+            if aggregate is None:
+                aggregate = self._aggregates[name] = pstats.Stats(profile)
+            else:
+                aggregate.add(profile)
+            aggregate.dump_stats(os.path.join(directory, 'aggregate.prof'))
+            self.last_files = ([prof_path] + self.last_files)[:20]
+        self._prune(directory)
+
+    def should_sample(self):
+        return self.enabled and self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def run(self, name, func, *args, **kwargs):
+        """抽樣到時以 cProfile（與 tracemalloc）執行 func，否則直接執行"""
+        if not self.should_sample():
+            return func(*args, **kwargs)
+        if not self._active.acquire(blocking=False):
+            with self._lock:
+                self.skipped_busy += 1
+            return func(*args, **kwargs)
+
+        try:
+            before = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                try:
+                    memory_diff = None
+                    if before is not None and tracemalloc.is_tracing():
+                        after = tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+                        memory_diff = after.compare_to(before.filter_traces(_TRACEMALLOC_FILTERS), 'lineno')
+                    self._write(name, profile, elapsed_ms, memory_diff)
+                    with self._lock:
+                        self.sampled += 1
+                except Exception as e:
+                    logger.error(f"寫入效能剖析結果失敗: {e}")
+        finally:
+            self._active.release()
+
+    def profiled(self, name):
+        """裝飾 LINE 事件處理器，依抽樣比例剖析"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return self.run(name, call_with_own_args, func, args, kwargs)
+            return wrapper
+        return decorator
+
+    def memory_snapshot(self, limit=PROFILING_TOP, group_by='lineno'):
+        """
+        取得目前配置最多記憶體的程式位置並寫入檔案（需先開啟 tracemalloc），
+        回傳 [{size_kib, count, location, traceback}]
+        """
+        if not tracemalloc.is_tracing():
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+        statistics = snapshot.statistics(group_by)
+        current, peak = tracemalloc.get_traced_memory()
+
+        directory = self._handler_dir('tracemalloc')
+        stem = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        snapshot.dump(os.path.join(directory, stem + '.snapshot'))
+        with open(os.path.join(directory, stem + '.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"目前 {current / 1024 / 1024:.1f} MiB，峰值 {peak / 1024 / 1024:.1f} MiB\n\n")
+            f.write(_format_top(statistics, limit))
+            for stat in statistics[:limit]:
+                f.write(f"\n\n{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+                f.write('\n'.join(stat.traceback.format()))
+        with self._lock:
+            self.snapshots += 1
+
+        return {
+            "current_mib": round(current / 1024 / 1024, 2),
+            "peak_mib": round(peak / 1024 / 1024, 2),
+            "file": os.path.join(directory, stem + '.txt'),
+            "top": [{
+                "size_kib": round(stat.size / 1024, 1),
+                "count": stat.count,
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "traceback": stat.traceback.format()[-6:],
+            } for stat in statistics[:limit]],
+        }
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "tracemalloc": self.trace_memory,
+                "output_dir": self.output_dir,
+                "sampled": self.sampled,
+                "skipped_busy": self.skipped_busy,
+                "snapshots": self.snapshots,
+                "handlers": sorted(self._aggregates),
+                "recent_files": list(self.last_files[:5]),
+            }
+
+
+profiler = Profiler()
@@ -0,0 +1,296 @@
+"""
+Groq / OpenAI 用戶端速率限制器
+以 provider + model 為單位維護 token bucket（請求數與 token 數各一個），
+根據回應的 x-ratelimit-* headers 自動校正，超出額度時排隊等待而不是直接失敗
+"""
+import os
+import re
+import threading
+import time
+import logging
+
+from metrics import metrics
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 預設額度（每分鐘），回應 headers 會再自動校正
+DEFAULT_LIMITS = {
+    'groq': (int(os.getenv('GROQ_RPM', '30')), int(os.getenv('GROQ_TPM', '6000'))),
+    'openai': (int(os.getenv('OPENAI_RPM', '500')), int(os.getenv('OPENAI_TPM', '200000'))),
+}
+
+# 圖片輸入粗估的 token 數（視覺模型依解析度計費，取保守值）
+IMAGE_TOKEN_ESTIMATE = 1500
+
+# 排隊最長等待秒數，超過則放棄並交由呼叫端走備援流程
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '30'))
+
+_DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+PROVIDER_CALL_SECONDS = metrics.histogram(
+    'linebot_provider_call_seconds', 'Groq / OpenAI API 呼叫耗時（秒，不含排隊）', ('provider', 'model', 'outcome'))
+RATE_LIMIT_WAIT_SECONDS = metrics.histogram(
+    'linebot_rate_limit_wait_seconds', '速率限制排隊等待時間（秒）', ('provider', 'model'))
+RATE_LIMITED_RETRIES = metrics.counter(
+    'linebot_rate_limited_retries_total', '觸發 429 後排隊重試的次數', ('provider', 'model'))
+
+
+class RateLimitTimeout(Exception):
+    """排隊等待超過上限"""
+
+
+def parse_reset_duration(value):
+    """解析 '6m0s'、'7.66s'、'20ms' 等格式，回傳秒數"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    matches = _DURATION_PATTERN.findall(value)
+    if not matches:
+        return None
+    return sum(float(number) * units[unit] for number, unit in matches)
+
+
+def estimate_tokens(text, max_tokens=0):
+    """粗估一次呼叫的 token 用量（中文約一字一 token）"""
+    return len(text or '') + max_tokens
+
+
+class TokenBucket:
+    """連續補充的 token bucket"""
+
+    def __init__(self, capacity, refill_per_sec):
+        self.base_capacity = float(capacity)
+        self.base_refill_per_sec = float(refill_per_sec)
+        self.capacity = float(capacity)
+        self.refill_per_sec = float(refill_per_sec)
+        self.level = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.level = min(self.capacity, self.level + elapsed * self.refill_per_sec)
+        self.updated_at = now
+
+    def wait_time(self, amount, now):
+        """取得 amount 需要等待的秒數"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        wait = max(0.0, self.blocked_until - now)
+        if self.level < amount and self.refill_per_sec > 0:
+            wait = max(wait, (amount - self.level) / self.refill_per_sec)
+        return wait
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        """實際用量與預估不同時校正（amount 可為負值）"""
+        self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, limit=None, remaining=None, reset_seconds=None):
+        """
+        依伺服器回報的額度校正 bucket
+        headers 的視窗可能是每分鐘或每日，因此只會收緊設定值，不會放寬
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if limit:
+            self.capacity = min(self.base_capacity, float(limit))
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+            if reset_seconds and limit and limit > remaining:
+                self.refill_per_sec = min(self.base_refill_per_sec, (limit - remaining) / reset_seconds)
+            else:
+                self.refill_per_sec = self.base_refill_per_sec
+            if remaining <= 0 and reset_seconds:
+                self.blocked_until = max(self.blocked_until, now + reset_seconds)
+
+    def block_for(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class ModelLimiter:
+    """單一 provider + model 的請求數與 token 數限制"""
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm, rpm / 60.0)
+        self.tokens = TokenBucket(tpm, tpm / 60.0)
+        self.queue_lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.waiting = 0
+        self.total_calls = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self, tokens=0, max_wait=RATE_LIMIT_MAX_WAIT):
+        """
+        取得一次呼叫額度，額度不足時排隊等待
+        持有 queue_lock 期間睡眠，後到的呼叫會依序排在後面
+        回傳實際等待秒數
+        """
+        start = time.monotonic()
+        with self.state_lock:
+            self.waiting += 1
+        try:
+            if not self.queue_lock.acquire(timeout=max_wait):
+                raise RateLimitTimeout(f"排隊等待超過 {max_wait} 秒")
+            try:
+                while True:
+                    with self.state_lock:
+                        now = time.monotonic()
+                        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                        if wait <= 0:
+                            self.requests.consume(1, now)
+                            self.tokens.consume(tokens, now)
+                            break
+                    if now + wait - start > max_wait:
+                        raise RateLimitTimeout(f"需等待 {wait:.1f} 秒，超過上限 {max_wait} 秒")
+                    time.sleep(wait)
+            finally:
+                self.queue_lock.release()
+        finally:
+            waited = time.monotonic() - start
+            with self.state_lock:
+                self.waiting -= 1
+                self.total_calls += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def update_from_headers(self, headers):
+        """依 x-ratelimit-* / retry-after headers 校正額度"""
+        if not headers:
+            return
+
+        def _int(name):
+            try:
+                return int(float(headers.get(name)))
+            except (TypeError, ValueError):
+                return None
+
+        with self.state_lock:
+            self.requests.sync(
+                limit=_int('x-ratelimit-limit-requests'),
+                remaining=_int('x-ratelimit-remaining-requests'),
+                reset_seconds=parse_reset_duration(headers.get('x-ratelimit-reset-requests')),
+            )
+            self.tokens.sync(
+                limit=_int('x-ratelimit-limit-tokens'),
+                remaining=_int('x-ratelimit-remaining-tokens'),
+                reset_seconds=parse_reset_duration(headers.get('x-ratelimit-reset-tokens')),
+            )
+            retry_after = parse_reset_duration(headers.get('retry-after'))
+            if retry_after:
+                self.requests.block_for(retry_after)
+
+    def token_capacity(self):
+        """目前 token bucket 的容量（會依回應 headers 收緊），單次呼叫的預估用量不應超過此值"""
+        with self.state_lock:
+            return self.tokens.capacity
+
+    def token_budget(self, seconds):
+        """目前可用的 token 數加上 seconds 秒內補充的量（估算一段時間內最多能送出多少內容）"""
+        with self.state_lock:
+            now = time.monotonic()
+            self.tokens._refill(now)
+            return self.tokens.level + self.tokens.refill_per_sec * seconds
+
+    def block_for(self, seconds):
+        """暫停發出請求（例如收到 429 時）"""
+        with self.state_lock:
+            self.requests.block_for(seconds)
+
+    def reconcile_tokens(self, estimated, actual):
+        """以實際 token 用量修正預估值"""
+        if actual is None:
+            return
+        with self.state_lock:
+            self.tokens.refund(estimated - actual)
+
+    def get_stats(self):
+        with self.state_lock:
+            return {
+                "queued": self.waiting,
+                "calls": self.total_calls,
+                "avg_wait_ms": round(self.total_wait / self.total_calls * 1000, 1) if self.total_calls else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level, 1),
+            }
+
+
+class RateLimiterRegistry:
+    """依 provider + model 管理 ModelLimiter"""
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, model):
+        key = (provider, model)
+        with self._lock:
+            if key not in self._limiters:
+                rpm, tpm = DEFAULT_LIMITS.get(provider, (60, 100000))
+                self._limiters[key] = ModelLimiter(rpm, tpm)
+            return self._limiters[key]
+
+    def get_stats(self):
+        with self._lock:
+            items = list(self._limiters.items())
+        return {f"{provider}/{model}": limiter.get_stats() for (provider, model), limiter in items}
+
+
+limiter_registry = RateLimiterRegistry()
+
+
+def call_with_rate_limit(provider, model, raw_call, estimated_tokens=0, max_retries=2, max_wait=RATE_LIMIT_MAX_WAIT):
+    """
+    在速率限制下執行 SDK 呼叫
+    raw_call 需回傳 SDK 的 with_raw_response 結果，以便讀取 rate-limit headers
+    遇到 429 時依 retry-after 排隊重試，而不是直接失敗
+    max_wait 為排隊等待上限，長文摘要等必須完成的呼叫可以放寬
+    """
+    limiter = limiter_registry.get(provider, model)
+
+    for attempt in range(max_retries + 1):
+        waited = limiter.acquire(estimated_tokens, max_wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(waited, provider=provider, model=model)
+        if waited > 0.05:
+            logger.info(f"{provider}/{model} 速率限制排隊 {waited * 1000:.0f} ms")
+
+        start = time.perf_counter()
+        try:
+            raw_response = raw_call()
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            PROVIDER_CALL_SECONDS.observe(elapsed, provider=provider, model=model, outcome='error')
+            response = getattr(e, 'response', None)
+            tracer.record_span('provider_call', elapsed, ok=False, provider=provider, model=model, attempt=attempt + 1,
+                               queued_ms=round(waited * 1000, 1), status_code=getattr(response, 'status_code', None))
+            if getattr(response, 'status_code', None) == 429 and attempt < max_retries:
+                RATE_LIMITED_RETRIES.inc(provider=provider, model=model)
+                logger.warning(f"{provider}/{model} 觸發 429，排隊後重試 (第 {attempt + 1} 次)")
+                limiter.update_from_headers(response.headers)
+                limiter.block_for(parse_reset_duration(response.headers.get('retry-after')) or 1.0)
+                continue
+            raise
+
+        elapsed = time.perf_counter() - start
+        PROVIDER_CALL_SECONDS.observe(elapsed, provider=provider, model=model, outcome='ok')
+        tracer.record_span('provider_call', elapsed, provider=provider, model=model, attempt=attempt + 1,
+                           queued_ms=round(waited * 1000, 1))
+        limiter.update_from_headers(raw_response.headers)
+        result = raw_response.parse()
+
+        usage = getattr(result, 'usage', None)
+        if usage is not None:
+            limiter.reconcile_tokens(estimated_tokens, getattr(usage, 'total_tokens', None))
+        return result
@@ -0,0 +1,129 @@
+"""
+用戶會話表
+每位傳過訊息的用戶都有一筆會話，好友數多時若永不清除記憶體會無限成長：
+- UserSession 以 __slots__ 定義，時間一律存 epoch 秒整數，逐字稿為 (epoch, 內容) tuple
+- 會話依最近使用排序 (LRU)，閒置超過 SESSION_TTL 秒或總數超過 SESSION_MAX 時清除最久未使用者
+- 會議記錄中的會話不會被清除
+"""
+import os
+import sys
+import time
+import threading
+import logging
+from collections import OrderedDict
+
+from transcript import TranscriptBuffer
+from meeting_log import meeting_logs
+
+logger = logging.getLogger(__name__)
+
+# 閒置多久（秒）後清除會話，與會話數上限
+SESSION_TTL = int(os.getenv('SESSION_TTL', '3600'))
+SESSION_MAX = int(os.getenv('SESSION_MAX', '10000'))
+
+
+class UserSession:
+    __slots__ = ('user_id', 'is_recording', 'transcript', 'pending_note', 'created_at', 'last_active')
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.is_recording = False  # 是否正在錄音模式
+        self.transcript = TranscriptBuffer()  # 會議逐字稿
+        self.pending_note = None  # 因近似重複而暫緩儲存的文字筆記（/keep 可仍然儲存）
+        self.created_at = int(time.time())
+        self.last_active = self.created_at
+
+    def start_recording(self):
+        self.is_recording = True
+        self.transcript.clear()
+        meeting_logs.open(self.user_id)
+        logger.info(f"用戶 {self.user_id} 開始錄音模式")
+
+    def stop_recording(self):
+        self.is_recording = False
+        self.transcript.clear()
+        meeting_logs.close(self.user_id)
+        logger.info(f"用戶 {self.user_id} 停止錄音模式")
+
+    def add_message(self, message):
+        # 先寫入記錄檔，worker 重啟後可恢復
+        timestamp = time.time()
+        meeting_logs.append(self.user_id, timestamp, message)
+        self.transcript.append(message, timestamp)
+
+    def get_conversation_text(self):
+        """組合完整會議內容（只在 /end 時使用）"""
+        return self.transcript.text()
+
+    def estimate_size(self):
+        """估計此會話佔用的記憶體（bytes）"""
+        size = sys.getsizeof(self) + self.transcript.estimate_size()
+        if self.pending_note:
+            size += sys.getsizeof(self.pending_note)
+        return size
+
+
+class SessionStore:
+    """LRU + TTL 的會話表（執行緒安全）"""
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def get(self, user_id):
+        """取得或建立用戶會話，並順便清除閒置的會話"""
+        now = int(time.time())
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                session = UserSession(user_id)
+                self._sessions[user_id] = session
+                self.created += 1
+            else:
+                self._sessions.move_to_end(user_id)
+            session.last_active = now
+            self._evict(now)
+            return session
+
+    def _evict(self, now):
+        """從最久未使用的一端清除：閒置超過 TTL 或超過數量上限的非記錄中會話"""
+        expired = []
+        overflow = len(self._sessions) - self.max_sessions
+        for user_id, session in self._sessions.items():
+            if session.is_recording:
+                continue
+            if overflow > 0:
+                overflow -= 1
+            elif now - session.last_active <= self.ttl:
+                break  # 之後的會話都更近期使用過
+            expired.append(user_id)
+        for user_id in expired:
+            del self._sessions[user_id]
+        self.evicted += len(expired)
+
+    def __contains__(self, user_id):
+        with self._lock:
+            return user_id in self._sessions
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def get_stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            stats = {
+                "sessions": len(sessions),
+                "recording": sum(1 for session in sessions if session.is_recording),
+                "created": self.created,
+                "evicted": self.evicted,
+            }
+        stats["memory_bytes"] = sum(session.estimate_size() for session in sessions)
+        return stats
+
+
+session_store = SessionStore()
@@ -0,0 +1,68 @@
+"""
+Single-flight 合併執行
+同一個 key 同時只會有一個計算在進行，其他並行呼叫者等待並共用同一份結果，
+避免多人同時轉傳同一連結或檔案時重複打 Jina、Groq 與 Notion
+"""
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """依 key 合併並行中的相同工作"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared_count = 0
+
+    def do(self, key, fn):
+        """
+        執行 fn() 並回傳結果；若相同 key 已在執行中，等待並回傳該次結果
+        fn 拋出的例外會傳遞給所有等待者
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared_count += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            logger.info(f"[{self.name}] 合併進行中的相同工作: {str(key)[:80]}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "shared": self.shared_count,
+            }
@@ -0,0 +1,118 @@
+"""
+長文 Map-Reduce 摘要
+將長文依段落切塊，以有限的並行度同時摘要各區塊 (map)，
+再將各段重點合併成最終摘要 (reduce)，整體延遲約等於兩次 LLM 呼叫
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 單一區塊字數上限，未超過時只會執行一次 reduce（等同單次呼叫）；
+# 呼叫端會再依 LLM 的 token 額度縮小（見 app.summary_chunk_chars）
+SUMMARY_CHUNK_CHARS = int(os.getenv('SUMMARY_CHUNK_CHARS', '6000'))
+# map 階段的最大並行數
+SUMMARY_MAP_WORKERS = int(os.getenv('SUMMARY_MAP_WORKERS', '4'))
+
+
+def split_paragraph_chunks(text, max_chars=SUMMARY_CHUNK_CHARS):
+    """依段落將文字切成不超過 max_chars 的區塊，過長的單一段落會再硬切"""
+    chunks = []
+    current = []
+    current_len = 0
+
+    for paragraph in text.split('\n'):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+
+        # 單一段落超過上限時直接硬切
+        while len(paragraph) > max_chars:
+            if current:
+                chunks.append('\n'.join(current))
+                current, current_len = [], 0
+            chunks.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+
+        if current_len + len(paragraph) + 1 > max_chars and current:
+            chunks.append('\n'.join(current))
+            current, current_len = [], 0
+
+        current.append(paragraph)
+        current_len += len(paragraph) + 1
+
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def sample_chunks(chunks, max_chunks):
+    """區塊數超過 max_chunks 時平均取樣（一定包含第一段），維持原本順序"""
+    if max_chunks is None or len(chunks) <= max_chunks:
+        return chunks
+    if max_chunks <= 1:
+        return chunks[:1]
+    last = len(chunks) - 1
+    indices = sorted({round(i * last / (max_chunks - 1)) for i in range(max_chunks)})
+    return [chunks[i] for i in indices]
+
+
+def map_reduce_summarize(text, map_fn, reduce_fn, chunk_chars=SUMMARY_CHUNK_CHARS, max_workers=SUMMARY_MAP_WORKERS,
+                         max_chunks=None, _depth=0):
+    """
+    Map-Reduce 摘要
+    map_fn(chunk) 回傳該區塊的重點；reduce_fn(text) 產生最終摘要
+    內容只有一個區塊時直接呼叫 reduce_fn(text)
+    max_chunks 為 map 階段最多處理的區塊數（依 LLM 額度決定），超過時平均取樣並在摘要末尾註明
+    map 失敗的區塊以原文開頭代替，並在最終摘要末尾註明未能摘要的段數
+    """
+    chunks = split_paragraph_chunks(text, chunk_chars)
+    if len(chunks) <= 1:
+        return reduce_fn(text)
+
+    total = len(chunks)
+    chunks = sample_chunks(chunks, max_chunks)
+    notes = []
+    if len(chunks) < total:
+        logger.warning(f"長文共 {total} 個區塊，超過額度可處理的 {max_chunks} 個，改為取樣摘要")
+        notes.append(f"⚠️ 內容過長，僅依其中 {len(chunks)}/{total} 段整理摘要")
+    if len(chunks) == 1:
+        summary = reduce_fn(chunks[0])
+        if notes and _depth == 0 and isinstance(summary, str):
+            summary += '\n\n' + '\n'.join(notes)
+        return summary
+
+    logger.info(f"長文分為 {len(chunks)} 個區塊進行 map-reduce 摘要 (並行數 {max_workers})")
+
+    def _safe_map(chunk):
+        try:
+            return map_fn(chunk), True
+        except Exception as e:
+            logger.error(f"區塊摘要失敗，改用原文開頭: {e}")
+            return chunk[:300], False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(tracer.wrap(_safe_map), chunks))
+
+    failed = sum(1 for _, ok in results if not ok)
+    if failed:
+        logger.warning(f"{failed}/{len(chunks)} 個區塊摘要失敗，以原文開頭代替")
+    merged = '\n\n'.join(
+        f"【第 {i + 1} 段{'（未摘要，僅原文開頭）' if not ok else ''}】\n{partial}"
+        for i, (partial, ok) in enumerate(results) if partial
+    )
+
+    # 各段重點合併後仍過長時，再進行一輪 map-reduce（最多兩層）
+    if len(merged) > chunk_chars and _depth < 1:
+        summary = map_reduce_summarize(merged, map_fn, reduce_fn, chunk_chars, max_workers, max_chunks, _depth + 1)
+    else:
+        summary = reduce_fn(merged)
+
+    if failed:
+        notes.append(f"⚠️ 共 {len(chunks)} 段內容中有 {failed} 段未能摘要，僅依原文開頭整理")
+    if notes and _depth == 0 and isinstance(summary, str):
+        summary += '\n\n' + '\n'.join(notes)
+    return summary
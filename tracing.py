@@ -0,0 +1,360 @@
+"""
+請求層級的追蹤 (tracing)
+每個 LINE webhook 事件產生一個 trace id（由 webhookEventId 推得，LINE 重送的事件會沿用同一個），
+以 contextvars 傳遞；工作交給其他執行緒時以 tracer.wrap() 帶過去，Notion 佇列則把追蹤資訊存在工作中，
+重試與重新啟動後仍接得上原本的 trace。各階段的 span 以結構化 JSON 輸出到本機檔案或 OTLP collector，
+日誌也會帶上目前的 trace id，方便串起同一則訊息的所有記錄
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import hashlib
+import tempfile
+import functools
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from handler_args import call_with_own_args
+from http_client import http
+
+logger = logging.getLogger(__name__)
+
+# span 輸出方式：空字串（不輸出，只在日誌中帶 trace id）、file、otlp
+TRACING_EXPORTER = os.getenv('TRACING_EXPORTER', '').lower()
+TRACING_FILE = os.getenv('TRACING_FILE', os.path.join(tempfile.gettempdir(), 'traces.jsonl'))
+# OTLP/HTTP JSON 端點，例如 OpenTelemetry Collector 的 http://localhost:4318/v1/traces
+TRACING_OTLP_ENDPOINT = os.getenv('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+TRACING_SERVICE_NAME = os.getenv('TRACING_SERVICE_NAME', 'ai-bot')
+# 累積幾個 span 或經過幾秒送出一批；佇列滿時丟棄新的 span，不影響請求處理
+TRACING_BATCH_SIZE = int(os.getenv('TRACING_BATCH_SIZE', '100'))
+TRACING_FLUSH_INTERVAL = float(os.getenv('TRACING_FLUSH_INTERVAL', '2.0'))
+TRACING_QUEUE_SIZE = int(os.getenv('TRACING_QUEUE_SIZE', '10000'))
+
+# OTLP 的 span kind 與 status code
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def _new_id(num_bytes):
+    return os.urandom(num_bytes).hex()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """一個處理階段；remote=True 表示從其他執行緒 / 佇列接續的上層 span，只作為 parent，不會輸出"""
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'kind', 'attributes',
+                 'start_ns', 'end_ns', 'status', 'error', 'remote')
+
+    def __init__(self, tracer, name, trace_id, parent_id=None, attributes=None, kind=SPAN_KIND_INTERNAL,
+                 span_id=None, start_ns=None, remote=False):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = span_id or _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = {k: v for k, v in (attributes or {}).items() if v is not None}
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.status = STATUS_OK
+        self.error = None
+        self.remote = remote
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, error=None):
+        self.status = STATUS_ERROR
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}" if isinstance(error, Exception) else str(error)
+
+    def finish(self, ok=True, error=None, end_ns=None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if not ok or error is not None:
+            self.set_error(error)
+        self.tracer._on_finish(self)
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": "error" if self.status == STATUS_ERROR else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": self.status, **({"message": self.error} if self.error else {})},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class SpanExporter:
+    """背景執行緒批次輸出已結束的 span（file：每行一個 JSON；otlp：OTLP/HTTP JSON）"""
+
+    def __init__(self, kind, path=TRACING_FILE, endpoint=TRACING_OTLP_ENDPOINT):
+        self.kind = kind
+        self.path = path
+        self.endpoint = endpoint
+        self._queue = queue.Queue(maxsize=TRACING_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.exported = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        atexit.register(self.flush)
+
+    def export(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = []
+            marker = None
+            item = self._queue.get()
+            deadline = time.monotonic() + TRACING_FLUSH_INTERVAL
+            while True:
+                # flush() 放入的 Event：先送出手上的 span 再通知
+                if isinstance(item, threading.Event):
+                    marker = item
+                    break
+                batch.append(item)
+                remaining = deadline - time.monotonic()
+                if len(batch) >= TRACING_BATCH_SIZE or remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            if marker is not None:
+                marker.set()
+
+    def flush(self, timeout=5):
+        """等背景執行緒送出目前所有的 span（程式結束時呼叫）"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def _write(self, batch):
+        try:
+            if self.kind == 'otlp':
+                self._write_otlp(batch)
+            else:
+                self._write_file(batch)
+            with self._lock:
+                self.exported += len(batch)
+        except Exception as e:
+            with self._lock:
+                self.failed_batches += 1
+                self.dropped += len(batch)
+            logger.warning(f"輸出 {len(batch)} 個 span 失敗: {e}")
+
+    def _write_file(self, batch):
+        lines = ''.join(json.dumps(span.to_dict(), ensure_ascii=False) + '\n' for span in batch)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+    def _write_otlp(self, batch):
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACING_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": TRACING_SERVICE_NAME}, "spans": [s.to_otlp() for s in batch]}],
+        }]}
+        response = http.post(self.endpoint, json=payload, timeout=5, retry=False)
+        if response.status_code >= 300:
+            raise RuntimeError(f"OTLP collector 回應 {response.status_code}")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "exporter": self.kind,
+                "queued": self._queue.qsize(),
+                "exported": self.exported,
+                "dropped": self.dropped,
+                "failed_batches": self.failed_batches,
+            }
+
+
+class Tracer:
+    def __init__(self, exporter=TRACING_EXPORTER):
+        self.exporter = SpanExporter(exporter) if exporter in ('file', 'otlp') else None
+        if exporter and self.exporter is None:
+            logger.warning(f"未知的 TRACING_EXPORTER: {exporter}（可用 file、otlp），span 不會輸出")
+        self._lock = threading.Lock()
+        self.traces = 0
+        self.spans = 0
+
+    def current_span(self):
+        return _current_span.get()
+
+    def current_trace_id(self):
+        span = _current_span.get()
+        return span.trace_id if span else None
+
+    def start_span(self, name, trace_id=None, kind=SPAN_KIND_INTERNAL, start_ns=None, **attributes):
+        """建立 span（不設為目前 span）；指定 trace_id 時開始新的 trace，否則接在目前 span 之下"""
+        parent = None if trace_id else _current_span.get()
+        if parent is None and not trace_id:
+            trace_id = _new_id(16)
+        if parent is None:
+            with self._lock:
+                self.traces += 1
+        return Span(self, name, parent.trace_id if parent else trace_id, parent.span_id if parent else None,
+                    attributes, kind, start_ns=start_ns)
+
+    @contextmanager
+    def span(self, name, trace_id=None, kind=SPAN_KIND_INTERNAL, **attributes):
+        """with 區塊期間設為目前 span；區塊拋出例外時記為失敗"""
+        span = self.start_span(name, trace_id, kind, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.finish(ok=False, error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+
+    def record_span(self, name, seconds, ok=True, **attributes):
+        """記錄一段已結束的處理（事後才知道耗時的階段）"""
+        end_ns = time.time_ns()
+        span = self.start_span(name, start_ns=end_ns - int(seconds * 1e9), **attributes)
+        span.finish(ok=ok, end_ns=end_ns)
+        return span
+
+    def context(self):
+        """目前的追蹤資訊（可序列化），供佇列中的工作之後以 resume() 接續"""
+        span = _current_span.get()
+        return {"trace_id": span.trace_id, "span_id": span.span_id} if span else None
+
+    @contextmanager
+    def resume(self, context):
+        """以 context() 的結果作為上層 span，context 為空時不做任何事"""
+        if not context:
+            yield
+            return
+        parent = Span(self, 'remote', context["trace_id"], span_id=context["span_id"], remote=True)
+        token = _current_span.set(parent)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    def wrap(self, func):
+        """讓 func 在其他執行緒執行時沿用目前的 span（可重複、並行呼叫）"""
+        parent = _current_span.get()
+        if parent is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_span.set(parent)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current_span.reset(token)
+        return wrapper
+
+    def event_handler(self, name):
+        """裝飾 LINE 事件處理器：每個事件開始一個新的 trace，trace id 由 webhookEventId 推得"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                event = args[0] if args else None
+                event_id = getattr(event, 'webhook_event_id', None)
+                trace_id = hashlib.sha256(event_id.encode('utf-8')).hexdigest()[:32] if event_id else _new_id(16)
+                message = getattr(event, 'message', None)
+                source = getattr(event, 'source', None)
+                delivery = getattr(event, 'delivery_context', None)
+                with self.span(f"line.{name}", trace_id=trace_id, kind=SPAN_KIND_SERVER,
+                               webhook_event_id=event_id,
+                               user_id=getattr(source, 'user_id', None),
+                               message_id=getattr(message, 'id', None),
+                               message_type=getattr(message, 'type', None),
+                               redelivery=getattr(delivery, 'is_redelivery', None)):
+                    return call_with_own_args(func, args, kwargs)
+            return wrapper
+        return decorator
+
+    def _on_finish(self, span):
+        if span.remote:
+            return
+        with self._lock:
+            self.spans += 1
+        if self.exporter:
+            self.exporter.export(span)
+
+    def get_stats(self):
+        with self._lock:
+            stats = {"traces": self.traces, "spans": self.spans}
+        if self.exporter:
+            stats.update(self.exporter.get_stats())
+        return stats
+
+
+class TraceIdLogFilter(logging.Filter):
+    """在日誌記錄加上 trace_id 欄位（沒有進行中的 trace 時為 -）"""
+
+    def filter(self, record):
+        span = _current_span.get()
+        record.trace_id = span.trace_id if span else '-'
+        return True
+
+
+tracer = Tracer()
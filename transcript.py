@@ -0,0 +1,81 @@
+"""
+會議記錄緩衝區
+每則訊息 O(1) 附加並維護累計筆數與字數；回覆只顯示最近幾則（有字數上限），
+完整逐字稿只在 /end 時組合一次
+"""
+import os
+import sys
+import time
+
+# 回覆中顯示的最近訊息則數與字數上限
+MEETING_TAIL_MESSAGES = int(os.getenv('MEETING_TAIL_MESSAGES', '5'))
+MEETING_TAIL_CHARS = int(os.getenv('MEETING_TAIL_CHARS', '800'))
+
+
+class TranscriptBuffer:
+    """會議逐字稿：以 (epoch 秒, 內容) 依序保存"""
+    __slots__ = ('_entries', 'char_count')
+
+    def __init__(self):
+        self._entries = []
+        self.char_count = 0  # 組合後全文的字數（含訊息之間的換行）
+
+    def append(self, content, timestamp=None):
+        if self._entries:
+            self.char_count += 1
+        self._entries.append((int(timestamp if timestamp is not None else time.time()), content))
+        self.char_count += len(content)
+
+    @property
+    def message_count(self):
+        return len(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def clear(self):
+        self._entries = []
+        self.char_count = 0
+
+    def tail(self, max_messages=MEETING_TAIL_MESSAGES, max_chars=MEETING_TAIL_CHARS):
+        """
+        最近的內容（最多 max_messages 則、約 max_chars 字），回傳 (文字, 未顯示的較早則數)
+        只走訪最後幾則，成本與會議長度無關
+        """
+        parts = []
+        used = 0
+        for _, content in reversed(self._entries[-max_messages:]):
+            remaining = max_chars - used
+            if remaining <= 0:
+                break
+            if len(content) > remaining:
+                content = '…' + content[-remaining:]
+            parts.append(content)
+            used += len(content) + 1
+        parts.reverse()
+        return '\n'.join(parts), len(self._entries) - len(parts)
+
+    def estimate_size(self):
+        """估計佔用的記憶體（bytes），不含共用的小整數"""
+        size = sys.getsizeof(self) + sys.getsizeof(self._entries)
+        for entry in self._entries:
+            size += sys.getsizeof(entry) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[1])
+        return size
+
+    def text(self):
+        """組合完整逐字稿（只在 /end 時呼叫）"""
+        return '\n'.join(content for _, content in self._entries)
+
+
+def format_tail(buffer):
+    """會議模式回覆中的「最近內容」區塊"""
+    text, omitted = buffer.tail()
+    header = f"（前略 {omitted} 則）\n" if omitted else ""
+    return f"{header}{text}"
+
+
+def format_counters(buffer):
+    return f"共 {buffer.message_count} 條記錄，約 {buffer.char_count} 字"